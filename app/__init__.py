@@ -1,22 +1,25 @@
 """Flask application factory."""
+import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_cors import CORS
+from config import startup
 from config.settings import get_config
 from config.email import init_email
+from app.utils.replica import RoutingSession
 
-db = SQLAlchemy()
-migrate = Migrate()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 def create_app(config_name='production'):
     """Create and configure the Flask application."""
-    app = Flask(__name__)
+    with startup.phase('flask'):
+        app = Flask(__name__)
     
     # Load configuration
-    config = get_config(config_name)
-    app.config.from_object(config)
+    with startup.phase('config'):
+        config = get_config(config_name)
+        app.config.from_object(config)
     
     # Configure session cookies for cross-domain authentication
     # Required for frontend (sanbud24.pl) to use backend (app-sanbud-api-prod.azurewebsites.net)
@@ -26,6 +29,47 @@ def create_app(config_name='production'):
     app.config['SESSION_COOKIE_PATH'] = '/'         # Cookie available for all paths
     
     # Enable CORS for production domain, Azure Static Web App and local development
+    with startup.phase('cors'):
+        _init_cors(app)
+    
+    # Initialize extensions
+    with startup.phase('extensions'):
+        db.init_app(app)
+        # Flask-Migrate (and Alembic) only serve `flask db`; workers skip the import
+        if os.environ.get('FLASK_RUN_FROM_CLI'):
+            from flask_migrate import Migrate
+            Migrate(app, db)
+    
+    # Initialize email
+    with startup.phase('email'):
+        init_email(app)
+    
+    # Register maintenance CLI commands
+    with startup.phase('cli'):
+        from app.cli import init_cli
+        init_cli(app)
+    
+    # Register blueprints
+    with startup.phase('blueprints'):
+        from app.routes import main, services, appointments, admin, api, init, google
+        app.register_blueprint(main.bp)
+        app.register_blueprint(services.bp)
+        app.register_blueprint(appointments.bp)
+        app.register_blueprint(admin.admin_bp)
+        app.register_blueprint(api.bp)
+        app.register_blueprint(init.init_bp)
+        app.register_blueprint(google.google_bp)
+    
+    # Create database tables (commented out - use migrations instead)
+    # with app.app_context():
+    #     db.create_all()
+    
+    startup.report()
+    return app
+
+
+def _init_cors(app):
+    """Allow the production domains, Azure Static Web Apps and local development."""
     # Note: support_credentials MUST be set at top level for Access-Control-Allow-Credentials header
     CORS(app, 
          origins=[
@@ -44,30 +88,7 @@ def create_app(config_name='production'):
              "https://swa-sanbud-web-dev.azurestaticapps.net"
          ],
          methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-         allow_headers=["Content-Type", "Authorization", "X-Requested-With"],
+         allow_headers=["Content-Type", "Authorization", "X-Requested-With", "Idempotency-Key"],
          support_credentials=True,
-         expose_headers=["Content-Range", "X-Content-Range"]
+         expose_headers=["Content-Range", "X-Content-Range", "Idempotent-Replayed", "Retry-After"]
     )
-    
-    # Initialize extensions
-    db.init_app(app)
-    migrate.init_app(app, db)
-    
-    # Initialize email
-    init_email(app)
-    
-    # Register blueprints
-    from app.routes import main, services, appointments, admin, api, init, google
-    app.register_blueprint(main.bp)
-    app.register_blueprint(services.bp)
-    app.register_blueprint(appointments.bp)
-    app.register_blueprint(admin.admin_bp)
-    app.register_blueprint(api.bp)
-    app.register_blueprint(init.init_bp)
-    app.register_blueprint(google.google_bp)
-    
-    # Create database tables (commented out - use migrations instead)
-    # with app.app_context():
-    #     db.create_all()
-    
-    return app
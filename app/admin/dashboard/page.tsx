@@ -24,6 +24,8 @@ interface Stats {
   pending_appointments: number;
   confirmed_appointments: number;
   recent_clients: number;
+  suppressed_messages?: number;
+  suppressed_messages_recent?: number;
 }
 
 export default function AdminDashboard() {
@@ -168,7 +170,7 @@ export default function AdminDashboard() {
       <div className="container mx-auto px-4 py-8">
         {/* Stats Grid */}
         {stats && (
-          <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6 mb-8">
+          <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 gap-6 mb-8">
             <div className="bg-white rounded-2xl shadow-lg p-6 border border-gray-200">
               <div className="flex items-center justify-between">
                 <div>
@@ -213,6 +215,21 @@ export default function AdminDashboard() {
                 </div>
               </div>
             </div>
+
+            <div className="bg-white rounded-2xl shadow-lg p-6 border border-gray-200">
+              <div className="flex items-center justify-between">
+                <div>
+                  <p className="text-sm font-semibold text-gray-600 mb-1">Zablokowane duplikaty</p>
+                  <p className="text-3xl font-black text-gray-900">{stats.suppressed_messages ?? 0}</p>
+                  <p className="text-xs text-gray-500 mt-1">{stats.suppressed_messages_recent ?? 0} w ostatnich 7 dniach</p>
+                </div>
+                <div className="w-16 h-16 bg-gradient-to-br from-gray-500 to-gray-700 rounded-2xl flex items-center justify-center">
+                  <svg className="w-8 h-8 text-white" fill="none" stroke="currentColor" viewBox="0 0 24 24">
+                    <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M18.364 18.364A9 9 0 005.636 5.636m12.728 12.728A9 9 0 015.636 5.636m12.728 12.728L5.636 5.636" />
+                  </svg>
+                </div>
+              </div>
+            </div>
           </div>
         )}
 
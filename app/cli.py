@@ -0,0 +1,284 @@
+"""
+Maintenance commands, available as ``flask <group> <command>``.
+
+    flask appointments partition --months-ahead 3
+    flask appointments partitions
+    flask appointments archive --older-than 12
+    flask events prune --days 7
+    flask metrics backfill --days 3
+    flask reminders run [--once]
+    flask messages prune-fingerprints --days 30
+    flask messages rebuild-counters
+    flask messages link-customers
+    flask customers erase 42
+    flask customers resume-erasures [--include-failed]
+    flask customers backfill-phone-keys
+    flask import csv appointments bookings.csv --errors errors.csv
+    flask cache clear
+    flask pages prerender
+    flask idempotency prune
+"""
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+appointments_cli = AppGroup('appointments', help='Appointment storage maintenance.')
+events_cli = AppGroup('events', help='Change event log maintenance.')
+metrics_cli = AppGroup('metrics', help='Dashboard rollup maintenance.')
+reminders_cli = AppGroup('reminders', help='Appointment reminder emails.')
+messages_cli = AppGroup('messages', help='Message maintenance.')
+customers_cli = AppGroup('customers', help='Customer data maintenance.')
+import_cli = AppGroup('import', help='Bulk CSV imports.')
+cache_cli = AppGroup('cache', help='Shared cache maintenance.')
+pages_cli = AppGroup('pages', help='Public page cache.')
+idempotency_cli = AppGroup('idempotency', help='Idempotency key maintenance.')
+
+
+@appointments_cli.command('partition')
+@click.option('--months-ahead', default=3, show_default=True, help='Future months to prepare.')
+@click.option('--months-back', default=0, show_default=True, help='Past months to (re)create.')
+def partition_appointments(months_ahead, months_back):
+    """Partition appointments by month (PostgreSQL), creating upcoming partitions.
+
+    The first run converts the existing table; later runs, e.g. from a
+    monthly cron job, only add partitions for the coming months.
+    """
+    from app.utils.partitions import (
+        PartitioningUnsupported, convert_to_partitioned, ensure_partitions
+    )
+
+    try:
+        converted = convert_to_partitioned(months_ahead=months_ahead)
+        if converted:
+            click.echo(f'Converted appointments to a partitioned table ({len(converted)} monthly partitions)')
+        created = ensure_partitions(months_ahead=months_ahead, months_back=months_back)
+    except PartitioningUnsupported as e:
+        raise click.ClickException(str(e))
+
+    for name in created:
+        click.echo(f'Created partition {name}')
+    if not converted and not created:
+        click.echo('Partitions are up to date')
+
+
+@appointments_cli.command('partitions')
+def show_partitions():
+    """List appointment partitions and their bounds."""
+    from app import db
+    from app.utils.partitions import is_partitioned, list_partitions
+
+    with db.engine.connect() as connection:
+        if connection.dialect.name != 'postgresql' or not is_partitioned(connection):
+            click.echo('appointments is not partitioned')
+            return
+        for name, bound in list_partitions(connection):
+            click.echo(f'{name}: {bound}')
+
+
+@appointments_cli.command('archive')
+@click.option('--older-than', 'older_than', default=12, show_default=True,
+              help='Archive appointments scheduled more than this many months ago.')
+@click.option('--batch-size', default=500, show_default=True)
+@click.option('--dry-run', is_flag=True, help='Only count eligible appointments.')
+def archive_old_appointments(older_than, batch_size, dry_run):
+    """Move old completed/cancelled appointments to the archive table."""
+    from app.utils.archive import archive_appointments, archive_cutoff
+
+    count = archive_appointments(older_than_months=older_than, batch_size=batch_size, dry_run=dry_run)
+    cutoff = archive_cutoff(older_than).isoformat()
+    if dry_run:
+        click.echo(f'{count} appointments scheduled before {cutoff} would be archived')
+    else:
+        click.echo(f'Archived {count} appointments scheduled before {cutoff}')
+
+
+@events_cli.command('prune')
+@click.option('--days', type=int, default=None, help='Retention in days (default: EVENTS_RETENTION_DAYS).')
+def prune_change_events(days):
+    """Delete change events older than the retention window."""
+    from app.utils.events import prune_events
+
+    days = days if days is not None else current_app.config.get('EVENTS_RETENTION_DAYS', 7)
+    click.echo(f'Deleted {prune_events(days)} change events older than {days} days')
+
+
+@metrics_cli.command('backfill')
+@click.option('--days', default=3, show_default=True, help='Recompute this many days up to today.')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Recompute from this date instead (e.g. the first booking).')
+@click.option('--ahead', default=366, show_default=True,
+              help='Also recompute future days (cancellations count on the scheduled day).')
+def backfill_daily_metrics(days, since, ahead):
+    """Recompute daily_metrics from the source tables (nightly repair)."""
+    from datetime import date, timedelta
+    from app.utils.metrics import backfill_metrics
+
+    today = date.today()
+    start = since.date() if since else today - timedelta(days=days - 1)
+    end = today + timedelta(days=ahead)
+    rows = backfill_metrics(start, end)
+    click.echo(f'Rebuilt daily metrics for {start.isoformat()}..{end.isoformat()} ({rows} rows)')
+
+
+@reminders_cli.command('run')
+@click.option('--once', is_flag=True, help='Send the reminders that are due and exit (for cron).')
+def run_reminders(once):
+    """Send reminder emails before appointments, as a long-running process."""
+    from app.utils.reminders import ReminderScheduler
+
+    scheduler = ReminderScheduler()
+    if once:
+        click.echo(f'Sent {scheduler.run(once=True)} reminders')
+        return
+    click.echo('Reminder scheduler started')
+    scheduler.run()
+
+
+@messages_cli.command('prune-fingerprints')
+@click.option('--days', default=30, show_default=True, help='Keep fingerprints seen within this many days.')
+def prune_message_fingerprints(days):
+    """Delete duplicate-detection fingerprints that have not been seen recently."""
+    from app.utils.dedupe import prune_fingerprints
+
+    click.echo(f'Deleted {prune_fingerprints(days)} message fingerprints older than {days} days')
+
+
+@messages_cli.command('rebuild-counters')
+def rebuild_message_counters():
+    """Recount unread messages per priority (repairs the inbox badge)."""
+    from app.utils.inbox import backfill_priority_ranks, rebuild_unread_counters
+
+    ranked = backfill_priority_ranks()
+    if ranked:
+        click.echo(f'Set priority_rank on {ranked} messages')
+    counts = rebuild_unread_counters()
+    click.echo('Unread messages: ' + ', '.join(f'{name} {count}' for name, count in counts.items()))
+
+
+@messages_cli.command('link-customers')
+@click.option('--batch-size', default=500, show_default=True)
+def link_message_customers(batch_size):
+    """Link messages to the customers with the same email (backfill)."""
+    from app.utils.customers import link_messages
+
+    linked, scanned = link_messages(batch_size=batch_size)
+    click.echo(f'Linked {linked} of {scanned} unlinked messages to customers')
+
+
+def _echo_erasure_progress(job):
+    click.echo(f'  {job.phase}: {job.deleted_rows}/{job.total_rows} rows')
+
+
+@customers_cli.command('erase')
+@click.argument('customer_id', type=int)
+@click.option('--batch-size', type=int, default=None, help='Rows per transaction (default: ERASURE_BATCH_SIZE).')
+def erase_customer(customer_id, batch_size):
+    """Erase a customer with their appointments and messages (GDPR request)."""
+    from app import db
+    from app.models.customer import Customer
+    from app.utils.erasure import create_job, run_job
+
+    customer = db.session.get(Customer, customer_id)
+    if customer is None:
+        raise click.ClickException(f'Customer {customer_id} not found')
+    job = create_job(customer, requested_by='cli')
+    job = run_job(job.id, batch_size=batch_size, on_progress=_echo_erasure_progress)
+    if job is None:
+        raise click.ClickException('The erasure of this customer is already running elsewhere')
+    click.echo(f'Erasure job {job.id}: {job.status}' + (f' ({job.error})' if job.error else ''))
+
+
+@customers_cli.command('resume-erasures')
+@click.option('--include-failed', is_flag=True, help='Also retry failed jobs.')
+def resume_erasures(include_failed):
+    """Run pending erasure jobs and those interrupted by a restart (for cron)."""
+    from app.utils.erasure import resumable_jobs, run_job
+
+    job_ids = resumable_jobs(include_failed=include_failed)
+    for job_id in job_ids:
+        job = run_job(job_id, on_progress=_echo_erasure_progress)
+        if job is not None:
+            click.echo(f'Erasure job {job.id}: {job.status}' + (f' ({job.error})' if job.error else ''))
+    if not job_ids:
+        click.echo('No erasure jobs to resume')
+
+
+@customers_cli.command('backfill-phone-keys')
+def backfill_customer_phone_keys():
+    """Set the normalized phone on customers stored before it existed."""
+    from app.utils.customers import backfill_phone_keys
+
+    click.echo(f'Set phone_key on {backfill_phone_keys()} customers')
+
+
+@import_cli.command('csv')
+@click.argument('kind', type=click.Choice(['customers', 'services', 'appointments']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--encoding', default='utf-8-sig', show_default=True, help='e.g. cp1250 for older Excel exports.')
+@click.option('--delimiter', default=None, help='Column separator (default: detected from the header).')
+@click.option('--batch-size', type=int, default=None, help='Rows per transaction (default: IMPORT_BATCH_SIZE).')
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False, writable=True),
+              help='Write every rejected row to this CSV file.')
+def import_file(kind, path, encoding, delimiter, batch_size, errors_path):
+    """Import customers, services or historical appointments from a CSV file."""
+    from app.utils.importer import import_csv, error_writer, ImportFormatError
+
+    report = open(errors_path, 'w', newline='', encoding='utf-8') if errors_path else None
+    try:
+        on_error = error_writer(report) if report else None
+        with open(path, 'rb') as stream:
+            result = import_csv(
+                stream, kind, batch_size=batch_size, encoding=encoding, delimiter=delimiter,
+                on_error=on_error, on_progress=lambda result: click.echo(f'  {result.rows} rows')
+            )
+    except (ImportFormatError, LookupError) as e:
+        raise click.ClickException(str(e))
+    finally:
+        if report:
+            report.close()
+
+    summary = result.to_dict()
+    click.echo(', '.join(f'{name} {summary[name]}' for name in ('rows', *sorted(result.counts), 'failed')))
+    for error in result.errors[:10]:
+        click.echo(f"  line {error['line']}: {error['error']}")
+    if result.failed > 10 and not errors_path:
+        click.echo(f'  ... {result.failed - 10} more, use --errors to write them all')
+
+
+@cache_cli.command('clear')
+def clear_cache():
+    """Drop all cached values of this app, in every worker."""
+    from app.utils.cache import cache
+
+    click.echo(f'Removed {cache.clear()} cached entries')
+
+
+@pages_cli.command('prerender')
+def prerender():
+    """Render the cached public pages again, e.g. after a deploy."""
+    from app.utils.page_cache import prerender_pages
+
+    for path, status in prerender_pages(current_app._get_current_object()):
+        click.echo(f'{status} {path}')
+
+
+@idempotency_cli.command('prune')
+def prune_idempotency_keys():
+    """Delete expired idempotency keys and abandoned in-flight reservations (e.g. hourly cron)."""
+    from app.utils.idempotency import purge_expired_keys
+
+    click.echo(f'Deleted {purge_expired_keys()} idempotency keys')
+
+
+def init_cli(app):
+    """Register maintenance commands on the app."""
+    app.cli.add_command(appointments_cli)
+    app.cli.add_command(events_cli)
+    app.cli.add_command(metrics_cli)
+    app.cli.add_command(reminders_cli)
+    app.cli.add_command(messages_cli)
+    app.cli.add_command(customers_cli)
+    app.cli.add_command(import_cli)
+    app.cli.add_command(cache_cli)
+    app.cli.add_command(pages_cli)
+    app.cli.add_command(idempotency_cli)
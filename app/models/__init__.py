@@ -1,8 +1,17 @@
 """Database models package."""
 from app.models.service import Service
+from app.models.service_alias import ServiceAlias
 from app.models.appointment import Appointment
+from app.models.appointment_archive import AppointmentArchive
 from app.models.customer import Customer
 from app.models.admin import Admin
 from app.models.message import Message
+from app.models.idempotency import IdempotencyKey
+from app.models.change_event import ChangeEvent
+from app.models.tombstone import Tombstone
+from app.models.daily_metric import DailyMetric
+from app.models.message_fingerprint import MessageFingerprint
+from app.models.message_counter import MessageCounter
+from app.models.erasure_job import ErasureJob
 
-__all__ = ['Service', 'Appointment', 'Customer', 'Admin', 'Message']
+__all__ = ['Service', 'ServiceAlias', 'Appointment', 'AppointmentArchive', 'Customer', 'Admin', 'Message', 'IdempotencyKey', 'ChangeEvent', 'Tombstone', 'DailyMetric', 'MessageFingerprint', 'MessageCounter', 'ErasureJob']
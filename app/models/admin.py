@@ -2,6 +2,7 @@
 from app import db
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+import secrets
 
 
 class Admin(db.Model):
@@ -18,6 +19,7 @@ class Admin(db.Model):
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     is_super_admin = db.Column(db.Boolean, default=False, nullable=False)
     last_login = db.Column(db.DateTime)
+    calendar_token = db.Column(db.String(64), unique=True, index=True)  # Secret for the .ics subscription URL
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -29,6 +31,11 @@ class Admin(db.Model):
         """Check if provided password matches the hash."""
         return check_password_hash(self.password_hash, password)
     
+    def rotate_calendar_token(self):
+        """Issue a new calendar feed token, invalidating the old subscription URL."""
+        self.calendar_token = secrets.token_urlsafe(32)
+        return self.calendar_token
+    
     def update_last_login(self):
         """Update the last login timestamp."""
         self.last_login = datetime.utcnow()
@@ -7,9 +7,14 @@ class Appointment(db.Model):
     """Appointment model for scheduling services."""
     
     __tablename__ = 'appointments'
+    __table_args__ = (
+        db.Index('ix_appointments_scheduled', 'scheduled_date', 'scheduled_time'),
+        db.Index('ix_appointments_updated', 'updated_at', 'id'),
+        db.Index('ix_appointments_customer', 'customer_id', 'scheduled_date', 'scheduled_time', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=False)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id', ondelete='CASCADE'), nullable=False)
     service_id = db.Column(db.Integer, db.ForeignKey('services.id'), nullable=False)
     scheduled_date = db.Column(db.Date, nullable=False)
     scheduled_time = db.Column(db.Time, nullable=False)
@@ -22,6 +27,8 @@ class Appointment(db.Model):
     event_title = db.Column(db.String(255))  # Title for calendar event
     event_location = db.Column(db.String(500))  # Location for calendar event
     
+    reminder_sent_at = db.Column(db.DateTime)  # When the 24h reminder email was sent (UTC)
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -42,6 +49,7 @@ class Appointment(db.Model):
             'calendar_platforms': self.calendar_platforms.split(',') if self.calendar_platforms else [],
             'event_title': self.event_title,
             'event_location': self.event_location,
+            'reminder_sent_at': self.reminder_sent_at.isoformat() if self.reminder_sent_at else None,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
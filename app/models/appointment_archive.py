@@ -0,0 +1,47 @@
+"""Appointment archive model - compact storage for old completed/cancelled appointments."""
+from datetime import datetime
+from app import db
+
+
+class AppointmentArchive(db.Model):
+    """Appointment moved out of the live table by ``flask appointments archive``."""
+    
+    __tablename__ = 'appointments_archive'
+    __table_args__ = (
+        db.Index('ix_appointments_archive_scheduled', 'scheduled_date', 'scheduled_time'),
+        db.Index('ix_appointments_archive_customer', 'customer_id', 'scheduled_date', 'scheduled_time', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # Same id as in appointments
+    customer_id = db.Column(db.Integer, nullable=False, index=True)
+    service_id = db.Column(db.Integer, nullable=False)
+    scheduled_date = db.Column(db.Date, nullable=False)
+    scheduled_time = db.Column(db.Time, nullable=False)
+    status = db.Column(db.String(50), nullable=False)  # completed, cancelled
+    notes = db.Column(db.Text)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<AppointmentArchive {self.id} - {self.status}>'
+    
+    def to_dict(self):
+        """Convert archived appointment to the same shape as ``Appointment.to_dict``."""
+        return {
+            'id': self.id,
+            'customer_id': self.customer_id,
+            'service_id': self.service_id,
+            'scheduled_date': self.scheduled_date.isoformat() if self.scheduled_date else None,
+            'scheduled_time': self.scheduled_time.isoformat() if self.scheduled_time else None,
+            'status': self.status,
+            'notes': self.notes,
+            'calendar_event_sent': False,
+            'calendar_platforms': [],
+            'event_title': None,
+            'event_location': None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'archived': True,
+            'archived_at': self.archived_at.isoformat() if self.archived_at else None
+        }
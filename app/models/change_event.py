@@ -0,0 +1,31 @@
+"""Change event model - append-only log of committed appointment and message changes."""
+import json
+from app import db
+from datetime import datetime
+
+
+class ChangeEvent(db.Model):
+    """One create/update/delete of a tracked record, in commit order."""
+    
+    __tablename__ = 'change_events'
+    
+    id = db.Column(db.Integer, primary_key=True)  # Monotonic; doubles as the SSE event id
+    entity = db.Column(db.String(50), nullable=False)  # appointment, message
+    entity_id = db.Column(db.Integer)  # NULL for events that cover a batch of rows
+    action = db.Column(db.String(20), nullable=False)  # created, updated, deleted
+    payload = db.Column(db.Text)  # JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    def to_dict(self):
+        """Convert event to dictionary."""
+        return {
+            'id': self.id,
+            'entity': self.entity,
+            'entity_id': self.entity_id,
+            'action': self.action,
+            'data': json.loads(self.payload) if self.payload else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+    
+    def __repr__(self):
+        return f'<ChangeEvent {self.id} {self.entity}:{self.entity_id} {self.action}>'
@@ -1,18 +1,24 @@
 """Customer model."""
 from datetime import datetime
+from sqlalchemy.orm import validates
 from app import db
+from app.utils.text import phone_key
 
 
 class Customer(db.Model):
     """Customer model for storing customer information."""
     
     __tablename__ = 'customers'
+    __table_args__ = (
+        db.Index('ix_customers_updated', 'updated_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     first_name = db.Column(db.String(100), nullable=False)
     last_name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     phone = db.Column(db.String(20), nullable=False)
+    phone_key = db.Column(db.String(20), index=True)  # Digits-only phone, for matching duplicates
     address = db.Column(db.String(200))
     city = db.Column(db.String(100))
     postal_code = db.Column(db.String(20))
@@ -20,7 +26,17 @@ class Customer(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    appointments = db.relationship('Appointment', backref='customer', lazy=True, cascade='all, delete-orphan')
+    # The database removes appointments (ON DELETE CASCADE) and unlinks messages
+    # (SET NULL) when a customer is deleted; they are not loaded for it
+    appointments = db.relationship('Appointment', backref='customer', lazy=True,
+                                   cascade='all, delete-orphan', passive_deletes=True)
+    messages = db.relationship('Message', backref='customer', lazy=True, passive_deletes=True)
+    
+    @validates('phone')
+    def _sync_phone_key(self, key, phone):
+        """Keep the normalized phone in step with the phone number."""
+        self.phone_key = phone_key(phone)
+        return phone
     
     def __repr__(self):
         return f'<Customer {self.first_name} {self.last_name}>'
@@ -39,3 +55,8 @@ class Customer(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+
+
+# Case-insensitive email lookups (app/utils/customers.py ``email_key_sql``),
+# e.g. linking contact messages to customers
+db.Index('ix_customers_email_key', db.func.lower(db.func.trim(Customer.email)))
@@ -0,0 +1,29 @@
+"""Daily metric model - per-day rollups behind the dashboard trend charts."""
+from app import db
+
+
+class DailyMetric(db.Model):
+    """Value of one metric on one day, optionally broken down by a dimension."""
+    
+    __tablename__ = 'daily_metrics'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'metric', 'dimension', name='uq_daily_metrics_day_metric_dimension'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    metric = db.Column(db.String(50), nullable=False)  # bookings, cancellations, new_customers, messages
+    dimension = db.Column(db.String(100), nullable=False, default='')  # '' for the daily total, e.g. service:3
+    value = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        """Convert metric to dictionary."""
+        return {
+            'day': self.day.isoformat() if self.day else None,
+            'metric': self.metric,
+            'dimension': self.dimension,
+            'value': self.value
+        }
+    
+    def __repr__(self):
+        return f'<DailyMetric {self.day} {self.metric}[{self.dimension}]={self.value}>'
@@ -0,0 +1,60 @@
+"""Erasure job model - progress of a customer data erasure (GDPR) request."""
+from app import db
+from datetime import datetime
+
+
+class ErasureJob(db.Model):
+    """Batched deletion of a customer, their appointments and their messages."""
+    
+    __tablename__ = 'erasure_jobs'
+    __table_args__ = (
+        db.Index('ix_erasure_jobs_status', 'status', 'updated_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    customer_id = db.Column(db.Integer, nullable=False, index=True)  # Not a foreign key: the customer is erased
+    email_key = db.Column(db.String(120))  # Normalized email, to find unlinked messages
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, completed, failed
+    phase = db.Column(db.String(30))  # Step in progress, see app.utils.erasure.PHASES
+    requested_by = db.Column(db.String(80))  # Admin username
+    total_rows = db.Column(db.Integer, nullable=False, default=0)  # Estimate taken when the job was created
+    deleted_rows = db.Column(db.Integer, nullable=False, default=0)
+    deleted_appointments = db.Column(db.Integer, nullable=False, default=0)
+    deleted_messages = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # Heartbeat, bumped per batch
+    
+    @property
+    def progress(self):
+        """Share of the estimated rows deleted so far, 0.0-1.0."""
+        if self.status == 'completed':
+            return 1.0
+        if not self.total_rows:
+            return 0.0
+        return min(self.deleted_rows / self.total_rows, 1.0)
+    
+    def to_dict(self):
+        """Convert job to dictionary."""
+        return {
+            'id': self.id,
+            'customer_id': self.customer_id,
+            'status': self.status,
+            'phase': self.phase,
+            'requested_by': self.requested_by,
+            'total_rows': self.total_rows,
+            'deleted_rows': self.deleted_rows,
+            'deleted_appointments': self.deleted_appointments,
+            'deleted_messages': self.deleted_messages,
+            'progress': round(self.progress, 3),
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+    
+    def __repr__(self):
+        return f'<ErasureJob {self.id} customer={self.customer_id} {self.status}>'
@@ -0,0 +1,30 @@
+"""Idempotency key model for replaying responses to retried requests."""
+from app import db
+from datetime import datetime
+
+
+class IdempotencyKey(db.Model):
+    """Stored response for a client-supplied Idempotency-Key."""
+    
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        db.UniqueConstraint('key', 'endpoint', name='uq_idempotency_keys_key_endpoint'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(255), nullable=False)
+    endpoint = db.Column(db.String(100), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)  # SHA-256 of the request body
+    status_code = db.Column(db.Integer)  # NULL while the original request is still in flight
+    response_body = db.Column(db.Text)
+    content_type = db.Column(db.String(100))
+    location = db.Column(db.String(500))  # Redirect target for form posts
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    @property
+    def is_complete(self):
+        """Whether the original request finished and its response was stored."""
+        return self.status_code is not None
+    
+    def __repr__(self):
+        return f'<IdempotencyKey {self.endpoint} {self.key}>'
@@ -1,14 +1,25 @@
 """Message model for contact form and booking inquiries."""
 from app import db
 from datetime import datetime
+from sqlalchemy.orm import validates
+
+# Sort key of each priority: the inbox lists lower ranks first
+PRIORITY_RANKS = {'urgent': 0, 'high': 1, 'normal': 2, 'low': 3}
+DEFAULT_PRIORITY_RANK = PRIORITY_RANKS['normal']
 
 
 class Message(db.Model):
     """Message model for storing contact and booking messages."""
     
     __tablename__ = 'messages'
+    __table_args__ = (
+        db.Index('ix_messages_updated', 'updated_at', 'id'),
+        db.Index('ix_messages_customer', 'customer_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id', ondelete='SET NULL'))  # Matched by email
+    similar_to_id = db.Column(db.Integer, db.ForeignKey('messages.id', ondelete='SET NULL'))  # Earlier message it nearly repeats
     name = db.Column(db.String(200), nullable=False)
     email = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(20))
@@ -18,9 +29,18 @@ class Message(db.Model):
     is_read = db.Column(db.Boolean, default=False, nullable=False)
     replied = db.Column(db.Boolean, default=False, nullable=False)
     priority = db.Column(db.String(20), default='normal')  # low, normal, high, urgent
+    priority_rank = db.Column(db.SmallInteger, nullable=False, default=DEFAULT_PRIORITY_RANK,
+                              server_default=str(DEFAULT_PRIORITY_RANK))  # PRIORITY_RANKS[priority]
     notes = db.Column(db.Text)  # Admin notes
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     read_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @validates('priority')
+    def _set_priority_rank(self, key, value):
+        """Keep ``priority_rank`` in step with ``priority``."""
+        self.priority_rank = PRIORITY_RANKS.get(value, DEFAULT_PRIORITY_RANK)
+        return value
     
     def mark_as_read(self):
         """Mark message as read."""
@@ -33,6 +53,8 @@ class Message(db.Model):
         """Convert message to dictionary."""
         return {
             'id': self.id,
+            'customer_id': self.customer_id,
+            'similar_to_id': self.similar_to_id,
             'name': self.name,
             'email': self.email,
             'phone': self.phone,
@@ -44,8 +66,17 @@ class Message(db.Model):
             'priority': self.priority,
             'notes': self.notes,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'read_at': self.read_at.isoformat() if self.read_at else None
+            'read_at': self.read_at.isoformat() if self.read_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
     
     def __repr__(self):
         return f'<Message {self.id} from {self.name}>'
+
+
+# Inbox order: unread first, then by urgency, newest first
+db.Index('ix_messages_inbox', Message.is_read, Message.priority_rank, Message.created_at.desc())
+
+# Messages by normalized email (app/utils/customers.py ``email_key_sql``),
+# e.g. erasing the unlinked messages of a customer
+db.Index('ix_messages_email_key', db.func.lower(db.func.trim(Message.email)))
@@ -0,0 +1,21 @@
+"""Message counter model - unread message counts behind the admin nav badge."""
+from app import db
+
+
+class MessageCounter(db.Model):
+    """Number of unread messages with one priority rank."""
+    
+    __tablename__ = 'message_counters'
+    
+    priority_rank = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    unread = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        """Convert counter to dictionary."""
+        return {
+            'priority_rank': self.priority_rank,
+            'unread': self.unread
+        }
+    
+    def __repr__(self):
+        return f'<MessageCounter rank={self.priority_rank} unread={self.unread}>'
@@ -0,0 +1,38 @@
+"""Message fingerprint model - content hashes of recent messages for duplicate suppression."""
+from app import db
+from datetime import datetime
+
+
+class MessageFingerprint(db.Model):
+    """One row per distinct message content; repeats only bump the counters."""
+    
+    __tablename__ = 'message_fingerprints'
+    __table_args__ = (
+        db.Index('ix_message_fingerprints_email', 'email_key', 'last_seen'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    fingerprint = db.Column(db.String(64), unique=True, nullable=False)  # sha256 of email + normalized body
+    simhash = db.Column(db.BigInteger, nullable=False)  # 64-bit simhash of the body shingles (signed)
+    email_key = db.Column(db.String(120), nullable=False)  # Folded sender email
+    source = db.Column(db.String(50), nullable=False)  # contact, register
+    message_id = db.Column(db.Integer)  # Message stored for the first occurrence
+    suppressed_count = db.Column(db.Integer, default=0, nullable=False)
+    first_seen = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_seen = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    def to_dict(self):
+        """Convert fingerprint to dictionary."""
+        return {
+            'id': self.id,
+            'fingerprint': self.fingerprint,
+            'email': self.email_key,
+            'source': self.source,
+            'message_id': self.message_id,
+            'suppressed_count': self.suppressed_count,
+            'first_seen': self.first_seen.isoformat() if self.first_seen else None,
+            'last_seen': self.last_seen.isoformat() if self.last_seen else None
+        }
+    
+    def __repr__(self):
+        return f'<MessageFingerprint {self.fingerprint[:12]} x{self.suppressed_count}>'
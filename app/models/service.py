@@ -1,6 +1,8 @@
 """Service model."""
 from datetime import datetime
+from sqlalchemy.orm import validates
 from app import db
+from app.utils.text import fold
 
 
 class Service(db.Model):
@@ -10,6 +12,7 @@ class Service(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
+    name_key = db.Column(db.String(200), unique=True, index=True)  # Case- and diacritic-folded name
     description = db.Column(db.Text)
     category = db.Column(db.String(100), nullable=False)  # plumbing, sanitary, installation, repair, etc.
     price = db.Column(db.Numeric(10, 2), nullable=False)
@@ -21,6 +24,12 @@ class Service(db.Model):
     # Relationships
     appointments = db.relationship('Appointment', backref='service', lazy=True)
     
+    @validates('name')
+    def _sync_name_key(self, key, name):
+        """Keep the normalized lookup key in step with the display name."""
+        self.name_key = fold(name)
+        return name
+    
     def __repr__(self):
         return f'<Service {self.name}>'
     
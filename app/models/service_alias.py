@@ -0,0 +1,41 @@
+"""Service alias model mapping alternative names to catalog services."""
+from datetime import datetime
+from sqlalchemy.orm import validates
+from app import db
+from app.utils.text import fold
+
+
+class ServiceAlias(db.Model):
+    """Alternative name under which a service may be requested by public forms."""
+    
+    __tablename__ = 'service_aliases'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    alias = db.Column(db.String(200), nullable=False)
+    alias_key = db.Column(db.String(200), unique=True, nullable=False, index=True)  # Folded alias
+    service_id = db.Column(db.Integer, db.ForeignKey('services.id', ondelete='CASCADE'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    service = db.relationship(
+        'Service',
+        backref=db.backref('aliases', lazy=True, cascade='all, delete-orphan')
+    )
+    
+    @validates('alias')
+    def _sync_alias_key(self, key, alias):
+        """Keep the normalized lookup key in step with the alias."""
+        self.alias_key = fold(alias)
+        return alias
+    
+    def __repr__(self):
+        return f'<ServiceAlias {self.alias} -> {self.service_id}>'
+    
+    def to_dict(self):
+        """Convert alias to dictionary."""
+        return {
+            'id': self.id,
+            'alias': self.alias,
+            'service_id': self.service_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -0,0 +1,26 @@
+"""Tombstone model - records hard deletes so incremental sync clients can drop rows."""
+from app import db
+from datetime import datetime
+
+
+class Tombstone(db.Model):
+    """Marker left behind when an appointment, customer or message is deleted."""
+    
+    __tablename__ = 'tombstones'
+    
+    id = db.Column(db.Integer, primary_key=True)  # Monotonic; used as the sync cursor
+    entity = db.Column(db.String(50), nullable=False)  # appointment, customer, message
+    entity_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    def to_dict(self):
+        """Convert tombstone to dictionary."""
+        return {
+            'id': self.id,
+            'entity': self.entity,
+            'entity_id': self.entity_id,
+            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None
+        }
+    
+    def __repr__(self):
+        return f'<Tombstone {self.entity}:{self.entity_id}>'
@@ -1,16 +1,134 @@
 """Admin routes for authentication and management."""
-from flask import Blueprint, request, jsonify, session, render_template, current_app
+from flask import Blueprint, request, jsonify, session, render_template, current_app, Response, stream_with_context, url_for
 from app import db
 from app.models.admin import Admin
 from app.models.customer import Customer
 from app.models.service import Service
 from app.models.appointment import Appointment
+from app.models.appointment_archive import AppointmentArchive
+from app.models.service_alias import ServiceAlias
+from app.models.erasure_job import ErasureJob
+from app.utils.scheduling import lock_day, check_slot, service_duration, SlotUnavailable, ACTIVE_STATUSES
+from app.utils.cache import cache
+from app.utils.text import fold
+from app.utils.events import stream_events
+from app.utils.ics import feed_window, feed_fingerprint, cached_feed, render_feed
+from app.utils.replica import read_replica, replica_configured, mark_primary
+from app.utils.metrics import METRICS, trend_series
+from app.utils.sync import sync_changes, decode_cursor, cursor_from_timestamp, InvalidCursor, DEFAULT_PAGE_SIZE
+from app.utils.ratelimit import rate_limit
+from app.utils.dedupe import suppression_stats
+from app.utils.inbox import inbox_order, unread_counts
+from app.utils.timeline import customer_timeline, TIMELINE_PAGE_SIZE
+from app.utils.erasure import create_job, start_job, is_stale, resume_stale_jobs
+from app.utils.bulk import (
+    appointment_conditions, set_appointment_status, message_conditions, triage_messages
+)
+from app.utils.validation import (
+    Schema, String, Email, Phone, Date, Time, Integer, Number, Boolean, Choice, List, Nested,
+    ValidationError, validate_json
+)
+from app.utils.projection import CLIENT_PROJECTION, APPOINTMENT_PROJECTION, MESSAGE_PROJECTION
+from app.utils.importer import import_csv, error_writer, ImportFormatError, IMPORT_KINDS
 from functools import wraps
-from datetime import datetime, timedelta
-import jwt
+from datetime import date, datetime, timedelta, timezone
+from werkzeug.http import http_date
+import io
+import json
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
+# Endpoints that may pass the JWT as ?token= (EventSource cannot set headers)
+QUERY_TOKEN_ENDPOINTS = {'admin.event_stream'}
+
+APPOINTMENT_STATUSES = ('pending', 'confirmed', 'completed', 'cancelled')
+MESSAGE_PRIORITIES = ('low', 'normal', 'high', 'urgent')
+
+LOGIN_SCHEMA = Schema({
+    'username': String(required=True, max_length=80),
+    'password': String(required=True, strip=False),
+}, missing_message='Username and password are required')
+
+CLIENT_UPDATE_SCHEMA = Schema({
+    'first_name': String(max_length=100, nullable=False),
+    'last_name': String(max_length=100, nullable=False),
+    'email': Email(nullable=False, error='Invalid email address'),
+    'phone': Phone(nullable=False, error='Invalid phone number'),
+    'address': String(max_length=200),
+    'notes': String(),
+})
+
+SERVICE_FIELDS = {
+    'name': String(max_length=200, nullable=False),
+    'description': String(),
+    'category': String(max_length=100, nullable=False),
+    'duration': Integer(min_value=1, max_value=24 * 60, nullable=False),
+    'price': Number(min_value=0, nullable=False),
+    'is_active': Boolean(nullable=False),
+}
+SERVICE_CREATE_SCHEMA = Schema(
+    {**SERVICE_FIELDS, 'name': String(required=True, max_length=200)},
+    missing_message='Service name is required'
+)
+SERVICE_UPDATE_SCHEMA = Schema(SERVICE_FIELDS)
+
+ALIAS_SCHEMA = Schema({
+    'alias': String(required=True, max_length=200),
+}, missing_message='Alias is required')
+
+APPOINTMENT_UPDATE_SCHEMA = Schema({
+    'status': Choice(APPOINTMENT_STATUSES, nullable=False),
+    'scheduled_date': Date(iso=True, nullable=False),
+    'scheduled_time': Time(iso=True, nullable=False),
+    'notes': String(),
+})
+
+MESSAGE_UPDATE_SCHEMA = Schema({
+    'is_read': Boolean(nullable=False),
+    'replied': Boolean(nullable=False),
+    'priority': Choice(MESSAGE_PRIORITIES, nullable=False),
+    'notes': String(),
+})
+
+# Bulk endpoints select rows by "ids" and/or "filter"; at least one is required
+MAX_BULK_IDS = 1000
+
+APPOINTMENT_BULK_SCHEMA = Schema({
+    'ids': List(Integer(min_value=1), min_items=1, max_items=MAX_BULK_IDS),
+    'filter': Nested(Schema({
+        'status': Choice(APPOINTMENT_STATUSES),
+        'customer_id': Integer(min_value=1),
+        'service_id': Integer(min_value=1),
+        'date_from': Date(iso=True),
+        'date_to': Date(iso=True),
+    })),
+    'status': Choice(APPOINTMENT_STATUSES, required=True),
+}, missing_message='Target status is required')
+
+MESSAGE_BULK_SCHEMA = Schema({
+    'ids': List(Integer(min_value=1), min_items=1, max_items=MAX_BULK_IDS),
+    'filter': Nested(Schema({
+        'is_read': Boolean(),
+        'replied': Boolean(),
+        'message_type': String(max_length=50),
+        'priority': Choice(MESSAGE_PRIORITIES),
+        'created_before': Date(iso=True),
+    })),
+    'is_read': Boolean(nullable=False),
+    'replied': Boolean(nullable=False),
+    'priority': Choice(MESSAGE_PRIORITIES, nullable=False),
+})
+
+
+@admin_bp.after_request
+def pin_admin_to_primary(response):
+    """After a successful admin change, read from the primary for a while."""
+    admin = getattr(request, 'current_admin', None)
+    if (admin is not None and request.method in ('POST', 'PUT', 'DELETE')
+            and response.status_code < 400 and replica_configured()):
+        mark_primary(admin.id)
+    return response
+
 
 def token_required(f):
     """Decorator to require valid JWT token."""
@@ -25,10 +143,13 @@ def token_required(f):
                 token = auth_header.split(' ')[1]  # Format: "Bearer <token>"
             except IndexError:
                 return jsonify({'error': 'Invalid authorization header format'}), 401
+        elif request.endpoint in QUERY_TOKEN_ENDPOINTS:
+            token = request.args.get('token')
         
         if not token:
             return jsonify({'error': 'Unauthorized', 'message': 'Token is missing'}), 401
         
+        import jwt  # Imported on first use to keep it out of startup
         try:
             # Decode and verify token
             data = jwt.decode(
@@ -101,15 +222,13 @@ def admin_appointments():
 # ==================== API ROUTES ====================
 
 @admin_bp.route('/api/login', methods=['POST'])
+@rate_limit('admin-login', per_ip='10/minute', per_endpoint='60/minute')
+@validate_json(LOGIN_SCHEMA)
 def login():
     """Admin login endpoint with JWT token generation."""
     try:
-        data = request.get_json()
-        username = data.get('username')
-        password = data.get('password')
-        
-        if not username or not password:
-            return jsonify({'error': 'Username and password are required'}), 400
+        username = request.validated['username']
+        password = request.validated['password']
         
         admin = Admin.query.filter_by(username=username).first()
         
@@ -128,6 +247,7 @@ def login():
             return jsonify({'error': 'Account is disabled'}), 403
         
         # Generate JWT token
+        import jwt
         token_payload = {
             'admin_id': admin.id,
             'username': admin.username,
@@ -204,8 +324,20 @@ def get_current_admin():
 
 # ==================== CLIENTS MANAGEMENT ====================
 
+def _appointment_counts(customer_ids):
+    """Appointment count per customer id, for a page of clients."""
+    if not customer_ids:
+        return {}
+    return dict(db.session.query(
+        Appointment.customer_id, db.func.count(Appointment.id)
+    ).filter(
+        Appointment.customer_id.in_(customer_ids)
+    ).group_by(Appointment.customer_id).all())
+
+
 @admin_bp.route('/api/clients', methods=['GET'])
 @token_required
+@read_replica
 def get_clients():
     """Get list of all clients with optional filtering and pagination."""
     try:
@@ -213,6 +345,10 @@ def get_clients():
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         search = request.args.get('search', '', type=str)
+        try:
+            fields = CLIENT_PROJECTION.parse(request.args.get('fields'))
+        except ValidationError as e:
+            return jsonify(e.to_dict()), 400
         
         # Build query
         query = Customer.query
@@ -232,17 +368,20 @@ def get_clients():
         # Order by most recent
         query = query.order_by(Customer.created_at.desc())
         
-        # Paginate
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        # Paginate; with ?fields= only the requested columns are selected
+        if fields is None:
+            pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+            clients = [customer.to_dict() for customer in pagination.items]
+        else:
+            query = query.with_entities(*CLIENT_PROJECTION.columns(Customer, fields, required=('id',)))
+            pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+            clients = [CLIENT_PROJECTION.dump(row, fields) for row in pagination.items]
         
-        clients = []
-        for customer in pagination.items:
-            client_data = customer.to_dict()
-            # Add appointment count
-            client_data['appointment_count'] = Appointment.query.filter_by(
-                customer_id=customer.id
-            ).count()
-            clients.append(client_data)
+        # Add appointment counts with one grouped query for the page
+        if fields is None or 'appointment_count' in fields:
+            counts = _appointment_counts([row.id for row in pagination.items])
+            for row, client_data in zip(pagination.items, clients):
+                client_data['appointment_count'] = counts.get(row.id, 0)
         
         return jsonify({
             'clients': clients,
@@ -269,7 +408,8 @@ def get_client(client_id):
         
         # Get appointments
         appointments = Appointment.query.filter_by(customer_id=client_id).order_by(
-            Appointment.appointment_date.desc()
+            Appointment.scheduled_date.desc(),
+            Appointment.scheduled_time.desc()
         ).all()
         
         client_data['appointments'] = [
@@ -280,14 +420,52 @@ def get_client(client_id):
             for appt in appointments
         ]
         
+        # Contact history, newest first (ix_messages_customer)
+        from app.models.message import Message
+        fields = MESSAGE_PROJECTION.presets['list']
+        messages = Message.query.filter_by(customer_id=client_id).with_entities(
+            *MESSAGE_PROJECTION.columns(Message, fields)
+        ).order_by(Message.created_at.desc(), Message.id.desc()).all()
+        client_data['messages'] = [MESSAGE_PROJECTION.dump(row, fields) for row in messages]
+        
         return jsonify({'client': client_data}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@admin_bp.route('/api/clients/<int:client_id>/timeline', methods=['GET'])
+@token_required
+@read_replica
+def get_client_timeline(client_id):
+    """
+    Appointments and messages of a client, newest first, one page at a time.
+    
+    Pass the returned ``next_cursor`` as ``?cursor=`` to get the next page.
+    """
+    try:
+        if db.session.get(Customer, client_id) is None:
+            return jsonify({'error': 'Client not found'}), 404
+        
+        limit = request.args.get('limit', TIMELINE_PAGE_SIZE, type=int)
+        try:
+            entries, next_cursor = customer_timeline(client_id, request.args.get('cursor'), limit)
+        except InvalidCursor as e:
+            return jsonify({'error': str(e), 'success': False}), 400
+        
+        return jsonify({
+            'success': True,
+            'entries': entries,
+            'next_cursor': next_cursor
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @admin_bp.route('/api/clients/<int:client_id>', methods=['PUT'])
 @token_required
+@validate_json(CLIENT_UPDATE_SCHEMA)
 def update_client(client_id):
     """Update client information."""
     try:
@@ -295,7 +473,7 @@ def update_client(client_id):
         if not customer:
             return jsonify({'error': 'Client not found'}), 404
         
-        data = request.get_json()
+        data = request.validated
         
         # Update fields
         if 'first_name' in data:
@@ -339,7 +517,8 @@ def delete_client(client_id):
         if appointments_count > 0:
             return jsonify({
                 'error': 'Cannot delete client with existing appointments',
-                'appointments_count': appointments_count
+                'appointments_count': appointments_count,
+                'erase_url': url_for('admin.erase_client', client_id=client_id)
             }), 400
         
         db.session.delete(customer)
@@ -355,6 +534,55 @@ def delete_client(client_id):
         return jsonify({'error': str(e)}), 500
 
 
+@admin_bp.route('/api/clients/<int:client_id>/erase', methods=['POST'])
+@token_required
+def erase_client(client_id):
+    """
+    Erase a client with their appointments and messages (GDPR request).
+    
+    The deletion runs in the background in batches; poll ``status_url``
+    for progress.
+    """
+    try:
+        customer = db.session.get(Customer, client_id)
+        if not customer:
+            return jsonify({'error': 'Client not found'}), 404
+        
+        # Returns the unfinished job for this client if there is one; starting
+        # it again is a no-op while another worker makes progress on it
+        job = create_job(customer, requested_by=request.current_admin.username)
+        start_job(job.id)
+        # Pick up jobs that died with a recycled or restarted worker
+        resume_stale_jobs(exclude=(job.id,))
+        
+        return jsonify({
+            'success': True,
+            'job': job.to_dict(),
+            'status_url': url_for('admin.get_erasure_job', job_id=job.id)
+        }), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@admin_bp.route('/api/erasure-jobs/<int:job_id>', methods=['GET'])
+@token_required
+def get_erasure_job(job_id):
+    """Progress of a client erasure job."""
+    try:
+        job = db.session.get(ErasureJob, job_id)
+        if not job:
+            return jsonify({'error': 'Erasure job not found'}), 404
+        if is_stale(job):
+            # The worker running it was recycled or restarted
+            start_job(job.id)
+        return jsonify({'success': True, 'job': job.to_dict()}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 # ==================== SERVICES MANAGEMENT ====================
 
 @admin_bp.route('/api/services', methods=['GET'])
@@ -411,17 +639,14 @@ def get_service(service_id):
 
 @admin_bp.route('/api/services', methods=['POST'])
 @token_required
+@validate_json(SERVICE_CREATE_SCHEMA)
 def create_service():
     """Create a new service."""
     try:
-        data = request.get_json()
-        
-        # Validate required fields
-        if not data.get('name'):
-            return jsonify({'error': 'Service name is required'}), 400
+        data = request.validated
         
-        # Check if service already exists
-        existing = Service.query.filter_by(name=data['name']).first()
+        # Check if service already exists (case- and diacritic-insensitive)
+        existing = Service.query.filter_by(name_key=fold(data['name'])).first()
         if existing:
             return jsonify({'error': 'Service with this name already exists'}), 400
         
@@ -450,6 +675,7 @@ def create_service():
 
 @admin_bp.route('/api/services/<int:service_id>', methods=['PUT'])
 @token_required
+@validate_json(SERVICE_UPDATE_SCHEMA)
 def update_service(service_id):
     """Update service information."""
     try:
@@ -457,13 +683,13 @@ def update_service(service_id):
         if not service:
             return jsonify({'error': 'Service not found'}), 404
         
-        data = request.get_json()
+        data = request.validated
         
         # Update fields
         if 'name' in data:
             # Check if new name conflicts with existing service
             existing = Service.query.filter(
-                Service.name == data['name'],
+                Service.name_key == fold(data['name']),
                 Service.id != service_id
             ).first()
             if existing:
@@ -476,6 +702,10 @@ def update_service(service_id):
             service.duration_minutes = data['duration']
         if 'price' in data:
             service.price = data['price']
+        if 'category' in data:
+            service.category = data['category']
+        if 'is_active' in data:
+            service.is_active = data['is_active']
         
         db.session.commit()
         
@@ -521,40 +751,385 @@ def delete_service(service_id):
         return jsonify({'error': str(e)}), 500
 
 
+@admin_bp.route('/api/services/<int:service_id>/aliases', methods=['GET'])
+@token_required
+def get_service_aliases(service_id):
+    """List alternative names that resolve to a service in public booking."""
+    try:
+        service = Service.query.get(service_id)
+        if not service:
+            return jsonify({'error': 'Service not found'}), 404
+        
+        aliases = ServiceAlias.query.filter_by(service_id=service_id).order_by(ServiceAlias.alias).all()
+        return jsonify({'aliases': [alias.to_dict() for alias in aliases]}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@admin_bp.route('/api/services/<int:service_id>/aliases', methods=['POST'])
+@token_required
+@validate_json(ALIAS_SCHEMA)
+def create_service_alias(service_id):
+    """Map an alternative name (e.g. a public form label) to a service."""
+    try:
+        service = Service.query.get(service_id)
+        if not service:
+            return jsonify({'error': 'Service not found'}), 404
+        
+        data = request.validated
+        
+        alias_key = fold(data['alias'])
+        if ServiceAlias.query.filter_by(alias_key=alias_key).first() or \
+                Service.query.filter_by(name_key=alias_key).first():
+            return jsonify({'error': 'This name is already used by a service or alias'}), 400
+        
+        alias = ServiceAlias(alias=data['alias'], service_id=service_id)
+        db.session.add(alias)
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'message': 'Alias created successfully',
+            'alias': alias.to_dict()
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@admin_bp.route('/api/services/aliases/<int:alias_id>', methods=['DELETE'])
+@token_required
+def delete_service_alias(alias_id):
+    """Delete a service alias."""
+    try:
+        alias = ServiceAlias.query.get(alias_id)
+        if not alias:
+            return jsonify({'error': 'Alias not found'}), 404
+        
+        db.session.delete(alias)
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'message': 'Alias deleted successfully'
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
 # ==================== DASHBOARD STATS ====================
 
+def _dashboard_stats():
+    """Counts for the dashboard cards."""
+    total_clients = Customer.query.count()
+    total_services = Service.query.count()
+    total_appointments = Appointment.query.count()
+    pending_appointments = Appointment.query.filter_by(status='pending').count()
+    confirmed_appointments = Appointment.query.filter_by(status='confirmed').count()
+    
+    # Recent clients (last 7 days)
+    seven_days_ago = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    seven_days_ago = seven_days_ago - timedelta(days=7)
+    recent_clients = Customer.query.filter(Customer.created_at >= seven_days_ago).count()
+    
+    # Duplicate contact/registration messages that were not stored or emailed
+    suppressed_messages, suppressed_recent = suppression_stats(seven_days_ago)
+    
+    return {
+        'total_clients': total_clients,
+        'total_services': total_services,
+        'total_appointments': total_appointments,
+        'pending_appointments': pending_appointments,
+        'confirmed_appointments': confirmed_appointments,
+        'recent_clients': recent_clients,
+        'suppressed_messages': suppressed_messages,
+        'suppressed_messages_recent': suppressed_recent
+    }
+
+
 @admin_bp.route('/api/stats', methods=['GET'])
 @token_required
+@read_replica
 def get_stats():
-    """Get dashboard statistics."""
+    """
+    Get dashboard statistics.
+    
+    Cached for all workers until a customer, service or appointment changes
+    (suppression counts may lag by up to ``STATS_CACHE_SECONDS``).
+    """
     try:
-        total_clients = Customer.query.count()
-        total_services = Service.query.count()
-        total_appointments = Appointment.query.count()
-        pending_appointments = Appointment.query.filter_by(status='pending').count()
-        confirmed_appointments = Appointment.query.filter_by(status='confirmed').count()
+        stats = cache.get_or_set(
+            'admin:stats',
+            _dashboard_stats,
+            ttl=current_app.config.get('STATS_CACHE_SECONDS', 60),
+            tags=('appointments', 'customers', 'services')
+        )
+        return jsonify({'stats': stats}), 200
         
-        # Recent clients (last 7 days)
-        seven_days_ago = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        from datetime import timedelta
-        seven_days_ago = seven_days_ago - timedelta(days=7)
-        recent_clients = Customer.query.filter(Customer.created_at >= seven_days_ago).count()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@admin_bp.route('/api/stats/trends', methods=['GET'])
+@token_required
+@read_replica
+def get_stats_trends():
+    """
+    Daily series for the dashboard trend charts, read from ``daily_metrics``.
+    
+    Query parameters: ``from``/``to`` (ISO dates, default the last 30 days),
+    ``metrics`` (comma-separated, default all) and ``breakdown`` (per service
+    or message type).
+    """
+    try:
+        try:
+            end = date.fromisoformat(request.args['to']) if request.args.get('to') else datetime.utcnow().date()
+            start = date.fromisoformat(request.args['from']) if request.args.get('from') else end - timedelta(days=29)
+        except ValueError:
+            return jsonify({'error': 'Invalid date format, use YYYY-MM-DD'}), 400
+        
+        if start > end:
+            return jsonify({'error': "'from' must not be after 'to'"}), 400
+        if (end - start).days > 731:
+            return jsonify({'error': 'Date range too large (max 2 years)'}), 400
+        
+        metrics = [m for m in request.args.get('metrics', ','.join(METRICS)).split(',') if m]
+        unknown = [m for m in metrics if m not in METRICS]
+        if unknown:
+            return jsonify({'error': f"Unknown metrics: {', '.join(unknown)}"}), 400
+        breakdown = request.args.get('breakdown', 'false').lower() in ['true', '1', 'yes']
+        
+        days, series = trend_series(start, end, metrics=metrics, breakdown=breakdown)
+        
+        if breakdown:
+            # Label service dimensions with their names
+            names = dict(db.session.query(Service.id, Service.name).all())
+            for metric in series.values():
+                for dimension in list(metric['by_dimension']):
+                    kind, _, key = dimension.partition(':')
+                    label = names.get(int(key), dimension) if kind == 'service' and key.isdigit() else key
+                    metric.setdefault('labels', {})[dimension] = label
         
         return jsonify({
-            'stats': {
-                'total_clients': total_clients,
-                'total_services': total_services,
-                'total_appointments': total_appointments,
-                'pending_appointments': pending_appointments,
-                'confirmed_appointments': confirmed_appointments,
-                'recent_clients': recent_clients
-            }
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'days': [day.isoformat() for day in days],
+            'series': series
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@admin_bp.route('/api/analytics', methods=['GET'])
+@token_required
+@read_replica
+def get_analytics_report():
+    """
+    Revenue, utilization, cancellation and lead-time analytics.
+    
+    Covers appointments scheduled between ``from`` and ``to`` (ISO dates,
+    default the last 90 days); archived appointments are included unless
+    ``include_archived=false``.
+    """
+    try:
+        try:
+            end = date.fromisoformat(request.args['to']) if request.args.get('to') else datetime.utcnow().date()
+            start = date.fromisoformat(request.args['from']) if request.args.get('from') else end - timedelta(days=89)
+        except ValueError:
+            return jsonify({'error': 'Invalid date format, use YYYY-MM-DD'}), 400
+        
+        if start > end:
+            return jsonify({'error': "'from' must not be after 'to'"}), 400
+        include_archived = request.args.get('include_archived', 'true').lower() in ['true', '1', 'yes']
+        
+        try:
+            from app.utils.analytics import get_analytics
+        except ImportError as e:
+            current_app.logger.error(f"Analytics dependencies missing: {str(e)}")
+            return jsonify({'error': 'Analytics is not available on this server'}), 503
+        
+        return jsonify(get_analytics(start, end, include_archived=include_archived)), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Error in get_analytics_report: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+# ==================== CSV IMPORT ====================
+
+@admin_bp.route('/api/import/<kind>', methods=['POST'])
+@token_required
+def import_data(kind):
+    """
+    Import customers, services or historical appointments from a CSV file.
+    
+    The file is sent as the ``file`` field of a multipart form or as the raw
+    body. ``encoding`` (default UTF-8) and ``delimiter`` (default: detected)
+    may be given as query parameters. The response lists the counts and the
+    first rejected rows; with ``report=csv`` the full error report is
+    returned as CSV and the counts in the ``X-Import-Result`` header.
+    """
+    if kind not in IMPORT_KINDS:
+        return jsonify({'error': f"Unknown import kind, use one of: {', '.join(IMPORT_KINDS)}"}), 404
+    
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    
+    report = None
+    on_error = None
+    if request.args.get('report') == 'csv':
+        report = io.StringIO()
+        on_error = error_writer(report)
+    
+    try:
+        result = import_csv(
+            stream, kind,
+            encoding=request.args.get('encoding') or 'utf-8-sig',
+            delimiter=request.args.get('delimiter') or None,
+            on_error=on_error
+        )
+    except LookupError:
+        return jsonify({'success': False, 'error': 'Unknown encoding'}), 400
+    except ImportFormatError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"CSV import of {kind} failed: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    
+    summary = {'success': True, **result.to_dict()}
+    if report is not None:
+        del summary['errors']
+        return Response(report.getvalue(), mimetype='text/csv', headers={
+            'Content-Disposition': f'attachment; filename={kind}-import-errors.csv',
+            'X-Import-Result': json.dumps(summary)
+        })
+    return jsonify(summary), 200
+
+
+# ==================== CALENDAR FEED ====================
+
+def _calendar_feed_url(admin):
+    return url_for('admin.calendar_feed', token=admin.calendar_token, _external=True)
+
+
+@admin_bp.route('/api/calendar/feed', methods=['GET'])
+@token_required
+def get_calendar_feed():
+    """Return the admin's .ics subscription URL, creating it on first use."""
+    try:
+        admin = request.current_admin
+        if not admin.calendar_token:
+            admin.rotate_calendar_token()
+            db.session.commit()
+        
+        return jsonify({'success': True, 'url': _calendar_feed_url(admin)}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@admin_bp.route('/api/calendar/feed/rotate', methods=['POST'])
+@token_required
+def rotate_calendar_feed():
+    """Replace the subscription URL, e.g. after a phone was lost."""
+    try:
+        admin = request.current_admin
+        admin.rotate_calendar_token()
+        db.session.commit()
+        
+        return jsonify({'success': True, 'url': _calendar_feed_url(admin)}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@admin_bp.route('/calendar/<token>.ics', methods=['GET'])
+def calendar_feed(token):
+    """
+    iCalendar feed of upcoming appointments for calendar subscriptions.
+    
+    Authenticated by the secret token in the URL, since calendar clients
+    cannot send a JWT. Supports ETag and Last-Modified revalidation.
+    """
+    admin = Admin.query.filter_by(calendar_token=token).first()
+    if not admin or not admin.is_active:
+        return jsonify({'error': 'Calendar feed not found'}), 404
+    
+    start, end = feed_window()
+    etag, last_modified = feed_fingerprint(start, end)
+    last_modified = last_modified.replace(tzinfo=timezone.utc)
+    
+    headers = {
+        'ETag': f'"{etag}"',
+        'Last-Modified': http_date(last_modified),
+        'Cache-Control': 'private, max-age=300'
+    }
+    
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = bool(request.if_modified_since and request.if_modified_since >= last_modified)
+    if not_modified:
+        return Response(status=304, headers=headers)
+    
+    body = cached_feed(start, end, etag)
+    if body is None:
+        body = stream_with_context(render_feed(start, end, etag, host=request.host.split(':')[0]))
+    
+    response = Response(body, mimetype='text/calendar', headers=headers)
+    response.headers['Content-Disposition'] = 'inline; filename=sanbud.ics'
+    return response
+
+
+# ==================== INCREMENTAL SYNC ====================
+
+@admin_bp.route('/api/sync', methods=['GET'])
+@token_required
+def sync():
+    """
+    Appointments, customers and messages changed since the client's last sync.
+    
+    Pass the ``cursor`` from the previous response, or ``updated_since``
+    (ISO timestamp) to start from a watermark; with neither, everything is
+    returned. Deleted rows are listed by id under ``deleted``; rows that
+    committed late behind the cursor come again under ``resent``. Repeat
+    while ``has_more`` is true.
+    """
+    try:
+        cursor = request.args.get('cursor')
+        updated_since = request.args.get('updated_since')
+        limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        
+        if cursor:
+            positions, tombstone_id, recent = decode_cursor(cursor)
+        elif updated_since:
+            try:
+                since = datetime.fromisoformat(updated_since.replace('Z', '+00:00')).replace(tzinfo=None)
+            except ValueError:
+                return jsonify({'error': 'Invalid updated_since timestamp'}), 400
+            positions, tombstone_id = cursor_from_timestamp(since)
+            recent = None
+        else:
+            positions, tombstone_id, recent = {}, None, None
+        
+        return jsonify(sync_changes(
+            positions, tombstone_id, recent, limit=limit,
+            overlap_seconds=current_app.config.get('SYNC_OVERLAP_SECONDS', 60)
+        )), 200
+        
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @admin_bp.route('/api/init-admin-secure', methods=['POST'])
 def init_admin_secure():
     """
@@ -635,6 +1210,7 @@ def init_admin_secure():
 
 @admin_bp.route('/api/appointments', methods=['GET'])
 @token_required
+@read_replica
 def get_appointments():
     """Get all appointments with filters."""
     try:
@@ -653,42 +1229,82 @@ def get_appointments():
         service_id = request.args.get('service_id', type=int)
         date_from = request.args.get('date_from')
         date_to = request.args.get('date_to')
+        include_archived = request.args.get('include_archived', 'false').lower() in ['true', '1', 'yes']
+        try:
+            fields = APPOINTMENT_PROJECTION.parse(request.args.get('fields'))
+        except ValidationError as e:
+            return jsonify(e.to_dict()), 400
         
-        # Base query
-        query = Appointment.query
-        
-        # Apply filters
-        if status:
-            query = query.filter_by(status=status)
-        if customer_id:
-            query = query.filter_by(customer_id=customer_id)
-        if service_id:
-            query = query.filter_by(service_id=service_id)
-        if date_from:
-            from datetime import datetime
-            date_from_obj = datetime.fromisoformat(date_from).date()
-            query = query.filter(Appointment.scheduled_date >= date_from_obj)
-        if date_to:
-            from datetime import datetime
-            date_to_obj = datetime.fromisoformat(date_to).date()
-            query = query.filter(Appointment.scheduled_date <= date_to_obj)
-        
-        # Order by date and time
-        appointments = query.order_by(
-            Appointment.scheduled_date.desc(),
-            Appointment.scheduled_time.desc()
-        ).all()
+        def filtered(model):
+            query = model.query
+            
+            # Apply filters
+            if status:
+                query = query.filter_by(status=status)
+            if customer_id:
+                query = query.filter_by(customer_id=customer_id)
+            if service_id:
+                query = query.filter_by(service_id=service_id)
+            if date_from:
+                date_from_obj = datetime.fromisoformat(date_from).date()
+                query = query.filter(model.scheduled_date >= date_from_obj)
+            if date_to:
+                date_to_obj = datetime.fromisoformat(date_to).date()
+                query = query.filter(model.scheduled_date <= date_to_obj)
+            
+            # Select only the requested columns; ids and the sort key are always needed
+            if fields is not None:
+                query = query.with_entities(*APPOINTMENT_PROJECTION.columns(
+                    model, fields, required=('id', 'customer_id', 'service_id', 'scheduled_date', 'scheduled_time')
+                ))
+            
+            # Order by date and time
+            return query.order_by(
+                model.scheduled_date.desc(),
+                model.scheduled_time.desc()
+            ).all()
+        
+        appointments = filtered(Appointment)
+        if include_archived:
+            appointments = sorted(
+                appointments + filtered(AppointmentArchive),
+                key=lambda appt: (appt.scheduled_date, appt.scheduled_time),
+                reverse=True
+            )
         
         current_app.logger.info(f"Found {len(appointments)} appointments")
         
+        # Load the customers and services of all rows with one query each
+        with_customer = fields is None or 'customer' in fields
+        with_service = fields is None or 'service' in fields
+        customers = {}
+        if with_customer:
+            customer_ids = {appt.customer_id for appt in appointments}
+            customers = {
+                customer.id: customer for customer in Customer.query.with_entities(
+                    Customer.id, Customer.first_name, Customer.last_name, Customer.email, Customer.phone
+                ).filter(Customer.id.in_(customer_ids))
+            } if customer_ids else {}
+        services = {}
+        if with_service:
+            service_ids = {appt.service_id for appt in appointments}
+            services = {
+                service.id: service for service in Service.query.with_entities(
+                    Service.id, Service.name, Service.duration_minutes, Service.price
+                ).filter(Service.id.in_(service_ids))
+            } if service_ids else {}
+        
         # Enrich with customer and service data
         appointments_data = []
         for appt in appointments:
             try:
-                appt_dict = appt.to_dict()
+                if fields is None:
+                    appt_dict = appt.to_dict()
+                else:
+                    appt_dict = APPOINTMENT_PROJECTION.dump(appt, fields)
                 
                 # Add customer info
-                customer = Customer.query.get(appt.customer_id)
+                customer = customers.get(appt.customer_id)
                 if customer:
                     appt_dict['customer'] = {
                         'id': customer.id,
@@ -699,7 +1315,7 @@ def get_appointments():
                     }
                 
                 # Add service info
-                service = Service.query.get(appt.service_id)
+                service = services.get(appt.service_id)
                 if service:
                     appt_dict['service'] = {
                         'id': service.id,
@@ -725,7 +1341,8 @@ def get_appointments():
                     'customer_id': customer_id,
                     'service_id': service_id,
                     'date_from': date_from,
-                    'date_to': date_to
+                    'date_to': date_to,
+                    'include_archived': include_archived
                 }
             }
         }), 200
@@ -744,7 +1361,10 @@ def get_appointment(appointment_id):
         from app.models.customer import Customer
         from app.models.service import Service
         
-        appointment = Appointment.query.get_or_404(appointment_id)
+        appointment = Appointment.query.get(appointment_id)
+        if not appointment:
+            # Old appointments may have been moved to the archive
+            appointment = AppointmentArchive.query.get_or_404(appointment_id)
         appt_dict = appointment.to_dict()
         
         # Add customer info
@@ -768,23 +1388,34 @@ def get_appointment(appointment_id):
 
 @admin_bp.route('/api/appointments/<int:appointment_id>', methods=['PUT'])
 @token_required
+@validate_json(APPOINTMENT_UPDATE_SCHEMA)
 def update_appointment(appointment_id):
     """Update appointment status or details."""
     try:
         from app.models.appointment import Appointment
         
         appointment = Appointment.query.get_or_404(appointment_id)
-        data = request.get_json()
+        data = request.validated
+        
+        new_status = data.get('status', appointment.status)
+        new_date = data.get('scheduled_date', appointment.scheduled_date)
+        new_time = data.get('scheduled_time', appointment.scheduled_time)
+        
+        # Moving or re-activating an appointment must not overlap another booking
+        slot_changed = (new_date, new_time) != (appointment.scheduled_date, appointment.scheduled_time)
+        reactivated = new_status in ACTIVE_STATUSES and appointment.status not in ACTIVE_STATUSES
+        if new_status in ACTIVE_STATUSES and (slot_changed or reactivated):
+            db.session.commit()  # end the read so the day lock is the first statement
+            lock_day(new_date)
+            check_slot(new_date, new_time, service_duration(appointment.service_id), exclude_id=appointment.id)
         
         # Update allowed fields
         if 'status' in data:
             appointment.status = data['status']
         if 'scheduled_date' in data:
-            from datetime import datetime
-            appointment.scheduled_date = datetime.fromisoformat(data['scheduled_date']).date()
+            appointment.scheduled_date = new_date
         if 'scheduled_time' in data:
-            from datetime import datetime
-            appointment.scheduled_time = datetime.fromisoformat(data['scheduled_time']).time()
+            appointment.scheduled_time = new_time
         if 'notes' in data:
             appointment.notes = data['notes']
         
@@ -797,6 +1428,42 @@ def update_appointment(appointment_id):
             'appointment': appointment.to_dict()
         }), 200
         
+    except SlotUnavailable as e:
+        db.session.rollback()
+        return jsonify(e.to_dict()), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@admin_bp.route('/api/appointments/bulk', methods=['POST'])
+@token_required
+@validate_json(APPOINTMENT_BULK_SCHEMA)
+def bulk_update_appointments():
+    """
+    Set the status of many appointments at once.
+    
+    Body: ``{"ids": [...]}`` and/or ``{"filter": {...}}`` (list filters) plus
+    ``"status"``. Cancelled or completed appointments are not re-activated.
+    """
+    try:
+        data = request.validated
+        # Blank filter values add no condition; never update the whole table
+        conditions = appointment_conditions(data.get('ids'), data.get('filter'))
+        if not conditions:
+            return jsonify({'error': 'Provide ids or a filter', 'success': False}), 400
+        
+        matched, updated_ids = set_appointment_status(conditions, data['status'])
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'matched': matched,
+            'updated': len(updated_ids),
+            'skipped': matched - len(updated_ids),
+            'ids': updated_ids
+        }), 200
+        
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -829,6 +1496,7 @@ def delete_appointment(appointment_id):
 
 @admin_bp.route('/api/messages', methods=['GET'])
 @token_required
+@read_replica
 def get_messages():
     """Get all contact messages with filters."""
     try:
@@ -843,6 +1511,10 @@ def get_messages():
         replied = request.args.get('replied')
         message_type = request.args.get('message_type')
         priority = request.args.get('priority')
+        try:
+            fields = MESSAGE_PROJECTION.parse(request.args.get('fields'))
+        except ValidationError as e:
+            return jsonify(e.to_dict()), 400
         
         # Base query
         query = Message.query
@@ -859,14 +1531,19 @@ def get_messages():
         if priority:
             query = query.filter_by(priority=priority)
         
-        # Order by priority and date
-        messages = query.order_by(
-            Message.created_at.desc()
-        ).all()
+        # Select only the requested columns; message bodies stay in the database
+        if fields is not None:
+            query = query.with_entities(*MESSAGE_PROJECTION.columns(Message, fields, required=('id',)))
+        
+        # Order by priority and date: unread urgent messages first (ix_messages_inbox)
+        messages = query.order_by(*inbox_order()).all()
         
         current_app.logger.info(f"Found {len(messages)} messages")
         
-        messages_data = [msg.to_dict() for msg in messages]
+        if fields is None:
+            messages_data = [msg.to_dict() for msg in messages]
+        else:
+            messages_data = [MESSAGE_PROJECTION.dump(row, fields) for row in messages]
         current_app.logger.info(f"Returning {len(messages_data)} messages in response")
         
         return jsonify({
@@ -888,6 +1565,21 @@ def get_messages():
         return jsonify({'error': str(e), 'success': False}), 500
 
 
+@admin_bp.route('/api/messages/unread-counts', methods=['GET'])
+@token_required
+def get_unread_counts():
+    """Unread message counts per priority, for the navigation badge."""
+    try:
+        counts = unread_counts()
+        return jsonify({
+            'success': True,
+            'unread': counts,
+            'total': sum(counts.values())
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e), 'success': False}), 500
+
+
 @admin_bp.route('/api/messages/<int:message_id>', methods=['GET'])
 @token_required
 def get_message(message_id):
@@ -911,13 +1603,14 @@ def get_message(message_id):
 
 @admin_bp.route('/api/messages/<int:message_id>', methods=['PUT'])
 @token_required
+@validate_json(MESSAGE_UPDATE_SCHEMA)
 def update_message(message_id):
     """Update message status or notes."""
     try:
         from app.models.message import Message
         
         message = Message.query.get_or_404(message_id)
-        data = request.get_json()
+        data = request.validated
         
         # Update allowed fields
         if 'is_read' in data:
@@ -944,6 +1637,42 @@ def update_message(message_id):
         return jsonify({'error': str(e)}), 500
 
 
+@admin_bp.route('/api/messages/bulk', methods=['POST'])
+@token_required
+@validate_json(MESSAGE_BULK_SCHEMA)
+def bulk_update_messages():
+    """
+    Mark many messages read/replied or change their priority at once.
+    
+    Body: ``{"ids": [...]}`` and/or ``{"filter": {...}}`` plus any of
+    ``is_read``, ``replied`` and ``priority``.
+    """
+    try:
+        data = request.validated
+        # Blank filter values add no condition; never update the whole table
+        conditions = message_conditions(data.get('ids'), data.get('filter'))
+        if not conditions:
+            return jsonify({'error': 'Provide ids or a filter', 'success': False}), 400
+        changes = {name: data[name] for name in ('is_read', 'replied', 'priority') if name in data}
+        if not changes:
+            return jsonify({'error': 'Nothing to update', 'success': False}), 400
+        
+        matched, updated_ids = triage_messages(conditions, changes)
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'matched': matched,
+            'updated': len(updated_ids),
+            'skipped': matched - len(updated_ids),
+            'ids': updated_ids
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
 @admin_bp.route('/api/messages/<int:message_id>', methods=['DELETE'])
 @token_required
 def delete_message(message_id):
@@ -963,3 +1692,30 @@ def delete_message(message_id):
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
+
+
+@admin_bp.route('/api/events/stream', methods=['GET'])
+@token_required
+def event_stream():
+    """
+    Live appointment and message changes as server-sent events.
+    
+    Resumes after the ``Last-Event-ID`` header (sent automatically by
+    EventSource on reconnect) or the ``last_event_id`` query parameter.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'error': 'Invalid Last-Event-ID'}), 400
+    
+    # Release the request's session before the long-lived response
+    db.session.remove()
+    
+    response = Response(
+        stream_with_context(stream_events(last_event_id)),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
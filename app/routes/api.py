@@ -4,71 +4,103 @@ from datetime import datetime
 from app import db
 from app.models.customer import Customer
 from app.models.message import Message
+from app.utils.cache import cache
+from app.utils.idempotency import idempotent
+from app.utils.ratelimit import rate_limit
+from app.utils.dedupe import check_message, attach_message
+from app.utils.validation import (
+    Schema, String, Email, Phone, Date, Time, Choice, validate_json
+)
+from app.utils.customers import upsert_customer, split_name, customer_id_for_email
+from app.utils.service_catalog import resolve_booking_service
+from app.utils.scheduling import lock_day, check_slot, SlotUnavailable
 from config.email import send_contact_email, send_booking_confirmation
 
 bp = Blueprint('api', __name__, url_prefix='/api')
 
+INVALID_EMAIL = 'Nieprawidłowy format adresu email'
+INVALID_PHONE = 'Nieprawidłowy numer telefonu'
+INVALID_DATE_TIME = 'Nieprawidłowy format daty lub godziny'
+
+REGISTER_SCHEMA = Schema({
+    'first_name': String(required=True, max_length=100),
+    'last_name': String(required=True, max_length=100),
+    'email': Email(required=True, error=INVALID_EMAIL),
+    'phone': Phone(required=True, error=INVALID_PHONE),
+    'address': String(max_length=200),
+    'city': String(max_length=100),
+    'postal_code': String(max_length=20),
+    'subject': String(max_length=200),
+    'message': String(),
+    'message_type': String(max_length=50),
+}, missing_message='Missing required fields: {fields}')
+
+CONTACT_SCHEMA = Schema({
+    'name': String(required=True, max_length=200),
+    'email': Email(required=True, error=INVALID_EMAIL),
+    'phone': Phone(error=INVALID_PHONE),
+    'subject': String(max_length=200),
+    'message': String(required=True),
+    'message_type': String(max_length=50),
+    'priority': Choice(('low', 'normal', 'high', 'urgent')),
+}, missing_message='Brakujące wymagane pola: {fields}')
+
+BOOKING_SCHEMA = Schema({
+    'name': String(required=True, max_length=200),
+    'email': Email(required=True, error=INVALID_EMAIL),
+    'phone': Phone(required=True, error=INVALID_PHONE),
+    'service': String(required=True, max_length=200),
+    'date': Date(required=True, error=INVALID_DATE_TIME),
+    'time': Time(required=True, error=INVALID_DATE_TIME),
+    'address': String(max_length=500),
+    'description': String(),
+}, missing_message='Brakujące wymagane pola: {fields}')
+
 
 @bp.route('/clients/register', methods=['POST'])
+@rate_limit('register', per_ip='5/minute', per_endpoint='60/minute')
+@idempotent
+@validate_json(REGISTER_SCHEMA)
 def register_client():
     """
     Public endpoint for client registration.
     Creates a new customer record and optionally a message.
     """
     try:
-        data = request.get_json()
-        
-        # Validate required fields
-        required_fields = ['first_name', 'last_name', 'email', 'phone']
-        missing_fields = [field for field in required_fields if not data.get(field)]
-        
-        if missing_fields:
-            return jsonify({
-                'success': False,
-                'error': f'Missing required fields: {", ".join(missing_fields)}'
-            }), 400
-        
-        # Check if customer already exists
-        existing_customer = Customer.query.filter_by(email=data['email']).first()
-        
-        if existing_customer:
-            # Update existing customer if provided
-            if data.get('address'):
-                existing_customer.address = data['address']
-            if data.get('city'):
-                existing_customer.city = data['city']
-            if data.get('postal_code'):
-                existing_customer.postal_code = data['postal_code']
-            existing_customer.updated_at = datetime.utcnow()
-            
-            customer = existing_customer
-            is_new = False
-        else:
-            # Create new customer
-            customer = Customer(
-                first_name=data['first_name'],
-                last_name=data['last_name'],
-                email=data['email'],
-                phone=data['phone'],
-                address=data.get('address'),
-                city=data.get('city'),
-                postal_code=data.get('postal_code')
-            )
-            db.session.add(customer)
-            is_new = True
+        data = request.validated
+        
+        # Insert the customer or refresh the address of an existing one
+        customer_id, is_new = upsert_customer(
+            data['email'],
+            update=('address', 'city', 'postal_code'),
+            first_name=data['first_name'],
+            last_name=data['last_name'],
+            phone=data['phone'],
+            address=data.get('address') or None,
+            city=data.get('city') or None,
+            postal_code=data.get('postal_code') or None
+        )
         
-        # Create a message if there's a message or subject
+        # Create a message if there's a message or subject, unless it repeats a recent one
+        duplicate = False
         if data.get('message') or data.get('subject'):
+            verdict = check_message('register', data['email'], data.get('message') or data.get('subject'))
+            duplicate = verdict.duplicate
+        if (data.get('message') or data.get('subject')) and not duplicate:
             message = Message(
+                customer_id=customer_id,
                 name=f"{data['first_name']} {data['last_name']}",
                 email=data['email'],
                 phone=data['phone'],
-                subject=data.get('subject', 'Zapytanie z formularza kontaktowego'),
-                message=data.get('message', 'Nowy klient zarejestrowany przez formularz'),
-                message_type=data.get('message_type', 'inquiry'),
-                priority='normal'
+                subject=data.get('subject') or 'Zapytanie z formularza kontaktowego',
+                message=data.get('message') or 'Nowy klient zarejestrowany przez formularz',
+                message_type=data.get('message_type') or 'inquiry',
+                priority='normal',
+                similar_to_id=verdict.similar_message_id
             )
             db.session.add(message)
+            db.session.flush()
+            attach_message(verdict, message.id)
         
         # Commit all changes
         db.session.commit()
@@ -76,8 +108,9 @@ def register_client():
         return jsonify({
             'success': True,
             'message': 'Dziękujemy za rejestrację! Skontaktujemy się wkrótce.' if is_new else 'Dane zaktualizowane pomyślnie!',
-            'customer_id': customer.id,
-            'is_new': is_new
+            'customer_id': customer_id,
+            'is_new': is_new,
+            'duplicate': duplicate
         }), 201 if is_new else 200
         
     except Exception as e:
@@ -89,49 +122,58 @@ def register_client():
 
 
 @bp.route('/contact', methods=['POST'])
+@rate_limit('contact', per_ip='5/minute', per_endpoint='60/minute')
+@idempotent
+@validate_json(CONTACT_SCHEMA)
 def contact_form():
     """
     Public endpoint for contact form submissions.
     Creates a message record and sends email notification.
     """
     try:
-        data = request.get_json()
+        data = request.validated
         
-        # Validate required fields
-        required_fields = ['name', 'email', 'message']
-        missing_fields = [field for field in required_fields if not data.get(field)]
-        
-        if missing_fields:
+        # Repeated submissions (double clicks, bots) are acknowledged without a new row or email
+        verdict = check_message('contact', data['email'], data['message'])
+        if verdict.duplicate:
+            db.session.commit()
             return jsonify({
-                'success': False,
-                'error': f'Brakujące wymagane pola: {", ".join(missing_fields)}'
-            }), 400
+                'success': True,
+                'message': 'Dziękujemy za wiadomość! Odpowiemy najszybciej jak to możliwe.',
+                'email_sent': False,
+                'duplicate': True
+            }), 200
         
         # Create message record
         message = Message(
+            customer_id=customer_id_for_email(data['email']),
             name=data['name'],
             email=data['email'],
-            phone=data.get('phone', ''),
-            subject=data.get('subject', f"Wiadomość od {data['name']}"),
+            phone=data.get('phone') or '',
+            subject=data.get('subject') or f"Wiadomość od {data['name']}",
             message=data['message'],
-            message_type=data.get('message_type', 'contact'),
-            priority=data.get('priority', 'normal')
+            message_type=data.get('message_type') or 'contact',
+            priority=data.get('priority') or 'normal',
+            similar_to_id=verdict.similar_message_id
         )
         db.session.add(message)
+        db.session.flush()
+        attach_message(verdict, message.id)
         db.session.commit()
         
         # Send email notification using new email system
         email_sent = send_contact_email(
             name=data['name'],
             email=data['email'],
-            phone=data.get('phone', 'Nie podano'),
+            phone=data.get('phone') or 'Nie podano',
             message=data['message']
         )
         
         return jsonify({
             'success': True,
             'message': 'Dziękujemy za wiadomość! Odpowiemy najszybciej jak to możliwe.',
-            'email_sent': email_sent
+            'email_sent': email_sent,
+            'duplicate': False
         }), 201
         
     except Exception as e:
@@ -144,6 +186,9 @@ def contact_form():
 
 
 @bp.route('/book-appointment', methods=['POST'])
+@rate_limit('booking', per_ip='5/minute', per_endpoint='60/minute')
+@idempotent
+@validate_json(BOOKING_SCHEMA)
 def book_appointment():
     """
     Public endpoint for booking appointments.
@@ -151,40 +196,11 @@ def book_appointment():
     """
     try:
         from app.models.appointment import Appointment
-        from app.models.customer import Customer
-        from app.models.service import Service
-        import re
+        from datetime import date
         
-        data = request.get_json()
-        
-        # Validate required fields
-        required_fields = ['name', 'email', 'phone', 'service', 'date', 'time']
-        missing_fields = [field for field in required_fields if not data.get(field)]
-        
-        if missing_fields:
-            return jsonify({
-                'success': False,
-                'error': f'Brakujące wymagane pola: {", ".join(missing_fields)}'
-            }), 400
-        
-        # Validate email format
-        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        if not re.match(email_pattern, data['email']):
-            return jsonify({
-                'success': False,
-                'error': 'Nieprawidłowy format adresu email'
-            }), 400
-        
-        # Parse date and time
-        from datetime import datetime, date
-        try:
-            appointment_date = datetime.strptime(data['date'], '%Y-%m-%d').date()
-            appointment_time = datetime.strptime(data['time'], '%H:%M').time()
-        except ValueError:
-            return jsonify({
-                'success': False,
-                'error': 'Nieprawidłowy format daty lub godziny'
-            }), 400
+        data = request.validated
+        appointment_date = data['date']
+        appointment_time = data['time']
         
         # Validate that the appointment is not in the past
         if appointment_date < date.today():
@@ -193,43 +209,28 @@ def book_appointment():
                 'error': 'Nie można zarezerwować terminu w przeszłości'
             }), 400
         
-        # Find or create customer
-        customer = Customer.query.filter_by(email=data['email']).first()
-        
-        if customer:
-            # Update existing customer
-            customer.first_name = data['name'].split()[0] if data['name'] else 'Klient'
-            customer.last_name = ' '.join(data['name'].split()[1:]) if len(data['name'].split()) > 1 else ''
-            customer.phone = data['phone']
-            if data.get('address'):
-                customer.address = data['address']
-            customer.updated_at = datetime.utcnow()
-        else:
-            # Create new customer
-            customer = Customer(
-                first_name=data['name'].split()[0] if data['name'] else 'Klient',
-                last_name=' '.join(data['name'].split()[1:]) if len(data['name'].split()) > 1 else '',
-                email=data['email'],
-                phone=data['phone'],
-                address=data.get('address', '')
-            )
-            db.session.add(customer)
-            db.session.flush()  # Get customer ID
-        
-        # Find service (try by name first, then create if needed)
-        service = Service.query.filter_by(name=data['service']).first()
-        if not service:
-            # Create basic service entry
-            service = Service(
-                name=data['service'],
-                description=f"Usługa: {data['service']}",
-                category='repair',  # default category
-                duration_minutes=60,  # default 1 hour
-                price=0,  # price to be determined
-                is_active=True
-            )
-            db.session.add(service)
-            db.session.flush()  # Get service ID
+        # Serialise bookings for this day before touching the database
+        lock_day(appointment_date)
+        
+        # Insert the customer or refresh the contact details of an existing one
+        first_name, last_name = split_name(data['name'])
+        customer_id, _ = upsert_customer(
+            data['email'],
+            update=('first_name', 'last_name', 'phone', 'address'),
+            first_name=first_name,
+            last_name=last_name,
+            phone=data['phone'],
+            address=data.get('address') or None
+        )
+        
+        # Resolve the service by name or alias; unknown names use the fallback service
+        service, service_matched = resolve_booking_service(data['service'])
+        notes = data.get('description') or ''
+        if not service_matched:
+            notes = f"Usługa: {data['service']}\n{notes}".strip()
+        
+        # Reject overlapping bookings, accounting for the service duration
+        check_slot(appointment_date, appointment_time, service.duration_minutes)
         
         # Create appointment with calendar event information
         event_title = f"{data['service']} - {data['name']}"
@@ -237,11 +238,11 @@ def book_appointment():
         calendar_platforms = "Google Calendar,Apple Calendar,Outlook,Office 365"
         
         appointment = Appointment(
-            customer_id=customer.id,
+            customer_id=customer_id,
             service_id=service.id,
             scheduled_date=appointment_date,
             scheduled_time=appointment_time,
-            notes=data.get('description', ''),
+            notes=notes,
             status='pending',
             calendar_event_sent=True,  # We're providing calendar integration
             calendar_platforms=calendar_platforms,
@@ -273,8 +274,8 @@ def book_appointment():
             'appointment_id': appointment.id,
             'booking_data': {
                 'service': data['service'],
-                'date': data['date'],
-                'time': data['time'],
+                'date': appointment_date.isoformat(),
+                'time': appointment_time.strftime('%H:%M'),
                 'duration': service.duration_minutes,
                 'customerName': data['name'],
                 'customerEmail': data['email'],
@@ -284,6 +285,9 @@ def book_appointment():
             'email_sent': email_sent
         }), 201
         
+    except SlotUnavailable as e:
+        db.session.rollback()
+        return jsonify(e.to_dict()), 409
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f'Booking error: {str(e)}')
@@ -297,14 +301,21 @@ def book_appointment():
 def list_services():
     """
     Public endpoint to list available services.
+    
+    The list is cached for all workers until a service changes.
     """
     from app.models.service import Service
     
     try:
-        services = Service.query.filter_by(is_active=True).all()
+        services = cache.get_or_set(
+            'services:active',
+            lambda: [service.to_dict() for service in Service.query.filter_by(is_active=True).all()],
+            ttl=current_app.config.get('SERVICE_CATALOG_TTL_SECONDS', 300),
+            tags=('services',)
+        )
         return jsonify({
             'success': True,
-            'services': [service.to_dict() for service in services]
+            'services': services
         }), 200
         
     except Exception as e:
@@ -326,7 +337,7 @@ def health_check():
 @bp.route('/init-db', methods=['POST'])
 def init_database():
     """Initialize database tables - TEMPORARY ENDPOINT."""
-    from sqlalchemy import inspect, text
+    from sqlalchemy import inspect
     
     try:
         # Import all models to ensure they're registered
@@ -335,6 +346,12 @@ def init_database():
         from app.models.customer import Customer
         from app.models.message import Message
         from app.models.admin import Admin
+        from app.models.idempotency import IdempotencyKey
+        from app.models.service_alias import ServiceAlias
+        from app.models.change_event import ChangeEvent
+        from app.models.tombstone import Tombstone
+        from app.models.appointment_archive import AppointmentArchive
+        from app.models.daily_metric import DailyMetric
         
         current_app.logger.info("Checking database tables...")
         
@@ -343,29 +360,37 @@ def init_database():
         existing_tables = inspector.get_table_names()
         current_app.logger.info(f"Existing tables: {existing_tables}")
         
-        # Create all tables
-        current_app.logger.info("Creating missing tables...")
-        db.create_all()
-        
-        # Add new columns to appointments table if they don't exist
-        current_app.logger.info("Adding calendar columns to appointments table...")
-        try:
-            db.session.execute(text("ALTER TABLE appointments ADD COLUMN calendar_event_sent BOOLEAN DEFAULT FALSE"))
-            db.session.execute(text("ALTER TABLE appointments ADD COLUMN calendar_platforms VARCHAR(255)"))
-            db.session.execute(text("ALTER TABLE appointments ADD COLUMN event_title VARCHAR(255)"))
-            db.session.execute(text("ALTER TABLE appointments ADD COLUMN event_location VARCHAR(500)"))
-            db.session.commit()
-            current_app.logger.info("Calendar columns added successfully")
-        except Exception as e:
-            current_app.logger.info(f"Calendar columns may already exist: {e}")
-            db.session.rollback()
+        # Create missing tables, columns and indexes
+        current_app.logger.info("Creating missing tables, columns and indexes...")
+        from app.utils.schema import ensure_schema
+        added_columns = ensure_schema()
+        
+        # Key services created before name_key existed
+        from app.utils.service_catalog import backfill_name_keys
+        unkeyed_services = backfill_name_keys()
+        
+        # Give rows from before updated_at existed a sync watermark
+        from app.utils.sync import backfill_updated_at
+        backfilled_rows = backfill_updated_at()
+        
+        # Rank messages stored before priority_rank existed and recount the inbox badge
+        from app.utils.inbox import backfill_priority_ranks, rebuild_unread_counters
+        backfill_priority_ranks()
+        rebuild_unread_counters()
+        
+        # Link messages stored before customer_id existed
+        from app.utils.customers import link_messages, backfill_phone_keys
+        linked_messages, _ = link_messages()
+        
+        # Normalize phones of customers stored before phone_key existed
+        backfill_phone_keys()
         
         # Check tables after creation
         inspector = inspect(db.engine)
         final_tables = inspector.get_table_names()
         current_app.logger.info(f"Final tables: {final_tables}")
         
-        required_tables = ['customers', 'services', 'appointments', 'messages', 'admins']
+        required_tables = ['customers', 'services', 'appointments', 'messages', 'admins', 'idempotency_keys', 'service_aliases', 'change_events', 'tombstones', 'appointments_archive', 'daily_metrics', 'message_fingerprints', 'message_counters', 'erasure_jobs']
         missing_tables = [table for table in required_tables if table not in final_tables]
         
         if missing_tables:
@@ -377,8 +402,12 @@ def init_database():
         else:
             return jsonify({
                 'success': True,
-                'message': 'All required tables and calendar columns created successfully!',
-                'tables': final_tables
+                'message': 'All required tables and columns created successfully!',
+                'tables': final_tables,
+                'added_columns': added_columns,
+                'unkeyed_services': unkeyed_services,
+                'backfilled_rows': backfilled_rows,
+                'linked_messages': linked_messages
             }), 200
             
     except Exception as e:
@@ -1,14 +1,50 @@
 """Appointment routes."""
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash
-from datetime import datetime
+from datetime import datetime, time
 from app import db
 from app.models.appointment import Appointment
-from app.models.customer import Customer
 from app.models.service import Service
+from app.utils.idempotency import idempotent
+from app.utils.ratelimit import rate_limit
+from app.utils.validation import (
+    Schema, String, Email, Phone, Date, Time, Integer, ValidationError, validate_json
+)
+from app.utils.customers import upsert_customer
+from app.utils.service_catalog import resolve_booking_service
+from app.utils.scheduling import (
+    lock_day, check_slot, service_duration, cached_booked_intervals, free_slots,
+    end_time, SlotUnavailable, DEFAULT_DURATION_MINUTES
+)
 from config.email import send_booking_confirmation
 
 bp = Blueprint('appointments', __name__, url_prefix='/appointments')
 
+INVALID_DATE_TIME = 'Nieprawidłowy format daty lub godziny'
+
+APPOINTMENT_SCHEMA = Schema({
+    'first_name': String(required=True, max_length=100),
+    'last_name': String(required=True, max_length=100),
+    'email': Email(required=True),
+    'phone': Phone(required=True),
+    'address': String(max_length=200),
+    'city': String(max_length=100),
+    'postal_code': String(max_length=20),
+    'service_id': Integer(required=True, min_value=1),
+    'scheduled_date': Date(required=True),
+    'scheduled_time': Time(required=True),
+    'notes': String(),
+})
+
+ONLINE_BOOKING_SCHEMA = Schema({
+    'name': String(max_length=200, default=''),
+    'email': Email(required=True, error='Nieprawidłowy format adresu email'),
+    'phone': Phone(required=True, error='Nieprawidłowy numer telefonu'),
+    'service': String(max_length=200, default='Instalacje wodne'),
+    'date': Date(required=True, error=INVALID_DATE_TIME),
+    'time': Time(required=True, error=INVALID_DATE_TIME),
+    'description': String(default=''),
+}, missing_message='Brakujące wymagane pola: {fields}')
+
 
 @bp.route('', strict_slashes=False)
 @bp.route('/', strict_slashes=False)
@@ -19,33 +55,46 @@ def list_appointments():
 
 
 @bp.route('/book', methods=['GET', 'POST'])
+@idempotent
 def book_appointment():
     """Book a new appointment."""
     if request.method == 'POST':
+        try:
+            form = APPOINTMENT_SCHEMA.load(request.form)
+        except ValidationError as e:
+            flash(e.message, 'error')
+            return redirect(url_for('appointments.book_appointment'))
+        scheduled_date = form['scheduled_date']
+        scheduled_time = form['scheduled_time']
+        
+        # Serialise bookings for this day before touching the database
+        lock_day(scheduled_date)
+        
         # Get or create customer
-        email = request.form.get('email')
-        customer = Customer.query.filter_by(email=email).first()
-        
-        if not customer:
-            customer = Customer(
-                first_name=request.form.get('first_name'),
-                last_name=request.form.get('last_name'),
-                email=email,
-                phone=request.form.get('phone'),
-                address=request.form.get('address'),
-                city=request.form.get('city'),
-                postal_code=request.form.get('postal_code')
-            )
-            db.session.add(customer)
-            db.session.flush()
+        customer_id, _ = upsert_customer(
+            form['email'],
+            first_name=form['first_name'],
+            last_name=form['last_name'],
+            phone=form['phone'],
+            address=form.get('address'),
+            city=form.get('city'),
+            postal_code=form.get('postal_code')
+        )
+        
+        try:
+            check_slot(scheduled_date, scheduled_time, service_duration(form['service_id']))
+        except SlotUnavailable as e:
+            db.session.rollback()
+            flash(f"Selected time is already booked. Free slots: {', '.join(e.alternatives) or 'none'}", 'error')
+            return redirect(url_for('appointments.book_appointment'))
         
         # Create appointment
         appointment = Appointment(
-            customer_id=customer.id,
-            service_id=request.form.get('service_id'),
-            scheduled_date=datetime.strptime(request.form.get('scheduled_date'), '%Y-%m-%d').date(),
-            scheduled_time=datetime.strptime(request.form.get('scheduled_time'), '%H:%M').time(),
-            notes=request.form.get('notes'),
+            customer_id=customer_id,
+            service_id=form['service_id'],
+            scheduled_date=scheduled_date,
+            scheduled_time=scheduled_time,
+            notes=form.get('notes'),
             status='pending'
         )
         
@@ -68,31 +117,40 @@ def view_appointment(appointment_id):
 
 
 @bp.route('/api', methods=['POST'])
+@idempotent
+@validate_json(APPOINTMENT_SCHEMA)
 def api_create_appointment():
     """API endpoint to create an appointment."""
-    data = request.get_json()
+    data = request.validated
+    scheduled_date = data['scheduled_date']
+    scheduled_time = data['scheduled_time']
+    
+    # Serialise bookings for this day before touching the database
+    lock_day(scheduled_date)
     
     # Get or create customer
-    customer = Customer.query.filter_by(email=data.get('email')).first()
-    if not customer:
-        customer = Customer(
-            first_name=data.get('first_name'),
-            last_name=data.get('last_name'),
-            email=data.get('email'),
-            phone=data.get('phone'),
-            address=data.get('address'),
-            city=data.get('city'),
-            postal_code=data.get('postal_code')
-        )
-        db.session.add(customer)
-        db.session.flush()
+    customer_id, _ = upsert_customer(
+        data['email'],
+        first_name=data['first_name'],
+        last_name=data['last_name'],
+        phone=data['phone'],
+        address=data.get('address'),
+        city=data.get('city'),
+        postal_code=data.get('postal_code')
+    )
+    
+    try:
+        check_slot(scheduled_date, scheduled_time, service_duration(data['service_id']))
+    except SlotUnavailable as e:
+        db.session.rollback()
+        return jsonify(e.to_dict()), 409
     
     # Create appointment
     appointment = Appointment(
-        customer_id=customer.id,
-        service_id=data.get('service_id'),
-        scheduled_date=datetime.strptime(data.get('scheduled_date'), '%Y-%m-%d').date(),
-        scheduled_time=datetime.strptime(data.get('scheduled_time'), '%H:%M').time(),
+        customer_id=customer_id,
+        service_id=data['service_id'],
+        scheduled_date=scheduled_date,
+        scheduled_time=scheduled_time,
         notes=data.get('notes'),
         status='pending'
     )
@@ -104,58 +162,43 @@ def api_create_appointment():
 
 
 @bp.route('/api/book', methods=['POST'])
+@rate_limit('booking', per_ip='5/minute', per_endpoint='60/minute')
+@idempotent
+@validate_json(ONLINE_BOOKING_SCHEMA)
 def api_book_online():
     """API endpoint for online booking calendar."""
     try:
-        data = request.get_json()
+        data = request.validated
+        scheduled_date = data['date']
+        scheduled_time = data['time']
+        
+        # Serialise bookings for this day before touching the database
+        lock_day(scheduled_date)
         
         # Parse name (combined first and last name)
-        name_parts = data.get('name', '').split(' ', 1)
+        name_parts = (data['name'] or '').split(' ', 1)
         first_name = name_parts[0] if len(name_parts) > 0 else ''
         last_name = name_parts[1] if len(name_parts) > 1 else ''
         
         # Get or create customer
-        email = data.get('email', '').strip()
-        phone = data.get('phone', '').strip()
-        
-        # Find customer by email or phone
-        customer = None
-        if email:
-            customer = Customer.query.filter_by(email=email).first()
-        if not customer and phone:
-            customer = Customer.query.filter_by(phone=phone).first()
-        
-        if not customer:
-            customer = Customer(
-                first_name=first_name,
-                last_name=last_name,
-                email=email if email else None,
-                phone=phone
-            )
-            db.session.add(customer)
-            db.session.flush()
-        
-        # Find service by name or create generic service
-        service_name = data.get('service', 'Instalacje wodne')
-        service = Service.query.filter_by(name=service_name).first()
-        
-        if not service:
-            # Use first available service as fallback
-            service = Service.query.first()
-            if not service:
-                return jsonify({'error': 'No services available'}), 400
-        
-        # Parse date and time
-        scheduled_date = datetime.strptime(data.get('date'), '%Y-%m-%d').date()
-        scheduled_time = datetime.strptime(data.get('time'), '%H:%M').time()
+        email = data['email']
+        phone = data['phone']
+        customer_id, _ = upsert_customer(email, first_name=first_name, last_name=last_name, phone=phone)
+        
+        # Resolve the service by name or alias; unknown names use the fallback service
+        service_name = data['service'] or 'Instalacje wodne'
+        service, _ = resolve_booking_service(service_name)
+        
+        # Reject overlapping bookings, accounting for the service duration
+        check_slot(scheduled_date, scheduled_time, service.duration_minutes)
         
         # Create appointment
         appointment = Appointment(
-            customer_id=customer.id,
+            customer_id=customer_id,
             service_id=service.id,
             scheduled_date=scheduled_date,
             scheduled_time=scheduled_time,
-            notes=data.get('description', ''),
+            notes=data['description'] or '',
             status='pending'
         )
         
@@ -167,10 +210,10 @@ def api_book_online():
             'name': f"{first_name} {last_name}".strip() or 'Klient',
             'email': email,
             'phone': phone,
-            'date': data.get('date'),
-            'time': data.get('time'),
+            'date': scheduled_date.isoformat(),
+            'time': scheduled_time.strftime('%H:%M'),
             'service': service_name,
-            'description': data.get('description', '')
+            'description': data['description'] or ''
         }
         
         email_sent = send_booking_confirmation(booking_data)
@@ -182,6 +225,9 @@ def api_book_online():
             'email_sent': email_sent
         }), 201
         
+    except SlotUnavailable as e:
+        db.session.rollback()
+        return jsonify(e.to_dict()), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -193,23 +239,32 @@ def api_book_online():
 
 @bp.route('/api/availability/<date_str>')
 def api_check_availability(date_str):
-    """Check available time slots for a specific date."""
+    """
+    Check available time slots for a specific date.
+    
+    Busy intervals account for each booked service's duration. Pass
+    ``?duration=<minutes>`` to get the start times that fit a visit of that length.
+    """
     try:
         date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        duration = request.args.get('duration', DEFAULT_DURATION_MINUTES, type=int)
         
-        # Get all appointments for this date
-        appointments = Appointment.query.filter_by(
-            scheduled_date=date
-        ).filter(
-            Appointment.status.in_(['pending', 'confirmed'])
-        ).all()
+        intervals = cached_booked_intervals(date)
         
-        # Convert to list of booked times
-        booked_times = [apt.scheduled_time.strftime('%H:%M') for apt in appointments]
+        booked_slots = []
+        for start, end, _ in intervals:
+            start_time = time(start // 60, start % 60)
+            booked_slots.append({
+                'start': start_time.strftime('%H:%M'),
+                'end': end_time(start_time, end - start).strftime('%H:%M')
+            })
         
         return jsonify({
             'date': date_str,
-            'booked_times': booked_times
+            'booked_times': [slot['start'] for slot in booked_slots],
+            'booked_slots': booked_slots,
+            'available_times': free_slots(intervals, duration),
+            'duration': duration
         }), 200
         
     except Exception as e:
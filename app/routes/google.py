@@ -3,9 +3,10 @@ Google Places API Integration
 Fetch business reviews and details from Google
 """
 import os
-import requests
 from flask import Blueprint, jsonify
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from app.utils.cache import cache
 
 google_bp = Blueprint('google', __name__, url_prefix='/api/google')
 
@@ -14,91 +15,90 @@ GOOGLE_PLACE_ID = os.environ.get('GOOGLE_PLACE_ID', 'ChIJ_____your_place_id_here
 
 # Cache settings
 CACHE_DURATION_HOURS = 6
-_cache = {
-    'data': None,
-    'timestamp': None
-}
+CACHE_KEY = 'google:reviews'
+
+
+class GoogleAPIError(Exception):
+    """Google answered, but not with the place details"""
+
+
+def _fetch_reviews():
+    """Fetch and format the place details and reviews from Google"""
+    import requests
+    
+    url = 'https://maps.googleapis.com/maps/api/place/details/json'
+    params = {
+        'place_id': GOOGLE_PLACE_ID,
+        'fields': 'name,rating,user_ratings_total,reviews,formatted_address,formatted_phone_number,website',
+        'language': 'pl',
+        'key': GOOGLE_PLACES_API_KEY
+    }
+
+    response = requests.get(url, params=params, timeout=10)
+    response.raise_for_status()
+
+    data = response.json()
+
+    if data.get('status') != 'OK':
+        raise GoogleAPIError(f"Google API error: {data.get('status')}")
+
+    result = data.get('result', {})
+    reviews = result.get('reviews', [])
+
+    # Format response
+    return {
+        'business': {
+            'name': result.get('name'),
+            'rating': result.get('rating'),
+            'total_ratings': result.get('user_ratings_total'),
+            'address': result.get('formatted_address'),
+            'phone': result.get('formatted_phone_number'),
+            'website': result.get('website')
+        },
+        'reviews': [
+            {
+                'author_name': review.get('author_name'),
+                'author_url': review.get('author_url'),
+                'profile_photo_url': review.get('profile_photo_url'),
+                'rating': review.get('rating'),
+                'text': review.get('text'),
+                'time': review.get('time'),
+                'relative_time': review.get('relative_time_description'),
+                'language': review.get('language')
+            }
+            for review in reviews
+        ],
+        'cached': False,
+        'timestamp': datetime.now().isoformat()
+    }
 
 
 @google_bp.route('/reviews', methods=['GET'])
 def get_reviews():
     """
     Fetch Google Business reviews
-    Returns cached data if available and fresh
+    Returns cached data if available and fresh (shared by all workers)
     """
-    global _cache
-    
-    # Check cache
-    if _cache['data'] and _cache['timestamp']:
-        cache_age = datetime.now() - _cache['timestamp']
-        if cache_age < timedelta(hours=CACHE_DURATION_HOURS):
-            return jsonify(_cache['data']), 200
-    
-    # Fetch fresh data
     if not GOOGLE_PLACES_API_KEY:
         return jsonify({
             'error': 'Google Places API key not configured',
             'reviews': [],
             'cached': False
         }), 200  # Return empty array instead of error for graceful degradation
-    
+
+    # Imported here rather than at startup; most workers never fetch reviews
+    import requests
+
     try:
-        url = 'https://maps.googleapis.com/maps/api/place/details/json'
-        params = {
-            'place_id': GOOGLE_PLACE_ID,
-            'fields': 'name,rating,user_ratings_total,reviews,formatted_address,formatted_phone_number,website',
-            'language': 'pl',
-            'key': GOOGLE_PLACES_API_KEY
-        }
-        
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        if data.get('status') != 'OK':
-            return jsonify({
-                'error': f"Google API error: {data.get('status')}",
-                'reviews': [],
-                'cached': False
-            }), 200
-        
-        result = data.get('result', {})
-        reviews = result.get('reviews', [])
-        
-        # Format response
-        formatted_data = {
-            'business': {
-                'name': result.get('name'),
-                'rating': result.get('rating'),
-                'total_ratings': result.get('user_ratings_total'),
-                'address': result.get('formatted_address'),
-                'phone': result.get('formatted_phone_number'),
-                'website': result.get('website')
-            },
-            'reviews': [
-                {
-                    'author_name': review.get('author_name'),
-                    'author_url': review.get('author_url'),
-                    'profile_photo_url': review.get('profile_photo_url'),
-                    'rating': review.get('rating'),
-                    'text': review.get('text'),
-                    'time': review.get('time'),
-                    'relative_time': review.get('relative_time_description'),
-                    'language': review.get('language')
-                }
-                for review in reviews
-            ],
-            'cached': False,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        # Update cache
-        _cache['data'] = formatted_data
-        _cache['timestamp'] = datetime.now()
-        
-        return jsonify(formatted_data), 200
-        
+        data = cache.get_or_set(CACHE_KEY, _fetch_reviews, ttl=CACHE_DURATION_HOURS * 3600)
+        return jsonify(data), 200
+
+    except GoogleAPIError as e:
+        return jsonify({
+            'error': str(e),
+            'reviews': [],
+            'cached': False
+        }), 200
     except requests.RequestException as e:
         return jsonify({
             'error': f'Failed to fetch reviews: {str(e)}',
@@ -1,22 +1,26 @@
 """Main routes for the application."""
 from flask import Blueprint, render_template
+from app.utils.page_cache import page_cache
 
 bp = Blueprint('main', __name__)
 
 
 @bp.route('/')
+@page_cache()
 def index():
     """Home page."""
     return render_template('index.html')
 
 
 @bp.route('/about')
+@page_cache()
 def about():
     """About page."""
     return render_template('about.html')
 
 
 @bp.route('/contact')
+@page_cache()
 def contact():
     """Contact page."""
     return render_template('contact.html')
@@ -2,12 +2,19 @@
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for
 from app import db
 from app.models.service import Service
+from app.utils.page_cache import page_cache
 
 bp = Blueprint('services', __name__, url_prefix='/services')
 
 
+def _service_pages():
+    """URL values of the service pages to pre-render."""
+    return [{'service_id': service_id} for service_id, in db.session.query(Service.id).filter_by(is_active=True)]
+
+
 @bp.route('', strict_slashes=False)
 @bp.route('/', strict_slashes=False)
+@page_cache(tags=('services',))
 def list_services():
     """List all active services."""
     services = Service.query.filter_by(is_active=True).all()
@@ -15,6 +22,7 @@ def list_services():
 
 
 @bp.route('/<int:service_id>')
+@page_cache(tags=('services',), prerender=_service_pages)
 def view_service(service_id):
     """View a specific service."""
     service = Service.query.get_or_404(service_id)
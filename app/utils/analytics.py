@@ -0,0 +1,253 @@
+"""
+Revenue and utilization analytics for the admin dashboard.
+
+Appointments in the requested range are fetched with one projected query
+(appointment and service columns only, no ORM objects), turned into a
+pandas DataFrame and aggregated with vectorized operations:
+
+* revenue per service and category (completed = realized, pending/confirmed = pipeline)
+* utilization per weekday and hour: booked minutes / working minutes
+* cancellation rates, overall and per service
+* booking lead times (scheduled start - created_at)
+
+Results are cached per date range for ``ANALYTICS_CACHE_SECONDS`` in the
+cache shared by the workers. The admin route imports this module lazily, so pandas and numpy are only needed
+when analytics are requested.
+"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from flask import current_app
+from sqlalchemy import literal, select, union_all
+
+from app import db
+from app.models.appointment import Appointment
+from app.models.appointment_archive import AppointmentArchive
+from app.models.service import Service
+from app.utils.cache import cache
+
+COLUMNS = [
+    'scheduled_date', 'scheduled_time', 'status', 'created_at', 'archived',
+    'service_id', 'service_name', 'category', 'price', 'duration_minutes'
+]
+
+BOOKED_STATUSES = ('pending', 'confirmed', 'completed')
+PIPELINE_STATUSES = ('pending', 'confirmed')
+
+# Lead time histogram buckets, in days
+LEAD_TIME_BINS = [-np.inf, 1, 3, 8, 15, 31, np.inf]
+LEAD_TIME_LABELS = ['same_day', '1-2_days', '3-7_days', '8-14_days', '15-30_days', 'over_30_days']
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+
+def _projected_query(model, start, end, archived):
+    return select(
+        model.scheduled_date,
+        model.scheduled_time,
+        model.status,
+        model.created_at,
+        literal(archived).label('archived'),
+        Service.id,
+        Service.name,
+        Service.category,
+        Service.price,
+        Service.duration_minutes
+    ).join(
+        Service, Service.id == model.service_id
+    ).where(
+        model.scheduled_date >= start,
+        model.scheduled_date <= end
+    )
+
+
+def load_frame(start, end, include_archived=True):
+    """One row per appointment scheduled in ``start..end``, as a DataFrame."""
+    query = _projected_query(Appointment, start, end, False)
+    if include_archived:
+        query = union_all(query, _projected_query(AppointmentArchive, start, end, True))
+
+    rows = db.session.execute(query).all()
+    frame = pd.DataFrame.from_records(rows, columns=COLUMNS)
+
+    frame['price'] = pd.to_numeric(frame['price'], errors='coerce').fillna(0.0).astype(float)
+    frame['duration_minutes'] = pd.to_numeric(frame['duration_minutes'], errors='coerce').fillna(60).astype(int)
+    frame['scheduled_at'] = pd.to_datetime(
+        frame['scheduled_date'].astype(str) + ' ' + frame['scheduled_time'].astype(str),
+        errors='coerce'
+    )
+    frame['created_at'] = pd.to_datetime(frame['created_at'], errors='coerce')
+    return frame
+
+
+def _working_hours():
+    config = current_app.config
+    day_start = datetime.strptime(config.get('BOOKING_DAY_START', '07:00'), '%H:%M')
+    day_end = datetime.strptime(config.get('BOOKING_DAY_END', '18:00'), '%H:%M')
+    # The last slot starts at BOOKING_DAY_END, so the working day runs until
+    # the end of that hour
+    return day_start.hour, day_end.hour + 1
+
+
+def revenue(frame):
+    """Realized and pipeline revenue grouped by service and by category."""
+    realized = np.where(frame['status'] == 'completed', frame['price'], 0.0)
+    pipeline = np.where(frame['status'].isin(PIPELINE_STATUSES), frame['price'], 0.0)
+    amounts = frame.assign(realized=realized, pipeline=pipeline, completed=frame['status'] == 'completed')
+
+    by_service = amounts.groupby(['service_id', 'service_name'], sort=False).agg(
+        realized=('realized', 'sum'),
+        pipeline=('pipeline', 'sum'),
+        completed=('completed', 'sum')
+    ).reset_index().sort_values('realized', ascending=False)
+
+    by_category = amounts.groupby('category', sort=True).agg(
+        realized=('realized', 'sum'),
+        pipeline=('pipeline', 'sum'),
+        completed=('completed', 'sum')
+    ).reset_index()
+
+    return {
+        'total_realized': round(float(realized.sum()), 2),
+        'total_pipeline': round(float(pipeline.sum()), 2),
+        'by_service': [
+            {
+                'service_id': int(row.service_id),
+                'service': row.service_name,
+                'realized': round(float(row.realized), 2),
+                'pipeline': round(float(row.pipeline), 2),
+                'completed': int(row.completed)
+            }
+            for row in by_service.itertuples(index=False)
+        ],
+        'by_category': [
+            {
+                'category': row.category,
+                'realized': round(float(row.realized), 2),
+                'pipeline': round(float(row.pipeline), 2),
+                'completed': int(row.completed)
+            }
+            for row in by_category.itertuples(index=False)
+        ]
+    }
+
+
+def utilization(frame, start, end):
+    """
+    Booked minutes divided by working minutes, per weekday and hour.
+
+    Each appointment is split into the hour buckets it overlaps, so a
+    90-minute job starting at 09:30 adds 30 minutes to 09:00 and 60 to 10:00.
+    """
+    first_hour, last_hour = _working_hours()
+    hours = np.arange(first_hour, last_hour)
+    booked = np.zeros((7, len(hours)))
+
+    active = frame[frame['status'].isin(BOOKED_STATUSES) & frame['scheduled_at'].notna()]
+    if not active.empty:
+        starts = (active['scheduled_at'].dt.hour * 60 + active['scheduled_at'].dt.minute).to_numpy()
+        ends = starts + active['duration_minutes'].to_numpy()
+        weekdays = active['scheduled_at'].dt.weekday.to_numpy()
+
+        # One entry per (appointment, overlapped hour)
+        first = starts // 60
+        spans = (np.maximum(ends - 1, starts) // 60) - first + 1
+        index = np.repeat(np.arange(len(starts)), spans)
+        offsets = np.arange(len(index)) - np.repeat(np.cumsum(spans) - spans, spans)
+        bucket_hours = first[index] + offsets
+        minutes = (
+            np.minimum(ends[index], (bucket_hours + 1) * 60)
+            - np.maximum(starts[index], bucket_hours * 60)
+        )
+
+        inside = (bucket_hours >= first_hour) & (bucket_hours < last_hour)
+        np.add.at(booked, (weekdays[index][inside], bucket_hours[inside] - first_hour), minutes[inside])
+
+    # Working minutes: 60 per hour for every occurrence of the weekday in range
+    days = pd.date_range(start, end, freq='D')
+    capacity = np.bincount(days.weekday, minlength=7)[:, None] * 60.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(capacity > 0, booked / capacity, 0.0)
+        by_weekday = np.where(capacity[:, 0] > 0, booked.sum(axis=1) / (capacity[:, 0] * len(hours)), 0.0)
+
+    total_capacity = float(capacity.sum() * len(hours))
+    return {
+        'hours': [f'{hour:02d}:00' for hour in hours],
+        'weekdays': WEEKDAYS,
+        'matrix': np.round(ratio, 4).tolist(),
+        'by_weekday': [round(float(value), 4) for value in by_weekday],
+        'overall': round(float(booked.sum() / total_capacity), 4) if total_capacity else 0.0,
+        'booked_hours': round(float(booked.sum() / 60), 2)
+    }
+
+
+def cancellations(frame):
+    """Share of cancelled appointments, overall and per service."""
+    cancelled = frame['status'] == 'cancelled'
+    per_service = frame.assign(cancelled=cancelled).groupby(['service_id', 'service_name'], sort=False).agg(
+        total=('cancelled', 'size'),
+        cancelled=('cancelled', 'sum')
+    ).reset_index()
+    per_service['rate'] = per_service['cancelled'] / per_service['total']
+
+    return {
+        'total': int(len(frame)),
+        'cancelled': int(cancelled.sum()),
+        'rate': round(float(cancelled.mean()), 4) if len(frame) else 0.0,
+        'by_service': [
+            {
+                'service_id': int(row.service_id),
+                'service': row.service_name,
+                'total': int(row.total),
+                'cancelled': int(row.cancelled),
+                'rate': round(float(row.rate), 4)
+            }
+            for row in per_service.sort_values('rate', ascending=False).itertuples(index=False)
+        ]
+    }
+
+
+def lead_times(frame):
+    """How far ahead appointments are booked, in days."""
+    valid = frame[frame['scheduled_at'].notna() & frame['created_at'].notna()]
+    days = ((valid['scheduled_at'] - valid['created_at']).dt.total_seconds() / 86400).to_numpy()
+    days = days[days >= 0]
+
+    if not len(days):
+        return {'count': 0, 'mean_days': None, 'median_days': None, 'p90_days': None,
+                'histogram': {label: 0 for label in LEAD_TIME_LABELS}}
+
+    counts = pd.cut(pd.Series(days), bins=LEAD_TIME_BINS, labels=LEAD_TIME_LABELS, right=False)
+    histogram = counts.value_counts().reindex(LEAD_TIME_LABELS, fill_value=0)
+    return {
+        'count': int(len(days)),
+        'mean_days': round(float(days.mean()), 2),
+        'median_days': round(float(np.median(days)), 2),
+        'p90_days': round(float(np.percentile(days, 90)), 2),
+        'histogram': {label: int(value) for label, value in histogram.items()}
+    }
+
+
+def compute_analytics(start, end, include_archived=True):
+    """All dashboard analytics for appointments scheduled in ``start..end``."""
+    frame = load_frame(start, end, include_archived=include_archived)
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'appointments': int(len(frame)),
+        'revenue': revenue(frame),
+        'utilization': utilization(frame, start, end),
+        'cancellations': cancellations(frame),
+        'lead_times': lead_times(frame),
+        'generated_at': datetime.utcnow().isoformat()
+    }
+
+
+def get_analytics(start, end, include_archived=True):
+    """Cached ``compute_analytics``; entries expire after ``ANALYTICS_CACHE_SECONDS``."""
+    return cache.get_or_set(
+        f'analytics:{start}:{end}:{int(include_archived)}',
+        lambda: compute_analytics(start, end, include_archived=include_archived),
+        ttl=current_app.config.get('ANALYTICS_CACHE_SECONDS', 600)
+    )
@@ -0,0 +1,78 @@
+"""
+Archive tier for old appointments.
+
+Completed and cancelled appointments scheduled more than N months ago are
+moved, in batches, from ``appointments`` to the compact
+``appointments_archive`` table, keeping their ids. The live table (and its
+partitions on PostgreSQL) then only holds current work. Admin endpoints read
+the archive when asked with ``include_archived``.
+"""
+from datetime import date, datetime
+
+from sqlalchemy import delete, insert, literal, select
+
+from app import db
+from app.models.appointment import Appointment
+from app.models.appointment_archive import AppointmentArchive
+from app.utils.cache import invalidate_on_commit
+from app.utils.events import publish
+from app.utils.partitions import add_months, month_start
+from app.utils.sync import record_tombstones, touch_customers
+
+ARCHIVABLE_STATUSES = ('completed', 'cancelled')
+
+# Columns copied from appointments; calendar fields are not kept in the archive
+ARCHIVED_COLUMNS = (
+    'id', 'customer_id', 'service_id', 'scheduled_date', 'scheduled_time',
+    'status', 'notes', 'created_at', 'updated_at'
+)
+
+
+def archive_cutoff(older_than_months):
+    """Appointments scheduled before this date are eligible for archiving."""
+    return add_months(month_start(date.today()), -older_than_months)
+
+
+def archive_appointments(older_than_months=12, batch_size=500, dry_run=False):
+    """
+    Move eligible appointments to the archive. Returns the number moved
+    (or, with ``dry_run``, the number that would be moved).
+
+    Each batch is copied and deleted in its own transaction, so the job can
+    be interrupted and rerun safely.
+    """
+    cutoff = archive_cutoff(older_than_months)
+    live = Appointment.__table__
+    archive = AppointmentArchive.__table__
+    eligible = (live.c.scheduled_date < cutoff) & live.c.status.in_(ARCHIVABLE_STATUSES)
+
+    if dry_run:
+        return db.session.query(Appointment).filter(eligible).count()
+
+    moved = 0
+    while True:
+        rows = db.session.execute(
+            select(live.c.id, live.c.customer_id).where(eligible).order_by(live.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        ids = [row.id for row in rows]
+
+        now = datetime.utcnow()
+        source = select(
+            *(live.c[column] for column in ARCHIVED_COLUMNS),
+            literal(now).label('archived_at')
+        ).where(live.c.id.in_(ids), eligible)
+        db.session.execute(insert(archive).from_select([*ARCHIVED_COLUMNS, 'archived_at'], source))
+        # The date condition lets PostgreSQL prune partitions for the delete
+        db.session.execute(delete(live).where(live.c.id.in_(ids), eligible))
+        publish('appointment', 'archived', {'ids': ids})
+        # Synced clients drop archived appointments like deleted ones
+        record_tombstones('appointment', ids)
+        # Archived appointments leave the customers' appointment counts
+        touch_customers(row.customer_id for row in rows)
+        invalidate_on_commit('appointments')
+        db.session.commit()
+        moved += len(ids)
+
+    return moved
@@ -0,0 +1,177 @@
+"""
+Set-based bulk updates for the admin panel.
+
+Instead of one request, ORM load and commit per row, a bulk request selects
+its rows by id list or by filter and changes them in batches of
+``BULK_BATCH_SIZE``. Each batch:
+
+1. reads the ids and current state of its rows (``FOR UPDATE`` on
+   PostgreSQL, so concurrent edits wait);
+2. applies the rollup and unread counter changes with ``record_metrics`` /
+   ``record_unread``, since the ORM flush hooks do not see Core statements;
+3. runs one ``UPDATE ... WHERE id IN (...)``;
+4. publishes one change event, ``{'ids': [...], 'changes': {...}}``, for
+   the whole batch, and invalidates the cached values of the table.
+
+All batches of a request run in one transaction.
+"""
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import func, select, update
+
+from app import db
+from app.models.appointment import Appointment
+from app.models.message import Message, PRIORITY_RANKS, DEFAULT_PRIORITY_RANK
+from app.utils import inbox, metrics
+from app.utils.cache import invalidate_on_commit
+from app.utils.events import publish
+from app.utils.scheduling import ACTIVE_STATUSES
+
+BULK_BATCH_SIZE = 500
+
+
+def _require_conditions(conditions):
+    if not conditions:
+        raise ValueError('Bulk updates need ids or a filter')
+
+
+def _batches(query, id_column, batch_size):
+    """Locked rows of ``query`` in id order, one list per batch."""
+    last_id = 0
+    locking = db.engine.dialect.name == 'postgresql'
+    while True:
+        batch_query = query.where(id_column > last_id).order_by(id_column).limit(batch_size)
+        if locking:
+            batch_query = batch_query.with_for_update()
+        rows = db.session.execute(batch_query).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield rows
+
+
+def appointment_conditions(ids=None, filters=None):
+    """WHERE clauses for an id list and/or list-style filters."""
+    conditions = []
+    if ids is not None:
+        conditions.append(Appointment.id.in_(ids))
+    filters = filters or {}
+    if filters.get('status'):
+        conditions.append(Appointment.status == filters['status'])
+    if filters.get('customer_id'):
+        conditions.append(Appointment.customer_id == filters['customer_id'])
+    if filters.get('service_id'):
+        conditions.append(Appointment.service_id == filters['service_id'])
+    if filters.get('date_from'):
+        conditions.append(Appointment.scheduled_date >= filters['date_from'])
+    if filters.get('date_to'):
+        conditions.append(Appointment.scheduled_date <= filters['date_to'])
+    return conditions
+
+
+def set_appointment_status(conditions, status, batch_size=BULK_BATCH_SIZE):
+    """
+    Move the matching appointments to ``status``.
+
+    Cancelled or completed appointments are not re-activated here (that
+    needs a slot check per row) and rows already in ``status`` are left
+    alone; both are counted as skipped. Returns ``(matched, updated_ids)``.
+    Raises ``ValueError`` without conditions. The caller commits.
+    """
+    _require_conditions(conditions)
+    attributes, _ = metrics.TRACKED[Appointment]
+    query = select(Appointment.id, *(getattr(Appointment, name) for name in attributes)).where(*conditions)
+
+    matched = 0
+    updated_ids = []
+    for rows in _batches(query, Appointment.id, batch_size):
+        matched += len(rows)
+        changed = [
+            row for row in rows
+            if row.status != status and (status not in ACTIVE_STATUSES or row.status in ACTIVE_STATUSES)
+        ]
+        if not changed:
+            continue
+
+        ids = [row.id for row in changed]
+        deltas = Counter()
+        for row in changed:
+            before = {name: getattr(row, name) for name in attributes}
+            deltas.update(metrics.change_deltas(Appointment, before, {**before, 'status': status}))
+        metrics.record_metrics(deltas)
+
+        db.session.execute(update(Appointment).where(Appointment.id.in_(ids)).values(
+            status=status, updated_at=datetime.utcnow()
+        ).execution_options(synchronize_session=False))
+        publish('appointment', 'bulk_updated', {'ids': ids, 'changes': {'status': status}})
+        invalidate_on_commit('appointments')
+        updated_ids.extend(ids)
+
+    return matched, updated_ids
+
+
+def message_conditions(ids=None, filters=None):
+    """WHERE clauses for an id list and/or list-style filters."""
+    conditions = []
+    if ids is not None:
+        conditions.append(Message.id.in_(ids))
+    filters = filters or {}
+    for name in ('is_read', 'replied'):
+        if filters.get(name) is not None:
+            conditions.append(getattr(Message, name).is_(filters[name]))
+    if filters.get('message_type'):
+        conditions.append(Message.message_type == filters['message_type'])
+    if filters.get('priority'):
+        conditions.append(Message.priority == filters['priority'])
+    if filters.get('created_before'):
+        conditions.append(Message.created_at < filters['created_before'])
+    return conditions
+
+
+def triage_messages(conditions, changes, batch_size=BULK_BATCH_SIZE):
+    """
+    Apply ``changes`` (``is_read``, ``replied``, ``priority``) to the
+    matching messages. Marking read sets ``read_at`` where it is empty.
+    Returns ``(matched, updated_ids)``; raises ``ValueError`` without
+    conditions. The caller commits.
+    """
+    _require_conditions(conditions)
+    changes = {name: value for name, value in changes.items() if name in ('is_read', 'replied', 'priority')}
+    if not changes:
+        return 0, []
+    query = select(Message.id, Message.is_read, Message.replied, Message.priority, Message.priority_rank).where(*conditions)
+
+    matched = 0
+    updated_ids = []
+    for rows in _batches(query, Message.id, batch_size):
+        matched += len(rows)
+        changed = [row for row in rows if any(getattr(row, name) != value for name, value in changes.items())]
+        if not changed:
+            continue
+
+        ids = [row.id for row in changed]
+        now = datetime.utcnow()
+        values = dict(changes, updated_at=now)
+        if 'priority' in changes:
+            values['priority_rank'] = PRIORITY_RANKS.get(changes['priority'], DEFAULT_PRIORITY_RANK)
+
+        deltas = Counter()
+        for row in changed:
+            deltas.update(inbox.change_deltas(
+                (row.is_read, row.priority_rank),
+                (values.get('is_read', row.is_read), values.get('priority_rank', row.priority_rank))
+            ))
+        inbox.record_unread(deltas)
+
+        if changes.get('is_read'):
+            values['read_at'] = func.coalesce(Message.read_at, now)
+
+        db.session.execute(update(Message).where(Message.id.in_(ids)).values(**values).execution_options(
+            synchronize_session=False
+        ))
+        publish('message', 'bulk_updated', {'ids': ids, 'changes': changes})
+        invalidate_on_commit('messages')
+        updated_ids.extend(ids)
+
+    return matched, updated_ids
@@ -0,0 +1,388 @@
+"""
+Cache shared by the gunicorn workers of one host.
+
+Two tiers behind one API (``get``/``set``/``delete``/``get_or_set``):
+
+* an in-process LRU of ``CACHE_LOCAL_MAX_ENTRIES`` live objects, so a hit
+  costs no unpickling;
+* a SQLite file in WAL mode (``CACHE_STORAGE_PATH``, in the temp directory
+  by default), shared by every worker, so a value computed by one worker
+  serves them all.
+
+Entries may carry tags (``'services'``, ``'appointments'``, ...). Each tag
+has a version in the shared file; an entry remembers the versions it was
+computed from and is stale as soon as one of them moves on. Commits that
+touch a model in ``TAGGED_MODELS`` bump its tag, so cached values never
+outlive the data they were built from: at once in the committing worker,
+and in the others within ``CACHE_VERSION_CHECK_MS``, how long a worker
+trusts the tag versions it last read. Writes that bypass the ORM flush
+call ``invalidate_on_commit`` themselves. ``flask cache clear`` makes
+every entry stale at once.
+
+``get_or_set`` is single-flight: one thread on the host holds the key's
+lease and computes the value, and the others, in any worker, wait for it
+(at most ``CACHE_LOCK_SECONDS``) instead of computing it at the same time.
+
+Keys and tags are scoped to the database URI, so apps on different
+databases never share entries. Returned values are shared objects and must
+not be modified. Errors in the shared tier are logged and the value is
+computed as if it were not cached.
+"""
+import hashlib
+import json
+import os
+import pickle
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.appointment import Appointment
+from app.models.customer import Customer
+from app.models.message import Message
+from app.models.service import Service
+from app.models.service_alias import ServiceAlias
+
+# Models whose committed changes invalidate a tag
+TAGGED_MODELS = {
+    Appointment: 'appointments',
+    Customer: 'customers',
+    Message: 'messages',
+    Service: 'services',
+    ServiceAlias: 'services',
+}
+
+LEASE_POLL_SECONDS = 0.05
+FLIGHT_LOCKS = 64
+ALL_TAG = '*'
+
+_Entry = namedtuple('_Entry', ['value', 'expires_at', 'versions'])
+
+_MISSING = object()
+_local = threading.local()
+
+
+def _storage_path():
+    return current_app.config.get('CACHE_STORAGE_PATH') or os.path.join(tempfile.gettempdir(), 'sanbud-cache.db')
+
+
+def _connection():
+    """This thread's connection to the shared tier (reopened after a fork)."""
+    path = _storage_path()
+    connection = getattr(_local, 'connection', None)
+    if connection is None or _local.path != path or _local.pid != os.getpid():
+        connection = sqlite3.connect(path, timeout=1, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL, versions TEXT NOT NULL)'
+        )
+        connection.execute('CREATE TABLE IF NOT EXISTS tags (tag TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)'
+        )
+        # Values are pickled; only this user may write them
+        os.chmod(path, 0o600)
+        _local.connection = connection
+        _local.path = path
+        _local.pid = os.getpid()
+    return connection
+
+
+def _namespace():
+    """Prefix of keys and tags: the database URI, plus the process for in-memory databases."""
+    uri = current_app.config.get('SQLALCHEMY_DATABASE_URI') or ''
+    if ':memory:' in uri or uri in ('sqlite://', 'sqlite:///'):
+        uri = f'{uri}|{os.getpid()}|{id(current_app._get_current_object())}'
+    return hashlib.sha1(uri.encode('utf-8')).hexdigest()[:12]
+
+
+class Cache:
+    """The two cache tiers. Use the module-level ``cache`` instance."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        # {tag: (version, monotonic time it was read)}
+        self._checked = {}
+        self._reset_locks()
+        # A lock held by another thread at fork time would never be released in the child
+        os.register_at_fork(after_in_child=self._reset_locks)
+
+    def _reset_locks(self):
+        self._lock = threading.Lock()
+        self._flight_locks = [threading.Lock() for _ in range(FLIGHT_LOCKS)]
+
+    # -- local tier ------------------------------------------------------
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            limit = current_app.config.get('CACHE_LOCAL_MAX_ENTRIES', 512)
+            while len(self._entries) > limit:
+                self._entries.popitem(last=False)
+
+    def _recall(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _forget(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    # -- shared tier -----------------------------------------------------
+
+    def _versions(self, tags, max_age=0):
+        """
+        Current ``{tag: version}`` of namespaced ``tags``; unknown tags are at 0.
+        Versions read less than ``max_age`` seconds ago are not read again.
+        """
+        if not tags:
+            return {}
+        now = time.monotonic()
+        versions = {}
+        if max_age:
+            with self._lock:
+                for tag in tags:
+                    checked = self._checked.get(tag)
+                    if checked is not None and now - checked[1] < max_age:
+                        versions[tag] = checked[0]
+        missing = [tag for tag in tags if tag not in versions]
+        if missing:
+            placeholders = ','.join('?' * len(missing))
+            found = dict(_connection().execute(f'SELECT tag, version FROM tags WHERE tag IN ({placeholders})', missing))
+            with self._lock:
+                for tag in missing:
+                    versions[tag] = found.get(tag, 0)
+                    self._checked[tag] = (versions[tag], now)
+        return versions
+
+    def _fresh(self, entry, now):
+        if entry.expires_at <= now:
+            return False
+        if not entry.versions:
+            return True
+        max_age = current_app.config.get('CACHE_VERSION_CHECK_MS', 100) / 1000
+        return self._versions(list(entry.versions), max_age) == entry.versions
+
+    def _get(self, key):
+        now = time.time()
+        entry = self._recall(key)
+        if entry is not None:
+            if self._fresh(entry, now):
+                return entry.value
+            self._forget(key)
+
+        row = _connection().execute('SELECT value, expires_at, versions FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return _MISSING
+        entry = _Entry(None, row[1], json.loads(row[2]))
+        if not self._fresh(entry, now):
+            return _MISSING
+        entry = entry._replace(value=pickle.loads(row[0]))
+        self._remember(key, entry)
+        return entry.value
+
+    def _set(self, key, value, ttl, versions):
+        entry = _Entry(value, time.time() + ttl, versions)
+        connection = _connection()
+        connection.execute(
+            'INSERT INTO entries (key, value, expires_at, versions) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at, '
+            'versions = excluded.versions',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), entry.expires_at, json.dumps(versions))
+        )
+        self._remember(key, entry)
+        if random.random() < 0.01:
+            now = time.time()
+            connection.execute('DELETE FROM entries WHERE expires_at < ?', (now,))
+            connection.execute('DELETE FROM leases WHERE expires_at < ?', (now,))
+
+    def _acquire_lease(self, key, owner, seconds):
+        now = time.time()
+        cursor = _connection().execute(
+            'INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at '
+            'WHERE leases.expires_at < ?',
+            (key, owner, now + seconds, now)
+        )
+        return cursor.rowcount == 1
+
+    def _wait_for(self, key, seconds):
+        """Poll for the value another worker is computing; ``_MISSING`` if it gives up."""
+        deadline = time.time() + seconds
+        connection = _connection()
+        while time.time() < deadline:
+            time.sleep(LEASE_POLL_SECONDS)
+            value = self._get(key)
+            if value is not _MISSING:
+                return value
+            if connection.execute('SELECT 1 FROM leases WHERE key = ?', (key,)).fetchone() is None:
+                break
+        return _MISSING
+
+    # -- public API ------------------------------------------------------
+
+    def _scoped(self, key, tags=()):
+        """Namespaced key and tags; every entry also carries the ``*`` tag that ``clear`` bumps."""
+        namespace = _namespace()
+        return f'{namespace}:{key}', [f'{namespace}:{tag}' for tag in (*tags, ALL_TAG)]
+
+    def _failed(self, action, error):
+        current_app.logger.warning(f'Cache {action} failed: {error}')
+
+    def get(self, key, default=None):
+        """The cached value of ``key``, or ``default``."""
+        if not current_app.config.get('CACHE_ENABLED', True):
+            return default
+        key, _ = self._scoped(key)
+        try:
+            value = self._get(key)
+        except (sqlite3.Error, OSError, pickle.UnpicklingError) as e:
+            self._failed('read', e)
+            return default
+        return default if value is _MISSING else value
+
+    def set(self, key, value, ttl, tags=()):
+        """Store ``value`` for ``ttl`` seconds, invalidated by any of ``tags``."""
+        if not current_app.config.get('CACHE_ENABLED', True):
+            return
+        key, tags = self._scoped(key, tags)
+        try:
+            self._set(key, value, ttl, self._versions(tags))
+        except (sqlite3.Error, OSError, pickle.PicklingError) as e:
+            self._failed('write', e)
+
+    def delete(self, key):
+        key, _ = self._scoped(key)
+        self._forget(key)
+        try:
+            _connection().execute('DELETE FROM entries WHERE key = ?', (key,))
+        except (sqlite3.Error, OSError) as e:
+            self._failed('delete', e)
+
+    def invalidate(self, *tags):
+        """Make every entry tagged with any of ``tags`` stale, in all workers."""
+        namespace = _namespace()
+        tags = [f'{namespace}:{tag}' for tag in tags]
+        try:
+            _connection().executemany(
+                'INSERT INTO tags (tag, version) VALUES (?, 1) '
+                'ON CONFLICT (tag) DO UPDATE SET version = version + 1',
+                [(tag,) for tag in tags]
+            )
+        except (sqlite3.Error, OSError) as e:
+            self._failed('invalidation', e)
+            # Stale entries of other workers expire with their TTL
+        with self._lock:
+            for tag in tags:
+                self._checked.pop(tag, None)
+            for key in [key for key, entry in self._entries.items() if set(tags) & set(entry.versions)]:
+                del self._entries[key]
+
+    def get_or_set(self, key, loader, ttl, tags=()):
+        """
+        The cached value of ``key``, or ``loader()`` stored for ``ttl`` seconds.
+
+        Only one thread per host runs ``loader`` for a key at a time, holding
+        the key's lease; the others wait for its result. Exceptions from ``loader`` propagate and
+        nothing is stored.
+        """
+        if not current_app.config.get('CACHE_ENABLED', True):
+            return loader()
+        scoped_key, scoped_tags = self._scoped(key, tags)
+
+        try:
+            value = self._get(scoped_key)
+        except (sqlite3.Error, OSError, pickle.UnpicklingError) as e:
+            self._failed('read', e)
+            return loader()
+        if value is not _MISSING:
+            return value
+
+        owner = f'{os.getpid()}:{threading.get_ident()}'
+        lock_seconds = current_app.config.get('CACHE_LOCK_SECONDS', 10)
+        leased = False
+        try:
+            # The stripe only orders this worker's threads around the lease;
+            # the lease itself keeps a second loader out while one runs
+            with self._flight_locks[hash(scoped_key) % FLIGHT_LOCKS]:
+                value = self._get(scoped_key)
+                if value is not _MISSING:
+                    return value
+                leased = self._acquire_lease(scoped_key, owner, lock_seconds)
+            if not leased:
+                value = self._wait_for(scoped_key, lock_seconds)
+                if value is not _MISSING:
+                    return value
+            # Versions are read before loading, so a change committed
+            # meanwhile leaves the new entry stale rather than wrong
+            versions = self._versions(scoped_tags)
+        except (sqlite3.Error, OSError, pickle.UnpicklingError) as e:
+            self._failed('read', e)
+            return loader()
+
+        try:
+            value = loader()
+            try:
+                self._set(scoped_key, value, ttl, versions)
+            except (sqlite3.Error, OSError, pickle.PicklingError) as e:
+                self._failed('write', e)
+            return value
+        finally:
+            if leased:
+                try:
+                    _connection().execute('DELETE FROM leases WHERE key = ? AND owner = ?', (scoped_key, owner))
+                except (sqlite3.Error, OSError) as e:
+                    self._failed('lease release', e)
+
+    def clear(self):
+        """Drop every entry of this app (``flask cache clear``). Returns the number removed."""
+        self.invalidate(ALL_TAG)
+        namespace = _namespace()
+        cursor = _connection().execute(
+            'DELETE FROM entries WHERE substr(key, 1, ?) = ?', (len(namespace) + 1, f'{namespace}:')
+        )
+        return cursor.rowcount
+
+
+cache = Cache()
+
+
+def invalidate_on_commit(*tags):
+    """Invalidate ``tags`` when the current transaction commits (for Core writes)."""
+    db.session.info.setdefault('cache_tags', set()).update(tags)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_tags(session, flush_context):
+    """Remember the tags of the models this transaction changed."""
+    tags = {TAGGED_MODELS[type(obj)] for obj in (*session.new, *session.dirty, *session.deleted)
+            if type(obj) in TAGGED_MODELS}
+    if tags:
+        session.info.setdefault('cache_tags', set()).update(tags)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    """Bump the collected tags once the changes are committed."""
+    tags = session.info.pop('cache_tags', None)
+    if tags and has_app_context():
+        cache.invalidate(*sorted(tags))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_on_rollback(session):
+    """Rolled-back changes never reached the database."""
+    session.info.pop('cache_tags', None)
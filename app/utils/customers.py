@@ -0,0 +1,195 @@
+"""
+Customer upsert shared by the booking and registration endpoints.
+
+A single ``INSERT ... ON CONFLICT (email) DO UPDATE ... RETURNING`` replaces
+the query-then-insert pattern, so concurrent submissions with the same email
+no longer race on the unique constraint.
+
+Messages are linked to customers by their case-insensitive email: when they
+arrive (``customer_id_for_email``) and, for messages sent before the customer
+existed, by ``link_messages`` (``flask messages link-customers``).
+
+``phone_key`` holds the digits of a customer's phone, so the CSV import can
+match customers whose numbers are written differently.
+"""
+from datetime import datetime
+
+from sqlalchemy import bindparam, func, select, update
+
+from app import db
+from app.models.customer import Customer
+from app.models.message import Message
+from app.utils.db import dialect_insert, supports_upsert
+from app.utils.cache import invalidate_on_commit
+from app.utils.metrics import TOTAL, record_metrics
+from app.utils.text import phone_key
+
+CUSTOMER_FIELDS = ('first_name', 'last_name', 'phone', 'address', 'city', 'postal_code')
+
+
+def _fallback_upsert(email, values, update):
+    """Query-then-write path for databases without ON CONFLICT support."""
+    customer = Customer.query.filter_by(email=email).first()
+    if customer:
+        changed = False
+        for field in update:
+            if values.get(field) is not None:
+                setattr(customer, field, values[field])
+                changed = True
+        if changed:
+            customer.updated_at = datetime.utcnow()
+        db.session.flush()
+        return customer.id, False
+
+    customer = Customer(email=email, **values)
+    db.session.add(customer)
+    db.session.flush()
+    return customer.id, True
+
+
+def upsert_customer(email, update=(), **values):
+    """
+    Insert a customer or return the existing one with the same email.
+
+    ``values`` holds the columns for a new row (see ``CUSTOMER_FIELDS``).
+    ``update`` names the columns to overwrite when the customer already exists;
+    ``None`` values never overwrite stored data.
+
+    Returns ``(customer_id, is_new)``. Runs inside the caller's transaction.
+    """
+    unknown = set(values) - set(CUSTOMER_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown customer fields: {', '.join(sorted(unknown))}")
+
+    if not supports_upsert():
+        return _fallback_upsert(email, values, update)
+
+    now = datetime.utcnow()
+    table = Customer.__table__
+    stmt = dialect_insert(table).values(
+        email=email, phone_key=phone_key(values.get('phone')), created_at=now, updated_at=now, **values
+    )
+
+    if update:
+        set_ = {field: func.coalesce(stmt.excluded[field], table.c[field]) for field in update}
+        if 'phone' in update:
+            # Keep the digits in step with the number, as the ORM validator does
+            set_['phone_key'] = func.coalesce(stmt.excluded.phone_key, table.c.phone_key)
+        set_['updated_at'] = now
+    else:
+        # DO NOTHING would return no row; a no-op update still returns the id
+        set_ = {'email': stmt.excluded.email}
+
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.email],
+        set_=set_
+    ).returning(table.c.id, table.c.created_at)
+
+    row = db.session.execute(stmt).one()
+    invalidate_on_commit('customers')
+    # created_at is only written on insert, so it matches ``now`` for new rows
+    is_new = row.created_at == now
+    if is_new:
+        # Core inserts skip the ORM flush hooks that maintain the rollups
+        record_metrics({(now.date(), 'new_customers', TOTAL): 1})
+    return row.id, is_new
+
+
+def split_name(name):
+    """Split a combined name into (first_name, last_name)."""
+    parts = (name or '').split()
+    first_name = parts[0] if parts else 'Klient'
+    last_name = ' '.join(parts[1:])
+    return first_name, last_name
+
+
+def email_key(email):
+    """Normalized email used to match messages with customers."""
+    return (email or '').strip().lower() or None
+
+
+def email_key_sql(column):
+    """``email_key`` as an SQL expression over an email column."""
+    return func.lower(func.trim(column))
+
+
+def customer_id_for_email(email):
+    """Id of the customer with this email, ignoring case, or ``None``."""
+    key = email_key(email)
+    if key is None:
+        return None
+    # Served by ix_customers_email_key; the oldest customer wins on case-only duplicates
+    return db.session.execute(select(Customer.id).where(
+        email_key_sql(Customer.email) == key
+    ).order_by(Customer.id).limit(1)).scalar()
+
+
+def link_messages(batch_size=500):
+    """
+    Set ``customer_id`` on unlinked messages whose email matches a customer.
+
+    Walks the unlinked messages in id order, one committed batch at a time:
+    each batch costs one lookup of its distinct emails and one executemany
+    update. Returns ``(linked, scanned)``.
+    """
+    table = Message.__table__
+    # An explicit updated_at, so the sync sends the linked messages again
+    stmt = update(table).where(table.c.id == bindparam('message_id')).values(
+        customer_id=bindparam('linked_customer_id'), updated_at=bindparam('linked_at')
+    )
+    last_id = 0
+    linked = scanned = 0
+
+    while True:
+        rows = db.session.execute(select(Message.id, Message.email).where(
+            Message.customer_id.is_(None), Message.id > last_id
+        ).order_by(Message.id).limit(batch_size)).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        scanned += len(rows)
+
+        keys = {email_key(row.email) for row in rows} - {None}
+        customers = {}
+        if keys:
+            for key, customer_id in db.session.execute(select(
+                email_key_sql(Customer.email), Customer.id
+            ).where(email_key_sql(Customer.email).in_(keys)).order_by(Customer.id.desc())):
+                customers[key] = customer_id
+
+        now = datetime.utcnow()
+        matches = [
+            {'message_id': row.id, 'linked_customer_id': customers[email_key(row.email)], 'linked_at': now}
+            for row in rows if email_key(row.email) in customers
+        ]
+        if matches:
+            db.session.execute(stmt, matches)
+            invalidate_on_commit('messages')
+            linked += len(matches)
+        db.session.commit()
+
+    return linked, scanned
+
+
+def backfill_phone_keys(batch_size=500):
+    """Set ``phone_key`` on customers stored before the column existed. Returns the row count."""
+    table = Customer.__table__
+    stmt = update(table).where(table.c.id == bindparam('customer_id')).values(phone_key=bindparam('key'))
+    last_id = 0
+    updated = 0
+
+    while True:
+        rows = db.session.execute(select(Customer.id, Customer.phone).where(
+            Customer.phone_key.is_(None), Customer.phone.isnot(None), Customer.id > last_id
+        ).order_by(Customer.id).limit(batch_size)).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        keys = [{'customer_id': row.id, 'key': phone_key(row.phone)} for row in rows if phone_key(row.phone)]
+        if keys:
+            db.session.execute(stmt, keys)
+            updated += len(keys)
+        db.session.commit()
+
+    return updated
@@ -0,0 +1,35 @@
+"""Dialect helpers for statements the ORM does not express portably."""
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+
+from app import db
+
+_INSERT_BY_DIALECT = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+def supports_upsert():
+    """Whether the bound database supports INSERT ... ON CONFLICT."""
+    return db.engine.dialect.name in _INSERT_BY_DIALECT
+
+
+def dialect_insert(table):
+    """
+    Return an INSERT for the bound database that offers ``on_conflict_do_update``
+    and ``on_conflict_do_nothing`` (PostgreSQL and SQLite >= 3.24).
+    """
+    return _INSERT_BY_DIALECT[db.engine.dialect.name](table)
+
+
+@event.listens_for(Engine, 'connect')
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """SQLite ignores foreign keys, and so ON DELETE actions, unless enabled per connection."""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
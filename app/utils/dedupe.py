@@ -0,0 +1,265 @@
+"""
+Duplicate and near-duplicate suppression for contact form messages.
+
+Every message is reduced to a fingerprint: the sha256 of the sender's folded
+email and the normalized body, plus a 64-bit simhash of the body's character
+4-gram shingles (unlike word shingles, these stay within a few bits of each
+other when a short message is lightly edited). ``message_fingerprints`` keeps
+one row per fingerprint seen within ``MESSAGE_DEDUPE_WINDOW_HOURS``:
+
+* an exact repeat (double click, retried bot) hits the unique fingerprint
+  index; the row's ``suppressed_count`` is bumped instead of storing a new
+  message and sending another email;
+* a near repeat (same sender, a few words changed) is found by comparing
+  simhashes with the sender's other recent fingerprints. It is still stored
+  and sent, since two real requests can differ in a single word ("kran w
+  kuchni" / "kran w łazience"); the message only records the earlier one
+  it resembles in ``similar_to_id``.
+
+The near-duplicate scan is skipped for senders that a per-process Bloom
+filter has never seen, which is the common case. The filter is refreshed
+from the table every few seconds, so a sender that another worker saw in
+that window only misses the near-duplicate flag; exact repeats always go
+through the unique index.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models.message_fingerprint import MessageFingerprint
+from app.utils.db import dialect_insert, supports_upsert
+from app.utils.text import fold
+
+SHINGLE_SIZE = 4
+SIMHASH_BITS = 64
+
+# Refresh the Bloom filter with rows written by other workers this often
+BLOOM_REFRESH_SECONDS = 5
+# Start a fresh filter this often, so senders outside the window drop out
+BLOOM_REBUILD_SECONDS = 3600
+
+_NON_WORD = re.compile(r'[^\w]+')
+
+Verdict = namedtuple('Verdict', ['duplicate', 'kind', 'fingerprint_id', 'similar_message_id'])
+
+
+def normalize(text):
+    """Folded body with punctuation and repeated whitespace removed."""
+    return _NON_WORD.sub(' ', fold(text or '')).strip()
+
+
+def shingles(normalized):
+    """Overlapping character n-grams of the normalized body."""
+    if len(normalized) <= SHINGLE_SIZE:
+        return [normalized]
+    return [normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)]
+
+
+def simhash(normalized):
+    """64-bit simhash of the shingles, as a signed integer (fits BIGINT)."""
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles(normalized):
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    value = sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+    return value - (1 << SIMHASH_BITS) if value >= 1 << (SIMHASH_BITS - 1) else value
+
+
+def hamming(a, b):
+    """Number of differing bits between two simhashes."""
+    return ((a ^ b) & ((1 << SIMHASH_BITS) - 1)).bit_count()
+
+
+def fingerprint(email, body):
+    """``(email_key, sha256 fingerprint, simhash)`` of a message."""
+    email_key = fold(email or '')
+    normalized = normalize(body)
+    digest = hashlib.sha256(f'{email_key}\n{normalized}'.encode('utf-8')).hexdigest()
+    return email_key, digest, simhash(normalized)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings."""
+
+    def __init__(self, size_bits=1 << 20, hashes=4):
+        self.size_bits = size_bits
+        self.hashes = hashes
+        self._bits = bytearray(size_bits // 8)
+
+    def _positions(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).digest()
+        for i in range(self.hashes):
+            yield int.from_bytes(digest[i * 4:i * 4 + 4], 'big') % self.size_bits
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class _RecentSenders:
+    """Bloom filter of senders with a fingerprint inside the window."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._last_id = 0
+        self._built_at = 0.0
+        self._refreshed_at = 0.0
+
+    def _load(self, since_id, cutoff):
+        return db.session.execute(select(
+            MessageFingerprint.id, MessageFingerprint.email_key
+        ).where(
+            MessageFingerprint.id > since_id,
+            MessageFingerprint.last_seen >= cutoff
+        )).all()
+
+    def might_contain(self, email_key, cutoff):
+        now = time.monotonic()
+        with self._lock:
+            if self._filter is None or now - self._built_at > BLOOM_REBUILD_SECONDS:
+                self._filter = BloomFilter()
+                self._last_id = 0
+                self._built_at = now
+                self._refreshed_at = 0.0
+            if now - self._refreshed_at > BLOOM_REFRESH_SECONDS:
+                for row_id, key in self._load(self._last_id, cutoff):
+                    self._filter.add(key)
+                    self._last_id = max(self._last_id, row_id)
+                self._refreshed_at = now
+            return email_key in self._filter
+
+    def add(self, email_key):
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(email_key)
+
+
+recent_senders = _RecentSenders()
+
+
+def _suppress(fingerprint_id, now):
+    db.session.execute(update(MessageFingerprint).where(
+        MessageFingerprint.id == fingerprint_id
+    ).values(
+        suppressed_count=MessageFingerprint.suppressed_count + 1,
+        last_seen=now
+    ))
+
+
+def _insert_fingerprint(values):
+    """Insert a fingerprint row; ``None`` when the fingerprint already exists."""
+    table = MessageFingerprint.__table__
+    if supports_upsert():
+        stmt = dialect_insert(table).values(**values).on_conflict_do_nothing(
+            index_elements=[table.c.fingerprint]
+        ).returning(table.c.id)
+        return db.session.execute(stmt).scalar()
+
+    try:
+        with db.session.begin_nested():
+            return db.session.execute(table.insert().values(**values)).inserted_primary_key[0]
+    except IntegrityError:
+        return None
+
+
+def check_message(source, email, body):
+    """
+    Classify a submission before anything is stored or sent.
+
+    Returns a ``Verdict``. Exact duplicates are counted on the matching
+    fingerprint and must not be stored; new content gets a fingerprint row,
+    to be linked with ``attach_message``. For near duplicates ``kind`` is
+    ``'near'`` and ``similar_message_id`` names the earlier message.
+    Runs inside the caller's transaction, which must be committed.
+    """
+    config = current_app.config
+    now = datetime.utcnow()
+    cutoff = now - timedelta(hours=config.get('MESSAGE_DEDUPE_WINDOW_HOURS', 24))
+    email_key, digest, body_hash = fingerprint(email, body)
+
+    existing = db.session.execute(select(
+        MessageFingerprint.id, MessageFingerprint.last_seen
+    ).where(MessageFingerprint.fingerprint == digest)).first()
+    if existing and existing.last_seen >= cutoff:
+        _suppress(existing.id, now)
+        return Verdict(True, 'exact', existing.id, None)
+
+    similar_message_id = None
+    if recent_senders.might_contain(email_key, cutoff):
+        max_distance = config.get('MESSAGE_SIMHASH_MAX_DISTANCE', 6)
+        candidates = db.session.execute(select(
+            MessageFingerprint.message_id, MessageFingerprint.simhash
+        ).where(
+            MessageFingerprint.email_key == email_key,
+            MessageFingerprint.last_seen >= cutoff,
+            MessageFingerprint.message_id.is_not(None)
+        ).order_by(MessageFingerprint.last_seen.desc()).limit(50)).all()
+        similar_message_id = next((
+            candidate.message_id for candidate in candidates
+            if hamming(candidate.simhash, body_hash) <= max_distance
+        ), None)
+    kind = 'near' if similar_message_id else None
+
+    if existing:
+        # Seen before the window: treat as new content again
+        db.session.execute(update(MessageFingerprint).where(
+            MessageFingerprint.id == existing.id
+        ).values(last_seen=now, first_seen=now, message_id=None))
+        recent_senders.add(email_key)
+        return Verdict(False, kind, existing.id, similar_message_id)
+
+    values = {
+        'fingerprint': digest, 'simhash': body_hash, 'email_key': email_key, 'source': source,
+        'suppressed_count': 0, 'first_seen': now, 'last_seen': now
+    }
+    fingerprint_id = _insert_fingerprint(values)
+    if fingerprint_id is None:
+        # A concurrent request with the same content inserted it first
+        fingerprint_id = db.session.execute(select(MessageFingerprint.id).where(
+            MessageFingerprint.fingerprint == digest
+        )).scalar_one()
+        _suppress(fingerprint_id, now)
+        return Verdict(True, 'exact', fingerprint_id, None)
+
+    recent_senders.add(email_key)
+    return Verdict(False, kind, fingerprint_id, similar_message_id)
+
+
+def attach_message(verdict, message_id):
+    """Link the stored message to the fingerprint created for it."""
+    if verdict.fingerprint_id and not verdict.duplicate:
+        db.session.execute(update(MessageFingerprint).where(
+            MessageFingerprint.id == verdict.fingerprint_id
+        ).values(message_id=message_id))
+
+
+def suppression_stats(since):
+    """Suppressed submissions in total and for fingerprints seen since ``since``."""
+    total, recent = db.session.execute(select(
+        func.coalesce(func.sum(MessageFingerprint.suppressed_count), 0),
+        func.coalesce(func.sum(MessageFingerprint.suppressed_count).filter(MessageFingerprint.last_seen >= since), 0)
+    )).one()
+    return int(total), int(recent)
+
+
+def prune_fingerprints(older_than_days=30):
+    """Delete fingerprints not seen for ``older_than_days``. Returns the row count."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    result = db.session.execute(
+        MessageFingerprint.__table__.delete().where(MessageFingerprint.last_seen < cutoff)
+    )
+    db.session.commit()
+    return result.rowcount
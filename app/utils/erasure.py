@@ -0,0 +1,303 @@
+"""
+Customer data erasure (GDPR requests).
+
+A customer with a long history must not be erased in one request or one
+transaction. ``create_job`` records an ``ErasureJob`` and ``run_job``
+(started in a background thread by the admin endpoint) works through it
+one committed batch of ``ERASURE_BATCH_SIZE`` rows at a time:
+
+1. ``appointments``           by ``ix_appointments_customer``
+2. ``archived_appointments``  by ``ix_appointments_archive_customer``
+3. ``messages``               linked to the customer (``ix_messages_customer``)
+4. ``unlinked_messages``      not linked, but sent from the customer's email
+5. ``fingerprints``           duplicate-detection rows keyed by the email
+6. ``customer``               the customer row itself
+
+Rows are removed with set-based ``DELETE ... WHERE id IN (...)``. The ORM
+flush hooks do not see those, so each batch writes its own tombstones,
+rollup and unread counter changes and cache invalidations, plus one change
+event. The final delete
+of the customer leaves anything that arrived in the meantime to
+``ON DELETE CASCADE`` / ``SET NULL``.
+
+Every batch bumps the job's ``updated_at``. Each phase re-queries what is
+left, so a job interrupted by a worker restart is simply run again. Jobs
+that have been ``running`` without progress for ``ERASURE_STALE_SECONDS``
+are resumed automatically: by each new worker once that time has passed
+(``schedule_resume``, from ``gunicorn.conf.py``), by the next erasure
+request and when the admin polls the job. ``flask customers
+resume-erasures`` does the same from cron or by hand.
+"""
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, delete, func, or_, select, update
+
+from app import db
+from app.models.appointment import Appointment
+from app.models.appointment_archive import AppointmentArchive
+from app.models.customer import Customer
+from app.models.erasure_job import ErasureJob
+from app.models.message import Message
+from app.models.message_fingerprint import MessageFingerprint
+from app.utils import inbox, metrics
+from app.utils.cache import invalidate_on_commit
+from app.utils.customers import email_key, email_key_sql
+from app.utils.events import publish
+from app.utils.sync import record_tombstones
+from app.utils.text import fold
+
+UNFINISHED_STATUSES = ('pending', 'running', 'failed')
+
+
+def _appointment_batch(model, job, limit):
+    attributes, _ = metrics.TRACKED[Appointment]
+    rows = db.session.execute(select(model.id, *(getattr(model, name) for name in attributes)).where(
+        model.customer_id == job.customer_id
+    ).order_by(model.id).limit(limit)).all()
+    if not rows:
+        return 0
+
+    ids = [row.id for row in rows]
+    deltas = Counter()
+    for row in rows:
+        deltas.update(metrics.change_deltas(Appointment, {name: getattr(row, name) for name in attributes}, None))
+    metrics.record_metrics(deltas)
+    db.session.execute(delete(model).where(model.id.in_(ids)))
+
+    if model is Appointment:
+        record_tombstones('appointment', ids)
+        publish('appointment', 'deleted', {'ids': ids})
+        invalidate_on_commit('appointments')
+    job.deleted_appointments += len(ids)
+    return len(ids)
+
+
+def _delete_appointments(job, limit):
+    return _appointment_batch(Appointment, job, limit)
+
+
+def _delete_archived_appointments(job, limit):
+    return _appointment_batch(AppointmentArchive, job, limit)
+
+
+def _message_batch(job, condition, limit):
+    attributes, _ = metrics.TRACKED[Message]
+    rows = db.session.execute(select(
+        Message.id, Message.is_read, Message.priority_rank, *(getattr(Message, name) for name in attributes)
+    ).where(condition).order_by(Message.id).limit(limit)).all()
+    if not rows:
+        return 0
+
+    ids = [row.id for row in rows]
+    deltas = Counter()
+    unread = Counter()
+    for row in rows:
+        deltas.update(metrics.change_deltas(Message, {name: getattr(row, name) for name in attributes}, None))
+        unread.update(inbox.change_deltas((row.is_read, row.priority_rank), None))
+    metrics.record_metrics(deltas)
+    inbox.record_unread(unread)
+    db.session.execute(delete(Message).where(Message.id.in_(ids)))
+
+    record_tombstones('message', ids)
+    publish('message', 'deleted', {'ids': ids})
+    invalidate_on_commit('messages')
+    job.deleted_messages += len(ids)
+    return len(ids)
+
+
+def _delete_messages(job, limit):
+    return _message_batch(job, Message.customer_id == job.customer_id, limit)
+
+
+def _unlinked_messages(job):
+    # Served by ix_messages_email_key
+    return and_(Message.customer_id.is_(None), email_key_sql(Message.email) == job.email_key)
+
+
+def _delete_unlinked_messages(job, limit):
+    if not job.email_key:
+        return 0
+    return _message_batch(job, _unlinked_messages(job), limit)
+
+
+def _fingerprints(job):
+    return MessageFingerprint.email_key == fold(job.email_key)
+
+
+def _delete_fingerprints(job, limit):
+    if not job.email_key:
+        return 0
+    ids = db.session.execute(select(MessageFingerprint.id).where(_fingerprints(job)).limit(limit)).scalars().all()
+    if ids:
+        db.session.execute(delete(MessageFingerprint).where(MessageFingerprint.id.in_(ids)))
+    return len(ids)
+
+
+def _delete_customer(job, limit):
+    created_at = db.session.execute(select(Customer.created_at).where(Customer.id == job.customer_id)).first()
+    if created_at is None:
+        return 0
+    metrics.record_metrics(metrics.change_deltas(Customer, {'created_at': created_at[0]}, None))
+    # Rows added since the earlier phases are removed or unlinked by the foreign keys
+    db.session.execute(delete(Customer).where(Customer.id == job.customer_id))
+    record_tombstones('customer', [job.customer_id])
+    invalidate_on_commit('customers', 'appointments', 'messages')
+    return 1
+
+
+PHASES = (
+    ('appointments', _delete_appointments),
+    ('archived_appointments', _delete_archived_appointments),
+    ('messages', _delete_messages),
+    ('unlinked_messages', _delete_unlinked_messages),
+    ('fingerprints', _delete_fingerprints),
+    ('customer', _delete_customer),
+)
+
+
+def _count(model, condition):
+    return db.session.execute(select(func.count()).select_from(model).where(condition)).scalar()
+
+
+def create_job(customer, requested_by=None):
+    """
+    Record an erasure request for ``customer`` with an estimate of the rows
+    to delete. Returns the unfinished job for the customer if there is one.
+    """
+    existing = ErasureJob.query.filter(
+        ErasureJob.customer_id == customer.id, ErasureJob.status.in_(UNFINISHED_STATUSES)
+    ).first()
+    if existing:
+        return existing
+
+    job = ErasureJob(customer_id=customer.id, email_key=email_key(customer.email), requested_by=requested_by)
+    total = 1
+    total += _count(Appointment, Appointment.customer_id == customer.id)
+    total += _count(AppointmentArchive, AppointmentArchive.customer_id == customer.id)
+    total += _count(Message, Message.customer_id == customer.id)
+    if job.email_key:
+        total += _count(Message, _unlinked_messages(job))
+        total += _count(MessageFingerprint, _fingerprints(job))
+    job.total_rows = total
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def _claim(job_id, stale_after):
+    """Mark the job running unless another worker is making progress on it."""
+    now = datetime.utcnow()
+    result = db.session.execute(update(ErasureJob).where(
+        ErasureJob.id == job_id,
+        or_(
+            ErasureJob.status.in_(('pending', 'failed')),
+            and_(ErasureJob.status == 'running', ErasureJob.updated_at < now - timedelta(seconds=stale_after))
+        )
+    ).values(
+        status='running', error=None, updated_at=now,
+        started_at=func.coalesce(ErasureJob.started_at, now)
+    ).execution_options(synchronize_session=False))
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def run_job(job_id, batch_size=None, on_progress=None):
+    """
+    Run an erasure job to completion. Returns the job, or ``None`` when it is
+    finished or being run elsewhere. ``on_progress(job)`` is called per batch.
+    """
+    config = current_app.config
+    batch_size = batch_size or config.get('ERASURE_BATCH_SIZE', 500)
+    if not _claim(job_id, config.get('ERASURE_STALE_SECONDS', 300)):
+        return None
+
+    job = db.session.get(ErasureJob, job_id, populate_existing=True)
+    try:
+        for phase, step in PHASES:
+            job.phase = phase
+            while True:
+                deleted = step(job, batch_size)
+                job.deleted_rows += deleted
+                job.updated_at = datetime.utcnow()
+                db.session.commit()
+                if on_progress:
+                    on_progress(job)
+                if deleted < batch_size:
+                    break
+
+        job.status = 'completed'
+        job.phase = None
+        job.finished_at = job.updated_at = datetime.utcnow()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Erasure job {job_id} failed: {e}')
+        job = db.session.get(ErasureJob, job_id, populate_existing=True)
+        job.status = 'failed'
+        job.error = str(e)
+        job.updated_at = datetime.utcnow()
+        db.session.commit()
+    return job
+
+
+def start_job(job_id):
+    """Run the job in a background thread of this worker."""
+    app = current_app._get_current_object()
+
+    def work():
+        with app.app_context():
+            run_job(job_id)
+
+    thread = threading.Thread(target=work, name=f'erasure-{job_id}', daemon=True)
+    thread.start()
+    return thread
+
+
+def _stale_before():
+    return datetime.utcnow() - timedelta(seconds=current_app.config.get('ERASURE_STALE_SECONDS', 300))
+
+
+def is_stale(job):
+    """Whether a running job has made no progress for ``ERASURE_STALE_SECONDS``."""
+    return job.status == 'running' and job.updated_at < _stale_before()
+
+
+def resume_stale_jobs(exclude=()):
+    """Start pending and stale jobs in background threads of this worker. Returns their ids."""
+    job_ids = [job_id for job_id in resumable_jobs() if job_id not in exclude]
+    for job_id in job_ids:
+        start_job(job_id)
+    return job_ids
+
+
+def schedule_resume(app):
+    """
+    Resume interrupted jobs from a freshly started worker, once the jobs of
+    the worker it replaced count as stale.
+    """
+    def resume():
+        with app.app_context():
+            try:
+                resume_stale_jobs()
+            except Exception as e:
+                app.logger.warning(f'Could not resume erasure jobs: {e}')
+
+    timer = threading.Timer(app.config.get('ERASURE_STALE_SECONDS', 300) + 30, resume)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+def resumable_jobs(include_failed=False):
+    """Pending jobs, stale running jobs and, optionally, failed jobs, oldest first."""
+    stale_before = _stale_before()
+    conditions = [
+        ErasureJob.status == 'pending',
+        and_(ErasureJob.status == 'running', ErasureJob.updated_at < stale_before),
+    ]
+    if include_failed:
+        conditions.append(ErasureJob.status == 'failed')
+    return db.session.execute(select(ErasureJob.id).where(or_(*conditions)).order_by(ErasureJob.id)).scalars().all()
@@ -0,0 +1,353 @@
+"""
+Change events for the admin panel live stream.
+
+Every flush that creates, updates or deletes an ``Appointment`` or ``Message``
+appends rows to ``change_events`` in the same transaction, so an event exists
+exactly when its change is committed. The table is the source of truth for
+the SSE stream and for ``Last-Event-ID`` catch-up.
+
+Workers learn about new events in two ways:
+
+* PostgreSQL: the flush also issues ``NOTIFY sanbud_events``; each worker runs
+  one ``LISTEN`` thread that wakes its open streams on commit.
+* Other databases (SQLite in development): streams poll the table every
+  ``EVENTS_POLL_SECONDS``.
+
+Commits in the same worker wake its streams immediately in both cases.
+
+Event ids are assigned at insert but become visible at commit, so a slow
+transaction can commit id N after N+1 has been read. Readers therefore go
+through an ``EventCursor``, which keeps asking for the ids it passed over
+for ``EVENTS_GAP_SECONDS`` before taking them as rolled back.
+"""
+import json
+import select
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event, func, or_, select as sql_select, text
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.appointment import Appointment
+from app.models.change_event import ChangeEvent
+from app.models.message import Message
+
+NOTIFY_CHANNEL = 'sanbud_events'
+
+# Upper bound on the skipped ids a cursor keeps watching
+MAX_TRACKED_GAPS = 1000
+
+# Models whose changes are published, and the entity name used in events
+TRACKED_MODELS = {
+    Appointment: 'appointment',
+    Message: 'message',
+}
+
+
+class _EventHub:
+    """Wakes streams of this process when new events may be available."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._generation = 0
+
+    def notify(self):
+        with self._condition:
+            self._generation += 1
+            self._condition.notify_all()
+
+    def wait(self, generation, timeout):
+        """Block until notified after ``generation`` or the timeout. Returns the new generation."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._generation != generation, timeout=timeout)
+            return self._generation
+
+    @property
+    def generation(self):
+        return self._generation
+
+
+hub = _EventHub()
+
+_listener_lock = threading.Lock()
+_listener_thread = None
+
+
+def _serialize(payload):
+    return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def _pending_events(session):
+    """
+    Change event rows for the objects in the current flush.
+
+    Runs in ``after_flush``, where ``session.new``/``dirty``/``deleted`` still
+    describe the flush and new rows already have their primary keys.
+    """
+    rows = []
+    now = datetime.utcnow()
+
+    for action, objects in (('created', session.new), ('updated', session.dirty), ('deleted', session.deleted)):
+        for obj in objects:
+            entity = TRACKED_MODELS.get(type(obj))
+            if entity is None:
+                continue
+            if action == 'updated' and not session.is_modified(obj, include_collections=False):
+                continue
+            payload = {'id': obj.id} if action == 'deleted' else obj.to_dict()
+            rows.append({
+                'entity': entity,
+                'entity_id': obj.id,
+                'action': action,
+                'payload': _serialize(payload),
+                'created_at': now
+            })
+    return rows
+
+
+def _notify_database(connection):
+    """Signal other workers; PostgreSQL delivers the notification on commit."""
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('SELECT pg_notify(:channel, \'\')'), {'channel': NOTIFY_CHANNEL})
+
+
+@event.listens_for(Session, 'after_flush')
+def _write_change_events(session, flush_context):
+    """Write events for the flushed objects in the same transaction."""
+    rows = _pending_events(session)
+    if not rows:
+        return
+
+    connection = session.connection()
+    connection.execute(ChangeEvent.__table__.insert(), rows)
+    _notify_database(connection)
+    session.info['change_events_written'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_local_streams(session):
+    """Wake this worker's streams once new events are visible."""
+    if session.info.pop('change_events_written', False):
+        hub.notify()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    """Rolled-back events were never committed."""
+    session.info.pop('change_events_written', None)
+
+
+def publish(entity, action, payload=None, entity_id=None):
+    """
+    Append an explicit event in the current transaction.
+
+    Used for set-based writes that bypass the ORM flush (bulk updates,
+    imports), so one event can describe a whole batch.
+    """
+    connection = db.session.connection()
+    connection.execute(ChangeEvent.__table__.insert(), [{
+        'entity': entity,
+        'entity_id': entity_id,
+        'action': action,
+        'payload': _serialize(payload) if payload is not None else None,
+        'created_at': datetime.utcnow()
+    }])
+    _notify_database(connection)
+    db.session.info['change_events_written'] = True
+
+
+def latest_event_id():
+    """Id of the newest event, or 0 when the log is empty."""
+    with db.engine.connect() as connection:
+        return connection.execute(sql_select(func.max(ChangeEvent.id))).scalar() or 0
+
+
+def oldest_event_id():
+    """Id of the oldest retained event, or ``None`` when the log is empty."""
+    with db.engine.connect() as connection:
+        return connection.execute(sql_select(func.min(ChangeEvent.id))).scalar()
+
+
+def events_after(last_id, limit=100, include_ids=()):
+    """
+    Events with id greater than ``last_id``, plus any of ``include_ids``,
+    oldest first, as dictionaries.
+    """
+    table = ChangeEvent.__table__
+    condition = table.c.id > last_id
+    if include_ids:
+        condition = or_(condition, table.c.id.in_(list(include_ids)))
+    with db.engine.connect() as connection:
+        rows = connection.execute(
+            sql_select(table).where(condition).order_by(table.c.id).limit(limit)
+        ).mappings().all()
+    return [dict(row) for row in rows]
+
+
+class EventCursor:
+    """
+    Read position in the event log that does not skip late commits.
+
+    ``last_id`` is the newest id read. Ids below it that were missing when it
+    was passed are fetched along with new events until they show up or
+    ``gap_seconds`` have passed. A cursor resumed from an id (``Last-Event-ID``)
+    also watches the ids missing from the events of the last ``gap_seconds``.
+    """
+
+    def __init__(self, last_id=None, gap_seconds=60):
+        self.gap_seconds = gap_seconds
+        self._gaps = {}  # event id -> monotonic time it was first missed
+        self.last_id = latest_event_id() if last_id is None else last_id
+        self._watch_recent_gaps()
+
+    def _watch(self, ids, now):
+        for event_id in ids:
+            self._gaps.setdefault(event_id, now)
+        if len(self._gaps) > MAX_TRACKED_GAPS:
+            for event_id in sorted(self._gaps)[:len(self._gaps) - MAX_TRACKED_GAPS]:
+                del self._gaps[event_id]
+
+    def _watch_recent_gaps(self):
+        table = ChangeEvent.__table__
+        since = datetime.utcnow() - timedelta(seconds=self.gap_seconds)
+        with db.engine.connect() as connection:
+            rows = connection.execute(
+                sql_select(table.c.id, table.c.created_at).where(table.c.id <= self.last_id)
+                .order_by(table.c.id.desc()).limit(MAX_TRACKED_GAPS)
+            ).all()
+
+        seen = set()
+        floor = None
+        for row in rows:
+            if row.created_at < since:
+                floor = row.id
+                break
+            seen.add(row.id)
+        if floor is None:
+            if not seen:
+                return
+            floor = min(seen) - 1
+        self._watch(set(range(floor + 1, self.last_id + 1)) - seen, time.monotonic())
+
+    def fetch(self, limit=100):
+        """New events and late commits into earlier gaps, oldest id first."""
+        now = time.monotonic()
+        self._gaps = {event_id: since for event_id, since in self._gaps.items() if now - since < self.gap_seconds}
+
+        rows = events_after(self.last_id, limit, include_ids=self._gaps)
+        for row in rows:
+            if self._gaps.pop(row['id'], None) is not None or row['id'] <= self.last_id:
+                continue
+            self._watch(range(max(self.last_id + 1, row['id'] - MAX_TRACKED_GAPS), row['id']), now)
+            self.last_id = row['id']
+        return rows
+
+
+def prune_events(older_than_days=7):
+    """Delete events older than the retention window. Returns the row count."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    deleted = ChangeEvent.query.filter(ChangeEvent.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+def _listen_forever(engine):
+    """Relay PostgreSQL notifications to the hub; reconnects on failure."""
+    while True:
+        try:
+            raw = engine.raw_connection()
+            try:
+                dbapi_connection = raw.dbapi_connection
+                dbapi_connection.autocommit = True
+                cursor = dbapi_connection.cursor()
+                cursor.execute(f'LISTEN {NOTIFY_CHANNEL}')
+                while True:
+                    if select.select([dbapi_connection], [], [], 30) == ([], [], []):
+                        continue
+                    dbapi_connection.poll()
+                    if dbapi_connection.notifies:
+                        dbapi_connection.notifies.clear()
+                        hub.notify()
+            finally:
+                raw.invalidate()
+        except Exception:
+            time.sleep(5)
+
+
+def ensure_listener():
+    """Start this worker's LISTEN thread on PostgreSQL (once per process)."""
+    global _listener_thread
+
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    with _listener_lock:
+        if _listener_thread is None or not _listener_thread.is_alive():
+            _listener_thread = threading.Thread(
+                target=_listen_forever,
+                args=(db.engine,),
+                name='change-event-listener',
+                daemon=True
+            )
+            _listener_thread.start()
+    return True
+
+
+def _format_sse(row, position):
+    """
+    Render one event in text/event-stream format. ``position`` is the SSE id,
+    so a late event never moves the client's ``Last-Event-ID`` backwards.
+    """
+    data = {
+        'id': row['entity_id'],
+        'action': row['action'],
+        'data': json.loads(row['payload']) if row['payload'] else None,
+        'created_at': row['created_at'].isoformat() if row['created_at'] else None
+    }
+    return f"id: {position}\nevent: {row['entity']}\ndata: {_serialize(data)}\n\n"
+
+
+def stream_events(last_event_id=None):
+    """
+    Generator of SSE frames, starting after ``last_event_id``.
+
+    Without an id the stream starts at the newest event. If the requested id
+    has already been pruned a ``reset`` event tells the client to reload.
+    The stream ends after ``EVENTS_STREAM_MAX_SECONDS`` so a worker thread is
+    never held indefinitely; EventSource reconnects with ``Last-Event-ID``.
+    """
+    config = current_app.config
+    listening = ensure_listener()
+    poll_seconds = 15 if listening else config.get('EVENTS_POLL_SECONDS', 1)
+    heartbeat_seconds = config.get('EVENTS_HEARTBEAT_SECONDS', 15)
+    deadline = time.monotonic() + config.get('EVENTS_STREAM_MAX_SECONDS', 300)
+
+    yield f"retry: {config.get('EVENTS_RETRY_MS', 3000)}\n\n"
+
+    if last_event_id is not None:
+        oldest = oldest_event_id()
+        if oldest is not None and last_event_id < oldest - 1:
+            yield f"event: reset\ndata: {_serialize({'reason': 'events pruned'})}\n\n"
+            last_event_id = oldest - 1
+    cursor = EventCursor(last_event_id, gap_seconds=config.get('EVENTS_GAP_SECONDS', 60))
+
+    last_sent = time.monotonic()
+    generation = hub.generation
+
+    while time.monotonic() < deadline:
+        position = cursor.last_id
+        rows = cursor.fetch()
+        for row in rows:
+            position = max(position, row['id'])
+            yield _format_sse(row, position)
+        if rows:
+            last_sent = time.monotonic()
+            continue
+
+        if time.monotonic() - last_sent >= heartbeat_seconds:
+            yield ': keepalive\n\n'
+            last_sent = time.monotonic()
+
+        generation = hub.wait(generation, timeout=min(poll_seconds, heartbeat_seconds))
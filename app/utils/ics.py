@@ -0,0 +1,246 @@
+"""
+iCalendar (RFC 5545) feed of upcoming appointments.
+
+Technicians subscribe to ``/admin/calendar/<token>.ics`` from their phone
+calendars, which poll it every few minutes. Each request first computes a
+cheap fingerprint (newest ``updated_at`` of appointments, customers and
+services, the latest tombstone id, the date window). If it matches the
+client's ``ETag``/``If-Modified-Since`` the answer is ``304``; if it matches
+the cached render the cached feed is returned; otherwise the feed is
+rendered from one range query and streamed while it is cached. Renders are
+kept in the shared cache, so one worker's render serves all of them.
+"""
+import hashlib
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from app import db
+from app.models.appointment import Appointment
+from app.models.customer import Customer
+from app.models.service import Service
+from app.models.tombstone import Tombstone
+from app.utils.cache import cache
+from app.utils.scheduling import ACTIVE_STATUSES, DEFAULT_DURATION_MINUTES
+
+PRODID = '-//SanBud//Wizyty//PL'
+TIMEZONE = 'Europe/Warsaw'
+
+# Static definition so clients without a timezone database render local times
+VTIMEZONE = (
+    'BEGIN:VTIMEZONE',
+    f'TZID:{TIMEZONE}',
+    'BEGIN:DAYLIGHT',
+    'TZOFFSETFROM:+0100',
+    'TZOFFSETTO:+0200',
+    'TZNAME:CEST',
+    'DTSTART:19700329T020000',
+    'RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU',
+    'END:DAYLIGHT',
+    'BEGIN:STANDARD',
+    'TZOFFSETFROM:+0200',
+    'TZOFFSETTO:+0100',
+    'TZNAME:CET',
+    'DTSTART:19701025T030000',
+    'RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU',
+    'END:STANDARD',
+    'END:VTIMEZONE',
+)
+
+STATUS_MAP = {
+    'pending': 'TENTATIVE',
+    'confirmed': 'CONFIRMED',
+}
+
+# A window is only requested on its own day
+FEED_CACHE_SECONDS = 86400
+
+
+def feed_window(today=None):
+    """Date range covered by the feed."""
+    today = today or date.today()
+    config = current_app.config
+    return (
+        today - timedelta(days=config.get('CALENDAR_FEED_PAST_DAYS', 7)),
+        today + timedelta(days=config.get('CALENDAR_FEED_DAYS', 90))
+    )
+
+
+def feed_fingerprint(start, end):
+    """
+    Return ``(etag, last_modified)`` for the feed of ``start..end``.
+
+    Uses maxima over indexed columns instead of reading the appointments, so
+    an unchanged feed costs a handful of index probes.
+    """
+    row = db.session.execute(select(
+        select(func.max(Appointment.updated_at)).scalar_subquery(),
+        select(func.max(Customer.updated_at)).scalar_subquery(),
+        select(func.max(Service.updated_at)).scalar_subquery(),
+        select(func.max(Tombstone.id)).scalar_subquery(),
+        select(func.max(Tombstone.deleted_at)).scalar_subquery()
+    )).one()
+    appointments_at, customers_at, services_at, tombstone_id, deleted_at = row
+
+    stamps = [stamp for stamp in (appointments_at, customers_at, services_at, deleted_at) if stamp]
+    last_modified = max(stamps).replace(microsecond=0) if stamps else datetime(2000, 1, 1)
+
+    raw = f'{start}|{end}|{appointments_at}|{customers_at}|{services_at}|{tombstone_id}'
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32], last_modified
+
+
+def cached_feed(start, end, etag):
+    """The cached feed body if it was rendered for the same fingerprint."""
+    cached = cache.get(f'ics:{start}:{end}')
+    if cached and cached[0] == etag:
+        return cached[1]
+    return None
+
+
+def _escape(value):
+    """Escape a TEXT property value."""
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace(';', '\\;')
+        .replace(',', '\\,')
+        .replace('\r\n', '\\n')
+        .replace('\n', '\\n')
+    )
+
+
+def _fold(line):
+    """Fold a content line to 75 octets, as RFC 5545 requires."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+
+    parts = []
+    current = b''
+    limit = 75
+    for char in line:
+        char_bytes = char.encode('utf-8')
+        if len(current) + len(char_bytes) > limit:
+            parts.append(current.decode('utf-8'))
+            current = b''
+            limit = 74  # continuation lines start with a space
+        current += char_bytes
+    parts.append(current.decode('utf-8'))
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _local(value_date, value_time):
+    """Floating local date-time, interpreted in ``TIMEZONE`` via TZID."""
+    return datetime.combine(value_date, value_time).strftime('%Y%m%dT%H%M%S')
+
+
+def _utc(value):
+    """UTC date-time for DTSTAMP/LAST-MODIFIED (stored timestamps are UTC)."""
+    return (value or datetime.utcnow()).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _event_lines(row, host):
+    """Content lines of one VEVENT."""
+    start = datetime.combine(row.scheduled_date, row.scheduled_time)
+    end = start + timedelta(minutes=row.duration_minutes or DEFAULT_DURATION_MINUTES)
+    customer_name = f'{row.first_name} {row.last_name}'.strip()
+
+    summary = row.event_title or f'{row.service_name} - {customer_name}'
+    location = row.event_location or ', '.join(part for part in (row.address, row.postal_code, row.city) if part)
+    description = '\n'.join(part for part in (
+        f'Klient: {customer_name}',
+        f'Telefon: {row.phone}' if row.phone else None,
+        f'Email: {row.email}' if row.email else None,
+        f'Usługa: {row.service_name}',
+        f'Uwagi: {row.notes}' if row.notes else None,
+    ) if part)
+
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:appointment-{row.id}@{host}',
+        f'DTSTAMP:{_utc(row.updated_at)}',
+        f'LAST-MODIFIED:{_utc(row.updated_at)}',
+        f'DTSTART;TZID={TIMEZONE}:{_local(start.date(), start.time())}',
+        f'DTEND;TZID={TIMEZONE}:{_local(end.date(), end.time())}',
+        f'SUMMARY:{_escape(summary)}',
+        f'DESCRIPTION:{_escape(description)}',
+        f'STATUS:{STATUS_MAP.get(row.status, "CONFIRMED")}',
+    ]
+    if location:
+        lines.append(f'LOCATION:{_escape(location)}')
+    lines.append('END:VEVENT')
+    return lines
+
+
+def _appointments_query(start, end):
+    """One range query with every column the feed needs."""
+    return select(
+        Appointment.id,
+        Appointment.scheduled_date,
+        Appointment.scheduled_time,
+        Appointment.status,
+        Appointment.notes,
+        Appointment.event_title,
+        Appointment.event_location,
+        Appointment.updated_at,
+        Customer.first_name,
+        Customer.last_name,
+        Customer.phone,
+        Customer.email,
+        Customer.address,
+        Customer.city,
+        Customer.postal_code,
+        Service.name.label('service_name'),
+        Service.duration_minutes
+    ).join(
+        Customer, Customer.id == Appointment.customer_id
+    ).join(
+        Service, Service.id == Appointment.service_id
+    ).where(
+        Appointment.scheduled_date >= start,
+        Appointment.scheduled_date <= end,
+        Appointment.status.in_(ACTIVE_STATUSES)
+    ).order_by(
+        Appointment.scheduled_date, Appointment.scheduled_time
+    )
+
+
+def render_feed(start, end, etag, host='sanbud24.pl', batch_size=200):
+    """
+    Generate the feed in chunks and cache the complete text under ``etag``.
+
+    Rows are fetched in batches from a single query and each batch is sent
+    as soon as it is rendered.
+    """
+    chunks = []
+
+    def emit(lines):
+        chunk = ''.join(_fold(line) for line in lines)
+        chunks.append(chunk)
+        return chunk
+
+    yield emit([
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        'X-WR-CALNAME:SanBud - wizyty',
+        f'X-WR-TIMEZONE:{TIMEZONE}',
+        'REFRESH-INTERVAL;VALUE=DURATION:PT15M',
+        'X-PUBLISHED-TTL:PT15M',
+        *VTIMEZONE,
+    ])
+
+    result = db.session.execute(_appointments_query(start, end).execution_options(yield_per=batch_size))
+    for batch in result.partitions():
+        lines = []
+        for row in batch:
+            lines.extend(_event_lines(row, host))
+        yield emit(lines)
+
+    yield emit(['END:VCALENDAR'])
+
+    body = ''.join(chunks).encode('utf-8')
+    cache.set(f'ics:{start}:{end}', (etag, body), ttl=FEED_CACHE_SECONDS)
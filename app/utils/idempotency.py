@@ -0,0 +1,155 @@
+"""
+Idempotency-Key support for public write endpoints.
+
+Clients on flaky connections may retry a POST. When the request carries an
+``Idempotency-Key`` header, the first response is stored and replayed for any
+retry with the same key within ``IDEMPOTENCY_TTL_SECONDS``, so a retry costs
+one indexed lookup and never a second write or email.
+
+A key stays reserved (``409`` for retries) while its request runs. A worker
+that dies mid-request never completes the row, so reservations older than
+``IDEMPOTENCY_INFLIGHT_TIMEOUT_SECONDS`` are taken as abandoned and the next
+retry runs the request again. ``flask idempotency prune`` deletes expired
+and abandoned rows.
+"""
+import hashlib
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import request, jsonify, make_response, current_app
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models.idempotency import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def _request_hash():
+    """Fingerprint the request payload so a reused key with a different body is rejected."""
+    return hashlib.sha256(request.get_data(cache=True) or b'').hexdigest()
+
+
+def _limits():
+    """``(ttl, in-flight timeout)`` from the app config."""
+    config = current_app.config
+    return (
+        timedelta(seconds=config.get('IDEMPOTENCY_TTL_SECONDS', 86400)),
+        timedelta(seconds=config.get('IDEMPOTENCY_INFLIGHT_TIMEOUT_SECONDS', 300))
+    )
+
+
+def _is_stale(record, now, ttl, inflight_timeout):
+    """Expired, or reserved by a request that never finished."""
+    if record.created_at < now - ttl:
+        return True
+    return not record.is_complete and record.created_at < now - inflight_timeout
+
+
+def _replay(record):
+    """Build a response from a stored idempotency record."""
+    response = make_response(record.response_body or '', record.status_code)
+    if record.content_type:
+        response.headers['Content-Type'] = record.content_type
+    if record.location:
+        response.headers['Location'] = record.location
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(f):
+    """
+    Decorator that honours the Idempotency-Key header on POST requests.
+
+    Requests without the header are passed through unchanged. Responses with a
+    5xx status are not stored, so the client may retry them with the same key.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER, '').strip()
+        if request.method != 'POST' or not key:
+            return f(*args, **kwargs)
+
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({
+                'success': False,
+                'error': f'{IDEMPOTENCY_HEADER} header is too long (max {MAX_KEY_LENGTH} characters)'
+            }), 400
+
+        endpoint = request.endpoint
+        request_hash = _request_hash()
+        ttl, inflight_timeout = _limits()
+
+        record = IdempotencyKey.query.filter_by(key=key, endpoint=endpoint).first()
+
+        if record and _is_stale(record, datetime.utcnow(), ttl, inflight_timeout):
+            # Expired or abandoned - forget it and treat this as a fresh request
+            IdempotencyKey.query.filter_by(id=record.id).delete()
+            db.session.commit()
+            record = None
+
+        if record:
+            if record.request_hash != request_hash:
+                return jsonify({
+                    'success': False,
+                    'error': f'{IDEMPOTENCY_HEADER} was already used with a different request body'
+                }), 422
+            if not record.is_complete:
+                return jsonify({
+                    'success': False,
+                    'error': 'Poprzednie żądanie z tym kluczem jest nadal przetwarzane'
+                }), 409
+            return _replay(record)
+
+        # Reserve the key before doing any work; the unique index makes
+        # concurrent retries lose the race instead of writing twice.
+        record = IdempotencyKey(key=key, endpoint=endpoint, request_hash=request_hash)
+        db.session.add(record)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'error': 'Poprzednie żądanie z tym kluczem jest nadal przetwarzane'
+            }), 409
+        record_id = record.id
+
+        try:
+            response = make_response(f(*args, **kwargs))
+        except Exception:
+            db.session.rollback()
+            IdempotencyKey.query.filter_by(id=record_id).delete()
+            db.session.commit()
+            raise
+
+        if response.status_code >= 500:
+            IdempotencyKey.query.filter_by(id=record_id).delete()
+        else:
+            IdempotencyKey.query.filter_by(id=record_id).update({
+                'status_code': response.status_code,
+                'response_body': response.get_data(as_text=True),
+                'content_type': response.headers.get('Content-Type'),
+                'location': response.headers.get('Location')
+            })
+        db.session.commit()
+
+        return response
+    return decorated_function
+
+
+def purge_expired_keys():
+    """
+    Delete idempotency records older than the configured TTL and abandoned
+    in-flight reservations. Returns the row count.
+    """
+    ttl, inflight_timeout = _limits()
+    now = datetime.utcnow()
+    deleted = IdempotencyKey.query.filter(or_(
+        IdempotencyKey.created_at < now - ttl,
+        and_(IdempotencyKey.status_code.is_(None), IdempotencyKey.created_at < now - inflight_timeout)
+    )).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
@@ -0,0 +1,459 @@
+"""
+Bulk CSV import of customers, services and historical appointments.
+
+``import_csv`` reads an uploaded file as a stream, one row at a time, and
+works through it in chunks of ``IMPORT_BATCH_SIZE`` rows. Each chunk:
+
+1. validates its rows with the same field types as the JSON endpoints;
+   rejected rows go to the error report (line, fields, message);
+2. matches rows against existing data with one query per key: customers by
+   case-insensitive email, then by ``phone_key``; services by folded name or
+   alias; appointments by ``(customer, date, time)``. Rows that repeat an
+   earlier row of the file are matched the same way;
+3. inserts the new rows with one ``executemany`` per table and applies the
+   rollups, change events and cache invalidations that the ORM flush hooks
+   would have written;
+4. commits.
+
+Memory use is bounded by the chunk size, not by the file. Committed chunks
+stay when a later chunk fails, and running the same file again skips the
+rows that are already in, so an interrupted import is simply repeated.
+
+Columns are matched by header name (case-insensitive, spaces as ``_``);
+unknown columns are ignored. ``,``, ``;`` and tab delimiters are detected
+from the header line.
+
+* ``customers``     ``first_name``, ``last_name`` (or ``name``), ``email``,
+  ``phone``, ``address``, ``city``, ``postal_code``
+* ``services``      ``name``, ``category``, ``price``, ``duration_minutes``,
+  ``description``, ``is_active``
+* ``appointments``  the customer columns, ``service`` (name or alias) or
+  ``service_id``, ``scheduled_date``, ``scheduled_time``, ``status``,
+  ``notes``, ``created_at``
+
+Past appointments and cancelled or completed ones are history and are
+inserted as they are. Upcoming pending or confirmed appointments still take
+their slot through ``reserve_slot`` and are rejected when it is taken.
+"""
+import csv
+import io
+from collections import Counter
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import insert, select
+
+from app import db
+from app.models.appointment import Appointment
+from app.models.appointment_archive import AppointmentArchive
+from app.models.customer import Customer
+from app.models.service import Service
+from app.models.service_alias import ServiceAlias
+from app.utils import metrics, service_catalog
+from app.utils.cache import invalidate_on_commit
+from app.utils.customers import email_key, email_key_sql, split_name
+from app.utils.db import dialect_insert, supports_upsert
+from app.utils.events import publish
+from app.utils.scheduling import ACTIVE_STATUSES, DEFAULT_DURATION_MINUTES, SlotUnavailable, reserve_slot
+from app.utils.sync import touch_customers
+from app.utils.text import fold, phone_key
+from app.utils.validation import (
+    Schema, String, Email, Phone, Date, DateTime, Time, Integer, Number, Boolean, Choice, ValidationError
+)
+
+IMPORT_KINDS = ('customers', 'services', 'appointments')
+APPOINTMENT_STATUSES = ('pending', 'confirmed', 'completed', 'cancelled')
+DELIMITERS = ',;\t'
+
+CUSTOMER_COLUMNS = {
+    'first_name': String(max_length=100),
+    'last_name': String(max_length=100),
+    'name': String(max_length=200),
+    'email': Email(),
+    'phone': Phone(),
+    'address': String(max_length=200),
+    'city': String(max_length=100),
+    'postal_code': String(max_length=20),
+}
+
+CUSTOMER_IMPORT_SCHEMA = Schema(CUSTOMER_COLUMNS)
+
+SERVICE_IMPORT_SCHEMA = Schema({
+    'name': String(required=True, max_length=200),
+    'category': String(required=True, max_length=100),
+    'price': Number(required=True, min_value=0),
+    'duration_minutes': Integer(required=True, min_value=1),
+    'description': String(),
+    'is_active': Boolean(),
+})
+
+APPOINTMENT_IMPORT_SCHEMA = Schema({
+    **CUSTOMER_COLUMNS,
+    'service': String(max_length=200),
+    'service_id': Integer(min_value=1),
+    'scheduled_date': Date(required=True, iso=True),
+    'scheduled_time': Time(required=True, iso=True),
+    'status': Choice(APPOINTMENT_STATUSES),
+    'notes': String(),
+    'created_at': DateTime(),
+})
+
+
+class ImportFormatError(ValueError):
+    """Raised when the upload is not a readable CSV file."""
+
+
+class ImportResult:
+    """
+    Counts of one import plus its rejected rows.
+
+    Every rejected row is passed to ``on_error(line, fields, message)``; the
+    first ``max_errors`` are also kept for the response.
+    """
+
+    def __init__(self, kind, max_errors=100, on_error=None):
+        self.kind = kind
+        self.rows = 0
+        self.counts = Counter()
+        self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors
+        self.on_error = on_error
+
+    def reject(self, line, fields, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'fields': fields, 'error': message})
+        if self.on_error:
+            self.on_error(line, fields, message)
+
+    def to_dict(self):
+        return {
+            'kind': self.kind,
+            'rows': self.rows,
+            **self.counts,
+            'failed': self.failed,
+            'errors': sorted(self.errors, key=lambda error: error['line']),
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+
+def error_writer(file):
+    """``on_error`` callback that writes the error report to a text file as CSV."""
+    writer = csv.writer(file)
+    writer.writerow(['line', 'fields', 'error'])
+
+    def write(line, fields, message):
+        writer.writerow([line, ' '.join(f'{name}:{code}' for name, code in fields.items()), message])
+    return write
+
+
+def _column_name(header):
+    return '_'.join(header.strip().lower().split())
+
+
+def read_rows(stream, encoding='utf-8-sig', delimiter=None):
+    """
+    Yield ``(line, {column: value})`` for the data rows of a binary CSV stream.
+
+    ``line`` is the file line the row starts on. Blank rows are skipped.
+    """
+    text = io.TextIOWrapper(stream, encoding=encoding, newline='')
+    try:
+        header_line = text.readline()
+        if not header_line.strip():
+            raise ImportFormatError('The file is empty')
+        delimiter = delimiter or max(DELIMITERS, key=header_line.count)
+        header = [_column_name(name) for name in next(csv.reader([header_line], delimiter=delimiter))]
+
+        reader = csv.reader(text, delimiter=delimiter)
+        line = 2
+        for values in reader:
+            if any(value.strip() for value in values):
+                yield line, dict(zip(header, values))
+            line = reader.line_num + 2
+    except UnicodeDecodeError as e:
+        raise ImportFormatError(f'The file is not valid {encoding} text: {e.reason}') from e
+    except csv.Error as e:
+        raise ImportFormatError(f'Malformed CSV: {e}') from e
+    finally:
+        text.detach()
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _validated(chunk, schema, result):
+    """Coerced rows of a chunk; rejected rows go to the report."""
+    valid = []
+    for line, raw in chunk:
+        result.rows += 1
+        try:
+            valid.append((line, schema.load(raw)))
+        except ValidationError as e:
+            result.reject(line, e.fields, e.message)
+    return valid
+
+
+def _lookup(column, key_column, keys):
+    """``{key: id}`` of existing rows; the oldest row wins on duplicate keys."""
+    if not keys:
+        return {}
+    return dict(db.session.execute(select(key_column, column).where(
+        key_column.in_(keys)
+    ).order_by(column.desc())).all())
+
+
+def _insert_returning(table, rows, key):
+    """
+    Insert ``rows`` with one executemany and return ``{key value: id}``.
+
+    Rows that lost a race with a concurrent insert of the same ``key`` are
+    skipped by the database and looked up instead.
+    """
+    key_column = table.c[key]
+    if supports_upsert():
+        stmt = dialect_insert(table).on_conflict_do_nothing(index_elements=[key_column])
+    else:
+        stmt = insert(table)
+    ids = dict(db.session.execute(stmt.returning(key_column, table.c.id), rows).all())
+
+    missing = [row[key] for row in rows if row[key] not in ids]
+    if missing:
+        ids.update(db.session.execute(select(key_column, table.c.id).where(key_column.in_(missing))).all())
+    return ids
+
+
+def _resolve_customers(rows, result, prefix=''):
+    """
+    Customer id of each row, creating missing customers.
+
+    Returns ``[(line, data, customer_id), ...]`` for the rows that could be
+    matched or created; the others are reported. Counts go to
+    ``<prefix>inserted``, ``<prefix>existing`` and ``<prefix>duplicate``.
+    """
+    emails = {email_key(data.get('email')) for _, data in rows} - {None}
+    by_email = _lookup(Customer.id, email_key_sql(Customer.email), emails)
+    phones = {
+        phone_key(data.get('phone')) for _, data in rows
+        if email_key(data.get('email')) not in by_email
+    } - {None}
+    by_phone = _lookup(Customer.id, Customer.phone_key, phones)
+
+    resolved = []
+    pending = []
+    new = []
+    new_by_email = {}
+    new_by_phone = {}
+    for line, data in rows:
+        email, phone = email_key(data.get('email')), phone_key(data.get('phone'))
+        customer_id = by_email.get(email) or by_phone.get(phone)
+        if customer_id:
+            result.counts[f'{prefix}existing'] += 1
+            resolved.append((line, data, customer_id))
+            continue
+
+        match = new_by_email.get(email) or new_by_phone.get(phone)
+        if match:
+            result.counts[f'{prefix}duplicate'] += 1
+            pending.append((line, data, match['email']))
+            continue
+
+        first_name, last_name = data.get('first_name'), data.get('last_name')
+        if not first_name and data.get('name'):
+            first_name, last_name = split_name(data['name'])
+        missing = {name: 'required' for name, value in (
+            ('email', email), ('phone', phone), ('first_name', first_name)
+        ) if not value}
+        if missing:
+            result.reject(line, missing, f"Missing required fields: {', '.join(missing)}")
+            continue
+
+        now = datetime.utcnow()
+        customer = {
+            'email': data['email'], 'first_name': first_name, 'last_name': last_name or '',
+            'phone': data['phone'], 'phone_key': phone, 'address': data.get('address') or None,
+            'city': data.get('city') or None, 'postal_code': data.get('postal_code') or None,
+            'created_at': now, 'updated_at': now,
+        }
+        new.append(customer)
+        new_by_email[email] = customer
+        new_by_phone.setdefault(phone, customer)
+        pending.append((line, data, data['email']))
+
+    if new:
+        ids = _insert_returning(Customer.__table__, new, 'email')
+        invalidate_on_commit('customers')
+        result.counts[f'{prefix}inserted'] += len(new)
+        # Core inserts skip the ORM flush hooks that maintain the rollups
+        _, facts = metrics.TRACKED[Customer]
+        metrics.record_metrics(Counter(fact for customer in new for fact in facts(customer)))
+        resolved.extend((line, data, ids[email]) for line, data, email in pending)
+    return resolved
+
+
+def _import_customers(rows, result):
+    _resolve_customers(rows, result)
+
+
+def _import_services(rows, result):
+    keys = {fold(data['name']) for _, data in rows}
+    existing = set(_lookup(Service.id, Service.name_key, keys))
+    existing |= set(_lookup(ServiceAlias.service_id, ServiceAlias.alias_key, keys))
+
+    new = {}
+    for line, data in rows:
+        key = fold(data['name'])
+        if key in existing:
+            result.counts['existing'] += 1
+            continue
+        if key in new:
+            result.counts['duplicate'] += 1
+            continue
+        now = datetime.utcnow()
+        new[key] = {
+            'name': data['name'], 'name_key': key, 'category': data['category'], 'price': data['price'],
+            'duration_minutes': data['duration_minutes'], 'description': data.get('description') or None,
+            'is_active': data.get('is_active') is not False, 'created_at': now, 'updated_at': now,
+        }
+
+    if new:
+        db.session.execute(insert(Service.__table__), list(new.values()))
+        invalidate_on_commit('services')
+        result.counts['inserted'] += len(new)
+
+
+def _resolve_services(rows, result):
+    """``[(line, data, ServiceRef)]`` for rows naming a known service; the others are reported."""
+    service_ids = {data['service_id'] for _, data in rows if data.get('service_id')}
+    by_id = {}
+    if service_ids:
+        by_id = {row.id: service_catalog.ServiceRef(row.id, row.name, row.duration_minutes, bool(row.is_active))
+                 for row in db.session.execute(select(
+                     Service.id, Service.name, Service.duration_minutes, Service.is_active
+                 ).where(Service.id.in_(service_ids)))}
+
+    resolved = []
+    for line, data in rows:
+        if data.get('service_id'):
+            service = by_id.get(data['service_id'])
+            field = 'service_id'
+        else:
+            service = service_catalog.resolve_service(data.get('service'))
+            field = 'service'
+        if service is None:
+            code = 'unknown' if data.get(field) else 'required'
+            result.reject(line, {field: code}, 'Unknown service' if code == 'unknown' else 'Missing service')
+            continue
+        resolved.append((line, data, service))
+    return resolved
+
+
+def _import_appointments(rows, result):
+    services = {line: service for line, _, service in _resolve_services(rows, result)}
+    rows = [(line, data) for line, data in rows if line in services]
+    customers = _resolve_customers(rows, result, prefix='customers_')
+
+    # One range scan of ix_appointments_customer per table instead of a row-value IN list
+    existing = set()
+    if customers:
+        customer_ids = {customer_id for _, _, customer_id in customers}
+        dates = [data['scheduled_date'] for _, data, _ in customers]
+        for model in (Appointment, AppointmentArchive):
+            existing.update(tuple(row) for row in db.session.execute(select(
+                model.customer_id, model.scheduled_date, model.scheduled_time
+            ).where(
+                model.customer_id.in_(customer_ids),
+                model.scheduled_date.between(min(dates), max(dates))
+            )))
+
+    now = datetime.utcnow()
+    seen = set()
+    historical = []
+    upcoming = []
+    for line, data, customer_id in customers:
+        key = (customer_id, data['scheduled_date'], data['scheduled_time'])
+        if key in existing or key in seen:
+            result.counts['existing' if key in existing else 'duplicate'] += 1
+            continue
+        seen.add(key)
+        past = datetime.combine(data['scheduled_date'], data['scheduled_time']) <= now
+        status = data.get('status') or ('completed' if past else 'pending')
+        values = {
+            'customer_id': customer_id, 'service_id': services[line].id,
+            'scheduled_date': data['scheduled_date'], 'scheduled_time': data['scheduled_time'],
+            'status': status, 'notes': data.get('notes') or None,
+            'created_at': data.get('created_at') or now, 'updated_at': now,
+        }
+        if not past and status in ACTIVE_STATUSES:
+            upcoming.append((line, values, services[line].duration_minutes))
+        else:
+            historical.append(values)
+
+    if historical:
+        ids = db.session.execute(insert(Appointment.__table__).returning(Appointment.id), historical).scalars().all()
+        _, facts = metrics.TRACKED[Appointment]
+        metrics.record_metrics(Counter(fact for values in historical for fact in facts(values)))
+        publish('appointment', 'bulk_created', {'ids': ids})
+        touch_customers(values['customer_id'] for values in historical)
+        invalidate_on_commit('appointments')
+        result.counts['inserted'] += len(ids)
+
+    # Upcoming bookings are few; each one takes its slot like a booking would
+    for line, values, duration in upcoming:
+        try:
+            reserve_slot(values['scheduled_date'], values['scheduled_time'], duration or DEFAULT_DURATION_MINUTES)
+        except SlotUnavailable as e:
+            result.reject(line, {'scheduled_time': 'slot_taken'}, str(e))
+            continue
+        db.session.add(Appointment(**values))
+        db.session.flush()
+        result.counts['inserted'] += 1
+
+
+IMPORTERS = {
+    'customers': (CUSTOMER_IMPORT_SCHEMA, _import_customers),
+    'services': (SERVICE_IMPORT_SCHEMA, _import_services),
+    'appointments': (APPOINTMENT_IMPORT_SCHEMA, _import_appointments),
+}
+
+
+def import_csv(stream, kind, batch_size=None, encoding='utf-8-sig', delimiter=None,
+               max_errors=None, on_error=None, on_progress=None):
+    """
+    Import a CSV stream of ``kind`` (see ``IMPORT_KINDS``), committing each chunk.
+
+    Returns an ``ImportResult``. Raises ``ImportFormatError`` for unreadable
+    files and ``ValueError`` for an unknown kind; database errors propagate
+    after the failing chunk is rolled back. ``on_progress(result)`` is called
+    after every committed chunk.
+    """
+    if kind not in IMPORTERS:
+        raise ValueError(f"Unknown import kind: {kind}")
+    schema, importer = IMPORTERS[kind]
+    config = current_app.config
+    batch_size = batch_size or config.get('IMPORT_BATCH_SIZE', 1000)
+    if max_errors is None:
+        max_errors = config.get('IMPORT_MAX_ERRORS', 100)
+    result = ImportResult(kind, max_errors=max_errors, on_error=on_error)
+
+    try:
+        for chunk in _chunks(read_rows(stream, encoding=encoding, delimiter=delimiter), batch_size):
+            rows = _validated(chunk, schema, result)
+            if rows:
+                importer(rows, result)
+            db.session.commit()
+            if on_progress:
+                on_progress(result)
+    except Exception:
+        db.session.rollback()
+        raise
+    return result
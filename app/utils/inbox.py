@@ -0,0 +1,169 @@
+"""
+Priority-ordered admin inbox and unread counters.
+
+``Message.priority_rank`` stores ``priority`` as a small integer (urgent=0,
+high=1, normal=2, low=3). Ordering by ``(is_read, priority_rank,
+created_at DESC)`` lists unread urgent messages first and is answered by
+the ``ix_messages_inbox`` index. A CASE over the priority string would force
+a sort of the whole table.
+
+``message_counters`` holds the number of unread messages per rank, so the
+nav badge reads at most four rows. It is updated from the ORM flush in the
+same transaction as the messages, like the daily metrics. Writes that bypass
+the ORM call ``record_unread`` themselves. ``rebuild_unread_counters``
+recounts from the messages table (``flask messages rebuild-counters``).
+"""
+from collections import Counter
+
+from sqlalchemy import delete, event, func, inspect, select, update
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.message import Message, PRIORITY_RANKS, DEFAULT_PRIORITY_RANK
+from app.models.message_counter import MessageCounter
+from app.utils.db import dialect_insert, supports_upsert
+
+PRIORITY_NAMES = {rank: name for name, rank in PRIORITY_RANKS.items()}
+
+
+def inbox_order():
+    """``order_by`` clauses of the inbox, matching ``ix_messages_inbox``."""
+    return (Message.is_read, Message.priority_rank, Message.created_at.desc())
+
+
+def _previous(obj, name):
+    """Attribute value as it was before the pending changes."""
+    history = inspect(obj).attrs[name].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.added:
+        return None
+    return getattr(obj, name)
+
+
+def _unread_rank(is_read, rank):
+    """Counter a message counts towards, or ``None`` when it is read."""
+    if is_read:
+        return None
+    return DEFAULT_PRIORITY_RANK if rank is None else rank
+
+
+def _flush_deltas(session):
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, Message):
+            deltas[_unread_rank(obj.is_read, obj.priority_rank)] += 1
+
+    for obj in session.dirty:
+        if isinstance(obj, Message) and session.is_modified(obj, include_collections=False):
+            deltas[_unread_rank(_previous(obj, 'is_read'), _previous(obj, 'priority_rank'))] -= 1
+            deltas[_unread_rank(obj.is_read, obj.priority_rank)] += 1
+
+    for obj in session.deleted:
+        if isinstance(obj, Message):
+            deltas[_unread_rank(_previous(obj, 'is_read'), _previous(obj, 'priority_rank'))] -= 1
+
+    return {rank: value for rank, value in deltas.items() if rank is not None and value}
+
+
+def change_deltas(before, after):
+    """
+    Counter changes for one message going from ``before`` to ``after``,
+    each an ``(is_read, priority_rank)`` pair or ``None``.
+    """
+    deltas = Counter()
+    if before is not None:
+        deltas[_unread_rank(*before)] -= 1
+    if after is not None:
+        deltas[_unread_rank(*after)] += 1
+    deltas.pop(None, None)
+    return deltas
+
+
+def _apply_deltas(connection, deltas):
+    """Add ``{priority_rank: delta}`` to the stored counters."""
+    table = MessageCounter.__table__
+    rows = [{'priority_rank': rank, 'unread': value} for rank, value in sorted(deltas.items())]
+
+    if supports_upsert():
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.priority_rank],
+            set_={'unread': table.c.unread + stmt.excluded.unread}
+        )
+        connection.execute(stmt, rows)
+        return
+
+    for row in rows:
+        result = connection.execute(
+            update(table).where(
+                table.c.priority_rank == row['priority_rank']
+            ).values(unread=table.c.unread + row['unread'])
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert(), [row])
+
+
+def record_unread(deltas):
+    """
+    Apply unread counter changes in the current transaction.
+
+    For writes that bypass the ORM flush (Core updates and deletes);
+    ``deltas`` maps a priority rank to the change.
+    """
+    deltas = {rank: value for rank, value in deltas.items() if value}
+    if deltas:
+        _apply_deltas(db.session.connection(), deltas)
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_unread_counters(session, flush_context):
+    """Keep the unread counters in step with every ORM write."""
+    deltas = _flush_deltas(session)
+    if deltas:
+        _apply_deltas(session.connection(), deltas)
+
+
+def _load_previous_value(target, value, oldvalue, initiator):
+    return value
+
+
+# Load the old value on assignment so the flush can subtract it even when the
+# attribute had been expired (e.g. after a commit earlier in the request)
+for _name in ('is_read', 'priority_rank'):
+    event.listen(getattr(Message, _name), 'set', _load_previous_value, active_history=True, retval=True)
+
+
+def unread_counts():
+    """``{priority: unread}`` for every priority, read from the counters."""
+    counts = {name: 0 for name in PRIORITY_RANKS}
+    for rank, unread in db.session.execute(select(MessageCounter.priority_rank, MessageCounter.unread)):
+        name = PRIORITY_NAMES.get(rank)
+        if name:
+            counts[name] = max(unread, 0)
+    return counts
+
+
+def backfill_priority_ranks():
+    """Set ``priority_rank`` on messages stored before the column existed. Returns the row count."""
+    updated = 0
+    for name, rank in PRIORITY_RANKS.items():
+        updated += db.session.query(Message).filter(
+            Message.priority == name, Message.priority_rank != rank
+        ).update({Message.priority_rank: rank}, synchronize_session=False)
+    db.session.commit()
+    return updated
+
+
+def rebuild_unread_counters():
+    """Recount unread messages per rank. Returns ``{priority: unread}``."""
+    table = MessageCounter.__table__
+    counts = dict(db.session.execute(select(
+        Message.priority_rank, func.count()
+    ).where(Message.is_read.is_(False)).group_by(Message.priority_rank)).all())
+
+    db.session.execute(delete(table))
+    rows = [{'priority_rank': rank, 'unread': counts.get(rank, 0)} for rank in sorted(PRIORITY_NAMES)]
+    db.session.execute(table.insert(), rows)
+    db.session.commit()
+    return {PRIORITY_NAMES[rank]: counts.get(rank, 0) for rank in sorted(PRIORITY_NAMES)}
@@ -0,0 +1,309 @@
+"""
+Daily rollups for dashboard trends.
+
+``daily_metrics`` holds one counter per ``(day, metric, dimension)``:
+
+* ``bookings``       appointments by the day they were created
+* ``cancellations``  cancelled appointments by their scheduled day
+* ``new_customers``  customers by the day they were created
+* ``messages``       messages by the day they arrived
+
+``dimension`` is ``''`` for the daily total, ``service:<id>`` for the
+appointment metrics and ``type:<message_type>`` for messages.
+
+Each metric is a function of a row's current state, so a flush adds the
+counters of the new state and subtracts those of the old one, in the same
+transaction. Writes that bypass the ORM call ``record_metrics`` themselves.
+``backfill_metrics`` recomputes a date range from the source tables and
+repairs any drift (run nightly via ``flask metrics backfill``).
+"""
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, event, func, inspect, select, update
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.appointment import Appointment
+from app.models.appointment_archive import AppointmentArchive
+from app.models.customer import Customer
+from app.models.daily_metric import DailyMetric
+from app.models.message import Message
+from app.utils.db import dialect_insert, supports_upsert
+
+METRICS = ('bookings', 'cancellations', 'new_customers', 'messages')
+
+TOTAL = ''
+
+
+def _day(value):
+    """Date of a date/datetime, or ``None``."""
+    if value is None:
+        return None
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _appointment_facts(values):
+    facts = []
+    service = f"service:{values['service_id']}" if values['service_id'] else None
+
+    created = _day(values['created_at'])
+    if created:
+        facts.append((created, 'bookings', TOTAL))
+        if service:
+            facts.append((created, 'bookings', service))
+
+    scheduled = _day(values['scheduled_date'])
+    if values['status'] == 'cancelled' and scheduled:
+        facts.append((scheduled, 'cancellations', TOTAL))
+        if service:
+            facts.append((scheduled, 'cancellations', service))
+    return facts
+
+
+def _customer_facts(values):
+    created = _day(values['created_at'])
+    return [(created, 'new_customers', TOTAL)] if created else []
+
+
+def _message_facts(values):
+    created = _day(values['created_at'])
+    if not created:
+        return []
+    return [
+        (created, 'messages', TOTAL),
+        (created, 'messages', f"type:{values['message_type'] or 'contact'}")
+    ]
+
+
+# Model -> (attributes the metrics depend on, function of those values)
+TRACKED = {
+    Appointment: (('created_at', 'service_id', 'status', 'scheduled_date'), _appointment_facts),
+    Customer: (('created_at',), _customer_facts),
+    Message: (('created_at', 'message_type'), _message_facts),
+}
+
+
+def _current_values(obj, attributes):
+    return {name: getattr(obj, name) for name in attributes}
+
+
+def _previous_values(obj, attributes):
+    """Attribute values as they were before the pending changes."""
+    state = inspect(obj)
+    values = {}
+    for name in attributes:
+        history = state.attrs[name].history
+        if history.deleted:
+            values[name] = history.deleted[0]
+        elif history.added:
+            values[name] = None
+        else:
+            values[name] = getattr(obj, name)
+    return values
+
+
+def _flush_deltas(session):
+    """Counter changes caused by the objects in the current flush."""
+    deltas = Counter()
+
+    for obj in session.new:
+        tracked = TRACKED.get(type(obj))
+        if tracked:
+            attributes, facts = tracked
+            deltas.update(facts(_current_values(obj, attributes)))
+
+    for obj in session.dirty:
+        tracked = TRACKED.get(type(obj))
+        if tracked and session.is_modified(obj, include_collections=False):
+            attributes, facts = tracked
+            deltas.subtract(facts(_previous_values(obj, attributes)))
+            deltas.update(facts(_current_values(obj, attributes)))
+
+    for obj in session.deleted:
+        tracked = TRACKED.get(type(obj))
+        if tracked:
+            attributes, facts = tracked
+            deltas.subtract(facts(_previous_values(obj, attributes)))
+
+    return {key: value for key, value in deltas.items() if value}
+
+
+def _apply_deltas(connection, deltas):
+    """Add ``{(day, metric, dimension): delta}`` to the stored counters."""
+    table = DailyMetric.__table__
+    rows = [
+        {'day': day, 'metric': metric, 'dimension': dimension, 'value': value}
+        for (day, metric, dimension), value in sorted(deltas.items())
+    ]
+
+    if supports_upsert():
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.day, table.c.metric, table.c.dimension],
+            set_={'value': table.c.value + stmt.excluded.value}
+        )
+        connection.execute(stmt, rows)
+        return
+
+    for row in rows:
+        result = connection.execute(
+            update(table).where(
+                table.c.day == row['day'],
+                table.c.metric == row['metric'],
+                table.c.dimension == row['dimension']
+            ).values(value=table.c.value + row['value'])
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert(), [row])
+
+
+def record_metrics(deltas):
+    """
+    Apply counter changes in the current transaction.
+
+    For writes that bypass the ORM flush (Core inserts, bulk updates);
+    ``deltas`` maps ``(day, metric, dimension)`` to the change.
+    """
+    deltas = {key: value for key, value in deltas.items() if value}
+    if deltas:
+        _apply_deltas(db.session.connection(), deltas)
+
+
+def change_deltas(model, before, after):
+    """
+    Counter changes for one row of ``model`` whose tracked attributes go
+    from ``before`` to ``after`` (dicts; ``None`` for an insert or delete).
+    """
+    _, facts = TRACKED[model]
+    deltas = Counter()
+    if before is not None:
+        deltas.subtract(facts(before))
+    if after is not None:
+        deltas.update(facts(after))
+    return deltas
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_daily_metrics(session, flush_context):
+    """Keep the rollups in step with every ORM write."""
+    deltas = _flush_deltas(session)
+    if deltas:
+        _apply_deltas(session.connection(), deltas)
+
+
+def _load_previous_value(target, value, oldvalue, initiator):
+    return value
+
+
+# Load the old value on assignment so the flush can subtract it even when the
+# attribute had been expired (e.g. after a commit earlier in the request)
+for _model, (_attributes, _) in TRACKED.items():
+    for _name in _attributes:
+        event.listen(getattr(_model, _name), 'set', _load_previous_value, active_history=True, retval=True)
+
+
+def _as_date(value):
+    """``func.date`` returns strings on SQLite and dates on PostgreSQL."""
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _grouped(query):
+    return [(_as_date(day), *rest) for day, *rest in query]
+
+
+def compute_metrics(start, end):
+    """Recompute every metric for ``start <= day <= end`` from the source tables."""
+    since = datetime.combine(start, datetime.min.time())
+    until = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    counts = Counter()
+
+    for model in (Appointment, AppointmentArchive):
+        created_day = func.date(model.created_at)
+        for day, service_id, count in _grouped(db.session.query(
+            created_day, model.service_id, func.count()
+        ).filter(
+            model.created_at >= since, model.created_at < until
+        ).group_by(created_day, model.service_id)):
+            counts[(day, 'bookings', TOTAL)] += count
+            if service_id:
+                counts[(day, 'bookings', f'service:{service_id}')] += count
+
+        for day, service_id, count in db.session.query(
+            model.scheduled_date, model.service_id, func.count()
+        ).filter(
+            model.status == 'cancelled', model.scheduled_date >= start, model.scheduled_date <= end
+        ).group_by(model.scheduled_date, model.service_id):
+            counts[(day, 'cancellations', TOTAL)] += count
+            if service_id:
+                counts[(day, 'cancellations', f'service:{service_id}')] += count
+
+    created_day = func.date(Customer.created_at)
+    for day, count in _grouped(db.session.query(created_day, func.count()).filter(
+        Customer.created_at >= since, Customer.created_at < until
+    ).group_by(created_day)):
+        counts[(day, 'new_customers', TOTAL)] += count
+
+    created_day = func.date(Message.created_at)
+    for day, message_type, count in _grouped(db.session.query(
+        created_day, Message.message_type, func.count()
+    ).filter(
+        Message.created_at >= since, Message.created_at < until
+    ).group_by(created_day, Message.message_type)):
+        counts[(day, 'messages', TOTAL)] += count
+        counts[(day, 'messages', f"type:{message_type or 'contact'}")] += count
+
+    return counts
+
+
+def backfill_metrics(start, end):
+    """
+    Replace the stored rollups for ``start <= day <= end`` with recomputed values.
+
+    Runs in one transaction, so readers see either the old or the new range.
+    Returns the number of rows written.
+    """
+    counts = compute_metrics(start, end)
+    table = DailyMetric.__table__
+    db.session.execute(delete(table).where(table.c.day >= start, table.c.day <= end))
+    rows = [
+        {'day': day, 'metric': metric, 'dimension': dimension, 'value': value}
+        for (day, metric, dimension), value in sorted(counts.items())
+        if value
+    ]
+    if rows:
+        db.session.execute(table.insert(), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def trend_series(start, end, metrics=METRICS, breakdown=False):
+    """
+    Daily series for ``start <= day <= end`` read from the rollup table.
+
+    Returns ``{metric: {'total': [...], 'by_dimension': {dimension: [...]}}}``
+    with one zero-filled value per day; ``by_dimension`` only when requested.
+    """
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    position = {day: index for index, day in enumerate(days)}
+    series = {metric: {'total': [0] * len(days)} for metric in metrics}
+    if breakdown:
+        for metric in metrics:
+            series[metric]['by_dimension'] = {}
+
+    query = db.session.execute(select(
+        DailyMetric.day, DailyMetric.metric, DailyMetric.dimension, DailyMetric.value
+    ).where(
+        DailyMetric.day >= start,
+        DailyMetric.day <= end,
+        DailyMetric.metric.in_(metrics),
+        *([] if breakdown else [DailyMetric.dimension == TOTAL])
+    ))
+    for day, metric, dimension, value in query:
+        if dimension == TOTAL:
+            series[metric]['total'][position[day]] = value
+        else:
+            values = series[metric]['by_dimension'].setdefault(dimension, [0] * len(days))
+            values[position[day]] = value
+
+    return days, series
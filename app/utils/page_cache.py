@@ -0,0 +1,112 @@
+"""
+Full-page cache for the public HTML routes.
+
+``@page_cache(tags=...)`` keeps the rendered body of a ``200`` response in
+the shared cache (``app/utils/cache.py``), keyed by URL, so a hit renders
+no template and runs no query in any worker. Every page carries the
+``pages`` tag plus its own tags (``services`` for the catalog pages), so a
+commit to the catalog drops the pages built from it.
+
+Responses carry a strong ``ETag`` of the body and ``Cache-Control: public,
+max-age=PAGE_CACHE_MAX_AGE``; browsers revalidate with a ``304``. Requests
+with pending flash messages are rendered as usual, since the messages are
+part of the page.
+
+``prerender_pages`` (``flask pages prerender``, or at startup with
+``PAGE_CACHE_PRERENDER``) drops all pages and renders them again, e.g.
+after a deploy changed the templates.
+"""
+import hashlib
+from collections import namedtuple
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, make_response, request, session, url_for
+
+from app.utils.cache import cache
+
+PAGE_TAG = 'pages'
+
+_Page = namedtuple('_Page', ['body', 'content_type', 'etag', 'rendered_at'])
+
+
+class _Uncacheable(Exception):
+    """Carries a response that must not be stored (not a plain ``200``)."""
+
+    def __init__(self, response):
+        super().__init__(response.status)
+        self.response = response
+
+
+def _has_flashes():
+    # Without a session cookie there is nothing to load
+    if current_app.config['SESSION_COOKIE_NAME'] not in request.cookies:
+        return False
+    return bool(session.get('_flashes'))
+
+
+def _render(view, args, kwargs):
+    response = make_response(view(*args, **kwargs))
+    if response.status_code != 200 or response.direct_passthrough:
+        raise _Uncacheable(response)
+    body = response.get_data()
+    return _Page(body, response.content_type, hashlib.sha1(body).hexdigest(), datetime.now(timezone.utc))
+
+
+def page_cache(tags=(), prerender=None):
+    """
+    Decorator that serves a public page from the page cache.
+
+    ``prerender`` returns the URL values of the pages to render ahead of
+    time (``[{'service_id': 1}, ...]``); routes without arguments need none.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or _has_flashes():
+                return f(*args, **kwargs)
+
+            try:
+                page = cache.get_or_set(
+                    # The canonical URL, so /services and /services/ share a page
+                    f'page:{url_for(request.endpoint, **request.view_args)}',
+                    lambda: _render(f, args, kwargs),
+                    ttl=current_app.config.get('PAGE_CACHE_SECONDS', 3600),
+                    tags=(PAGE_TAG, *tags)
+                )
+            except _Uncacheable as e:
+                return e.response
+
+            response = current_app.response_class(page.body, content_type=page.content_type)
+            response.set_etag(page.etag)
+            response.last_modified = page.rendered_at
+            response.cache_control.public = True
+            response.cache_control.max_age = current_app.config.get('PAGE_CACHE_MAX_AGE', 300)
+            return response.make_conditional(request)
+
+        decorated_function.page_values = prerender or (lambda: [{}])
+        return decorated_function
+    return decorator
+
+
+def prerender_pages(app):
+    """
+    Drop every cached page and render the pages of all ``@page_cache``
+    routes again. Returns ``[(path, status_code), ...]``.
+    """
+    with app.app_context():
+        cache.invalidate(PAGE_TAG)
+
+        paths = []
+        with app.test_request_context():
+            for rule in app.url_map.iter_rules():
+                page_values = getattr(app.view_functions[rule.endpoint], 'page_values', None)
+                if page_values is None:
+                    continue
+                for values in page_values():
+                    path = url_for(rule.endpoint, **values)
+                    if path not in paths:
+                        paths.append(path)
+
+    client = app.test_client()
+    return [(path, client.get(path).status_code) for path in paths]
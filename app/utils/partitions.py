@@ -0,0 +1,177 @@
+"""
+Monthly range partitioning of ``appointments`` on PostgreSQL.
+
+``convert_to_partitioned`` rebuilds the table as ``PARTITION BY RANGE
+(scheduled_date)`` with one partition per month plus a ``DEFAULT`` partition
+for dates outside the prepared range. ``ensure_partitions`` creates upcoming
+months and moves any matching rows out of the default partition. Queries
+filtered on ``scheduled_date`` (admin lists, availability, stats) then only
+touch the relevant months.
+
+Other databases are left unpartitioned; these helpers refuse to run there.
+"""
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.schema import AddConstraint
+
+from app import db
+from app.models.appointment import Appointment
+
+PARENT_TABLE = 'appointments'
+DEFAULT_PARTITION = 'appointments_default'
+
+
+class PartitioningUnsupported(RuntimeError):
+    """Raised when partitioning is requested on a database other than PostgreSQL."""
+
+
+def month_start(value):
+    """First day of ``value``'s month."""
+    return value.replace(day=1)
+
+
+def add_months(value, months):
+    """First day of the month ``months`` after (or before) ``value``'s month."""
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    """Table name of the partition holding ``month``."""
+    return f'{PARENT_TABLE}_p{month:%Y_%m}'
+
+
+def _require_postgresql(connection):
+    if connection.dialect.name != 'postgresql':
+        raise PartitioningUnsupported('Appointment partitioning requires PostgreSQL')
+
+
+def _table_exists(connection, name):
+    return connection.execute(text('SELECT to_regclass(:name) IS NOT NULL'), {'name': name}).scalar()
+
+
+def is_partitioned(connection):
+    """Whether ``appointments`` is already a partitioned table."""
+    return bool(connection.execute(text(
+        'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:name))'
+    ), {'name': PARENT_TABLE}).scalar())
+
+
+def list_partitions(connection):
+    """Names and bounds of the current partitions, oldest first."""
+    rows = connection.execute(text(
+        'SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) '
+        'FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+        'WHERE i.inhparent = to_regclass(:name) ORDER BY c.relname'
+    ), {'name': PARENT_TABLE}).all()
+    return [(name, bound) for name, bound in rows]
+
+
+def _create_month(connection, month):
+    """Create one monthly partition, moving its rows out of the default partition."""
+    name = partition_name(month)
+    if _table_exists(connection, name):
+        return False
+
+    bounds = {'start': month, 'end': add_months(month, 1)}
+    create = (
+        f'CREATE TABLE {name} PARTITION OF {PARENT_TABLE} '
+        f"FOR VALUES FROM ('{bounds['start']}') TO ('{bounds['end']}')"
+    )
+
+    if not _table_exists(connection, DEFAULT_PARTITION):
+        connection.execute(text(create))
+        return True
+
+    # A new range cannot be attached while the default partition holds rows
+    # for it, so detach the default, create the month, move rows and reattach
+    connection.execute(text(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}'))
+    connection.execute(text(create))
+    connection.execute(text(
+        f'INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} '
+        'WHERE scheduled_date >= :start AND scheduled_date < :end'
+    ), bounds)
+    connection.execute(text(
+        f'DELETE FROM {DEFAULT_PARTITION} WHERE scheduled_date >= :start AND scheduled_date < :end'
+    ), bounds)
+    connection.execute(text(f'ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT'))
+    return True
+
+
+def ensure_partitions(months_ahead=3, months_back=0):
+    """
+    Create monthly partitions from ``months_back`` before the current month
+    to ``months_ahead`` after it. Returns the names of created partitions.
+    """
+    created = []
+    current = month_start(date.today())
+    with db.engine.begin() as connection:
+        _require_postgresql(connection)
+        if not is_partitioned(connection):
+            raise PartitioningUnsupported('appointments is not partitioned yet; run the conversion first')
+        for offset in range(-months_back, months_ahead + 1):
+            month = add_months(current, offset)
+            if _create_month(connection, month):
+                created.append(partition_name(month))
+    return created
+
+
+def convert_to_partitioned(months_ahead=3):
+    """
+    Rebuild ``appointments`` as a monthly partitioned table, in one transaction.
+
+    Holds an exclusive lock on ``appointments`` while rows are copied, so run
+    it during a quiet period. The primary key becomes ``(id, scheduled_date)``
+    because PostgreSQL requires the partition key in unique constraints; ids
+    keep coming from the same sequence. Returns the created partition names.
+    """
+    legacy = f'{PARENT_TABLE}_unpartitioned'
+    created = []
+
+    with db.engine.begin() as connection:
+        _require_postgresql(connection)
+        if is_partitioned(connection):
+            return created
+
+        connection.execute(text(f'LOCK TABLE {PARENT_TABLE} IN ACCESS EXCLUSIVE MODE'))
+        sequence = connection.execute(
+            text('SELECT pg_get_serial_sequence(:table, :column)'), {'table': PARENT_TABLE, 'column': 'id'}
+        ).scalar()
+        first_date, last_date = connection.execute(
+            text(f'SELECT min(scheduled_date), max(scheduled_date) FROM {PARENT_TABLE}')
+        ).one()
+
+        connection.execute(text(f'ALTER TABLE {PARENT_TABLE} RENAME TO {legacy}'))
+        if sequence:
+            # Keep the id sequence alive when the old table is dropped
+            connection.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY NONE'))
+
+        connection.execute(text(
+            f'CREATE TABLE {PARENT_TABLE} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            'PARTITION BY RANGE (scheduled_date)'
+        ))
+
+        today = month_start(date.today())
+        month = month_start(first_date) if first_date else today
+        last = max(add_months(today, months_ahead), month_start(last_date) if last_date else today)
+        while month <= last:
+            _create_month(connection, month)
+            created.append(partition_name(month))
+            month = add_months(month, 1)
+        connection.execute(text(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT'))
+
+        connection.execute(text(f'INSERT INTO {PARENT_TABLE} SELECT * FROM {legacy}'))
+        connection.execute(text(f'DROP TABLE {legacy}'))
+
+        connection.execute(text(f'ALTER TABLE {PARENT_TABLE} ADD PRIMARY KEY (id, scheduled_date)'))
+        # From the model, so the ON DELETE actions match what init-db creates
+        for constraint in Appointment.__table__.foreign_key_constraints:
+            connection.execute(AddConstraint(constraint))
+        if sequence:
+            connection.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY {PARENT_TABLE}.id'))
+
+        for index in Appointment.__table__.indexes:
+            index.create(connection, checkfirst=True)
+
+    return created
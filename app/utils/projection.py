@@ -0,0 +1,184 @@
+"""
+Column projections for the admin list endpoints.
+
+List views show a handful of columns per row and only the beginning of long
+``Text`` columns (message bodies, notes). With ``?fields=`` the client names
+the columns it needs::
+
+    GET /admin/api/messages?fields=id,name,subject,message_preview,is_read
+
+Only those columns are selected (no ORM objects are built), and ``*_preview``
+columns are cut by the database with ``substr``, so the full text is never
+read into the worker. ``fields=list`` selects the endpoint's list preset.
+Without ``fields`` the endpoints return full rows, as before.
+"""
+from collections import namedtuple
+
+from sqlalchemy import func, literal
+
+from app.utils.validation import ValidationError
+
+PREVIEW_LENGTH = 160
+ELLIPSIS = '…'
+
+# ``expression(model)`` builds the selected column, ``format`` turns the
+# fetched value into its JSON form
+Projected = namedtuple('Projected', ['expression', 'format'])
+
+
+def iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def platforms(value):
+    return value.split(',') if value else []
+
+
+def column(name, format=None, default=None):
+    """A model column; models without it (e.g. the archive) select ``default``."""
+    def expression(model):
+        attr = getattr(model, name, None)
+        return attr if attr is not None else literal(default)
+    return Projected(expression, format)
+
+
+def preview(name, length=PREVIEW_LENGTH):
+    """
+    The first ``length`` characters of a text column. One extra character is
+    fetched to tell whether the text was cut, which is marked with an ellipsis.
+    """
+    def expression(model):
+        return func.substr(getattr(model, name), 1, length + 1)
+
+    def format(value):
+        if value is None or len(value) <= length:
+            return value
+        return value[:length].rstrip() + ELLIPSIS
+    return Projected(expression, format)
+
+
+class Projection:
+    """
+    The selectable columns of one list endpoint.
+
+    ``fields`` maps output names to ``Projected`` columns, ``presets`` maps
+    preset names (``'list'``) to tuples of field names. ``extra`` names fields
+    the route computes itself (e.g. ``appointment_count``); they are accepted
+    by ``parse`` but not selected.
+    """
+
+    def __init__(self, fields, presets=None, extra=()):
+        self.fields = dict(fields)
+        self.presets = dict(presets or {})
+        self.extra = frozenset(extra)
+
+    def parse(self, raw):
+        """
+        Requested field names, in request order, or ``None`` when ``raw``
+        names no field. Raises ``ValidationError`` for unknown names.
+        """
+        if not raw or not raw.strip():
+            return None
+        raw = raw.strip()
+        if raw in self.presets:
+            return self.presets[raw]
+
+        names = []
+        unknown = {}
+        for name in raw.split(','):
+            name = name.strip()
+            if not name or name in names:
+                continue
+            if name in self.fields or name in self.extra:
+                names.append(name)
+            else:
+                unknown[name] = 'invalid_choice'
+        if unknown:
+            raise ValidationError(f"Unknown fields: {', '.join(unknown)}", unknown)
+        return tuple(names) or None
+
+    def columns(self, model, names, required=()):
+        """
+        Labeled columns for ``query.with_entities``. ``required`` fields are
+        selected even if not requested, e.g. ids needed by the route.
+        """
+        selected = [name for name in names if name in self.fields]
+        selected += [name for name in required if name not in selected]
+        return [self.fields[name].expression(model).label(name) for name in selected]
+
+    def dump(self, row, names):
+        """JSON dict of one fetched row with the requested ``names``."""
+        mapping = row._mapping
+        result = {}
+        for name in names:
+            if name not in self.fields:
+                continue
+            value = mapping[name]
+            formatter = self.fields[name].format
+            result[name] = formatter(value) if formatter else value
+        return result
+
+
+MESSAGE_PROJECTION = Projection({
+    'id': column('id'),
+    'customer_id': column('customer_id'),
+    'name': column('name'),
+    'email': column('email'),
+    'phone': column('phone'),
+    'subject': column('subject'),
+    'message': column('message'),
+    'message_preview': preview('message'),
+    'message_type': column('message_type'),
+    'is_read': column('is_read'),
+    'replied': column('replied'),
+    'priority': column('priority'),
+    'notes': column('notes'),
+    'notes_preview': preview('notes'),
+    'created_at': column('created_at', iso),
+    'read_at': column('read_at', iso),
+    'updated_at': column('updated_at', iso),
+}, presets={
+    'list': (
+        'id', 'name', 'email', 'subject', 'message_preview', 'message_type',
+        'is_read', 'replied', 'priority', 'created_at'
+    ),
+})
+
+APPOINTMENT_PROJECTION = Projection({
+    'id': column('id'),
+    'customer_id': column('customer_id'),
+    'service_id': column('service_id'),
+    'scheduled_date': column('scheduled_date', iso),
+    'scheduled_time': column('scheduled_time', iso),
+    'status': column('status'),
+    'notes': column('notes'),
+    'notes_preview': preview('notes'),
+    'calendar_event_sent': column('calendar_event_sent', default=False),
+    'calendar_platforms': column('calendar_platforms', platforms),
+    'event_title': column('event_title'),
+    'event_location': column('event_location'),
+    'reminder_sent_at': column('reminder_sent_at', iso),
+    'created_at': column('created_at', iso),
+    'updated_at': column('updated_at', iso),
+    'archived_at': column('archived_at', iso),
+}, presets={
+    'list': (
+        'id', 'scheduled_date', 'scheduled_time', 'status', 'notes_preview',
+        'customer', 'service'
+    ),
+}, extra=('customer', 'service'))
+
+CLIENT_PROJECTION = Projection({
+    'id': column('id'),
+    'first_name': column('first_name'),
+    'last_name': column('last_name'),
+    'email': column('email'),
+    'phone': column('phone'),
+    'address': column('address'),
+    'city': column('city'),
+    'postal_code': column('postal_code'),
+    'created_at': column('created_at', iso),
+    'updated_at': column('updated_at', iso),
+}, presets={
+    'list': ('id', 'first_name', 'last_name', 'email', 'phone', 'city', 'created_at', 'appointment_count'),
+}, extra=('appointment_count',))
@@ -0,0 +1,183 @@
+"""
+Rate limiting and load shedding for the public write endpoints.
+
+Each limited endpoint has two token buckets, one per client IP and one for
+the endpoint as a whole. Buckets live in a small SQLite file shared by all
+gunicorn workers on the host; every check is a single ``BEGIN IMMEDIATE``
+transaction, so concurrent workers never double-spend a token. A request
+without tokens gets ``429`` and a ``Retry-After`` header before any database
+or email work is done.
+
+The limited endpoints are also the expensive ones (SMTP, password hashing),
+so each worker runs at most ``RATELIMIT_MAX_EXPENSIVE_INFLIGHT`` of them at a
+time (by default all of its threads but one) and answers the rest with
+``503``. The remaining thread stays free for cheap requests such as page
+views and availability checks.
+
+Errors in the limiter itself are logged and the request is let through.
+"""
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+# Buckets idle for longer than this are full again and can be dropped
+STALE_SECONDS = 86400
+
+_local = threading.local()
+_slots_lock = threading.Lock()
+_slots = None
+
+
+def parse_rate(rate):
+    """``'5/minute'`` -> ``(capacity, tokens per second)``."""
+    count, _, period = rate.partition('/')
+    count = int(count)
+    return count, count / PERIODS[period.strip()]
+
+
+def client_ip():
+    """
+    Address of the client, taking ``RATELIMIT_TRUSTED_PROXIES`` reverse proxies
+    into account (each appends the address it received the request from).
+    """
+    proxies = current_app.config.get('RATELIMIT_TRUSTED_PROXIES', 1)
+    forwarded = [part.strip() for part in request.headers.get('X-Forwarded-For', '').split(',') if part.strip()]
+    if proxies and forwarded:
+        return forwarded[-min(proxies, len(forwarded))]
+    return request.remote_addr or 'unknown'
+
+
+def _storage_path():
+    return current_app.config.get('RATELIMIT_STORAGE_PATH') or os.path.join(
+        tempfile.gettempdir(), 'sanbud-ratelimit.db'
+    )
+
+
+def _connection():
+    """This thread's connection to the bucket store (reopened after a fork)."""
+    path = _storage_path()
+    connection = getattr(_local, 'connection', None)
+    if connection is None or _local.path != path or _local.pid != os.getpid():
+        connection = sqlite3.connect(path, timeout=1, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS buckets ('
+            'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)'
+        )
+        _local.connection = connection
+        _local.path = path
+        _local.pid = os.getpid()
+    return connection
+
+
+def take_tokens(buckets, now=None):
+    """
+    Take one token from every bucket in ``buckets`` (``[(key, rate)]``), or
+    from none of them.
+
+    Returns ``0`` when the request may proceed, otherwise the number of
+    seconds until all buckets have a token again.
+    """
+    now = now or time.time()
+    connection = _connection()
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        levels = []
+        wait = 0.0
+        for key, rate in buckets:
+            capacity, refill = parse_rate(rate)
+            row = connection.execute('SELECT tokens, updated_at FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * refill)
+            if tokens < 1:
+                wait = max(wait, (1 - tokens) / refill)
+            levels.append((key, tokens))
+
+        if not wait:
+            connection.executemany(
+                'INSERT INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at',
+                [(key, tokens - 1, now) for key, tokens in levels]
+            )
+            if random.random() < 0.01:
+                connection.execute('DELETE FROM buckets WHERE updated_at < ?', (now - STALE_SECONDS,))
+        connection.execute('COMMIT')
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    return wait
+
+
+def max_expensive_inflight(config):
+    """``RATELIMIT_MAX_EXPENSIVE_INFLIGHT``, or the worker's threads but one."""
+    limit = config.get('RATELIMIT_MAX_EXPENSIVE_INFLIGHT')
+    if limit is None:
+        # WORKER_THREADS is set by gunicorn.conf.py after the fork
+        limit = config.get('WORKER_THREADS', 1) - 1
+    return max(1, limit)
+
+
+def _expensive_slots():
+    """Per-worker semaphore bounding concurrent expensive requests."""
+    global _slots
+    with _slots_lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(max_expensive_inflight(current_app.config))
+        return _slots
+
+
+def _rejected(message, status, retry_after):
+    response = jsonify({'success': False, 'error': message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def rate_limit(name, per_ip, per_endpoint=None, shed=True):
+    """
+    Decorator limiting an endpoint to ``per_ip`` requests per client and
+    ``per_endpoint`` requests overall, e.g. ``per_ip='5/minute'``.
+
+    With ``shed`` the endpoint also counts as expensive and is refused with
+    ``503`` while the worker is busy with other expensive requests.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            config = current_app.config
+            if not config.get('RATELIMIT_ENABLED', True) or request.method == 'OPTIONS':
+                return f(*args, **kwargs)
+
+            buckets = [(f'{name}:ip:{client_ip()}', per_ip)]
+            if per_endpoint:
+                buckets.append((f'{name}:all', per_endpoint))
+            try:
+                wait = take_tokens(buckets)
+            except Exception as e:
+                # Never turn a limiter problem into an outage
+                current_app.logger.warning(f'Rate limiter unavailable, allowing request: {e}')
+                wait = 0
+            if wait:
+                return _rejected('Zbyt wiele żądań. Spróbuj ponownie za chwilę.', 429, wait)
+
+            if not shed:
+                return f(*args, **kwargs)
+
+            slots = _expensive_slots()
+            if not slots.acquire(blocking=False):
+                return _rejected('Serwer jest chwilowo przeciążony. Spróbuj ponownie za chwilę.', 503, 1)
+            try:
+                return f(*args, **kwargs)
+            finally:
+                slots.release()
+        return decorated_function
+    return decorator
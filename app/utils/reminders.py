@@ -0,0 +1,300 @@
+"""
+Scheduler for the 24h appointment reminders promised in the confirmation emails.
+
+``flask reminders run`` keeps every upcoming appointment that still needs a
+reminder in a min-heap keyed by its reminder time (UTC) and sleeps until the
+earliest one is due. It never rescans the table after startup: new,
+rescheduled, cancelled and deleted bookings arrive through ``change_events``
+(see ``app.utils.events``), and only the touched ids are reloaded.
+Superseded heap entries are skipped lazily when they reach the top.
+
+Due reminders are sent in batches over one SMTP connection. Each one is
+claimed first with a conditional ``UPDATE`` of ``reminder_sent_at`` that is
+committed before sending, so a restarted or second scheduler never sends the
+same reminder again; a failed send releases the claim and is retried later.
+"""
+import heapq
+import json
+import time
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from flask import current_app
+from sqlalchemy import select, update
+
+from app import db
+from app.models.appointment import Appointment
+from app.models.customer import Customer
+from app.models.service import Service
+from app.utils.events import EventCursor, ensure_listener, hub, oldest_event_id
+from app.utils.scheduling import ACTIVE_STATUSES
+
+# Wait before retrying a reminder whose email could not be sent
+RETRY_DELAY = timedelta(minutes=10)
+
+
+class ReminderScheduler:
+    """Min-heap of ``(remind_at, appointment_id)`` fed by the change event log."""
+
+    def __init__(self, config=None):
+        config = config or current_app.config
+        self.hours_before = config.get('REMINDER_HOURS_BEFORE', 24)
+        self.min_lead = timedelta(hours=config.get('REMINDER_MIN_LEAD_HOURS', 2))
+        self.batch_size = config.get('REMINDER_BATCH_SIZE', 50)
+        self.poll_seconds = config.get('REMINDER_POLL_SECONDS', 30)
+        self.gap_seconds = config.get('EVENTS_GAP_SECONDS', 60)
+        try:
+            self.timezone = ZoneInfo(config.get('REMINDER_TIMEZONE', 'Europe/Warsaw'))
+        except ZoneInfoNotFoundError:
+            # No timezone database: appointment times are in the server's zone
+            self.timezone = None
+
+        self._heap = []
+        self._scheduled = {}  # appointment id -> remind_at of its live heap entry
+        self._events = None
+
+    # Times
+
+    def _utc(self, scheduled_date, scheduled_time):
+        """Naive UTC datetime of a local appointment start."""
+        local = datetime.combine(scheduled_date, scheduled_time)
+        if self.timezone is not None:
+            local = local.replace(tzinfo=self.timezone)
+        return local.astimezone(ZoneInfo('UTC')).replace(tzinfo=None)
+
+    def remind_at(self, scheduled_date, scheduled_time):
+        return self._utc(scheduled_date, scheduled_time) - timedelta(hours=self.hours_before)
+
+    # Heap maintenance
+
+    def _push(self, appointment_id, remind_at):
+        self._scheduled[appointment_id] = remind_at
+        heapq.heappush(self._heap, (remind_at, appointment_id))
+
+    def _discard(self, appointment_id):
+        # The heap entry stays until it is popped and found superseded
+        self._scheduled.pop(appointment_id, None)
+
+    def _apply_rows(self, rows):
+        """Schedule or drop appointments from ``(id, date, time, status, reminder_sent_at)`` rows."""
+        for appointment_id, scheduled_date, scheduled_time, status, reminder_sent_at in rows:
+            if status not in ACTIVE_STATUSES or reminder_sent_at is not None:
+                self._discard(appointment_id)
+                continue
+            remind_at = self.remind_at(scheduled_date, scheduled_time)
+            if self._scheduled.get(appointment_id) != remind_at:
+                self._push(appointment_id, remind_at)
+
+    def _pending_query(self):
+        return select(
+            Appointment.id,
+            Appointment.scheduled_date,
+            Appointment.scheduled_time,
+            Appointment.status,
+            Appointment.reminder_sent_at
+        )
+
+    def load(self):
+        """Rebuild the heap from all upcoming appointments without a reminder."""
+        # Read the event position first, so changes made during the load are replayed
+        self._events = EventCursor(gap_seconds=self.gap_seconds)
+        self._heap = []
+        self._scheduled = {}
+        rows = db.session.execute(self._pending_query().where(
+            Appointment.reminder_sent_at.is_(None),
+            Appointment.status.in_(ACTIVE_STATUSES),
+            Appointment.scheduled_date >= date.today() - timedelta(days=1)
+        )).all()
+        self._apply_rows(rows)
+        db.session.rollback()
+        return len(self._scheduled)
+
+    def reload(self, appointment_ids):
+        """Refresh the given appointments; missing ids were deleted or archived."""
+        appointment_ids = list(appointment_ids)
+        for start in range(0, len(appointment_ids), 500):
+            chunk = appointment_ids[start:start + 500]
+            rows = db.session.execute(self._pending_query().where(Appointment.id.in_(chunk))).all()
+            for missing in set(chunk) - {row.id for row in rows}:
+                self._discard(missing)
+            self._apply_rows(rows)
+        db.session.rollback()
+
+    def catch_up(self):
+        """Apply appointment changes logged since the last call."""
+        oldest = oldest_event_id()
+        if self._events is None or (oldest is not None and self._events.last_id < oldest - 1):
+            # Events were pruned while we were not looking
+            self.load()
+            return
+
+        touched = set()
+        while True:
+            rows = self._events.fetch(limit=500)
+            if not rows:
+                break
+            for row in rows:
+                if row['entity'] != 'appointment':
+                    continue
+                if row['entity_id'] is not None:
+                    touched.add(row['entity_id'])
+                elif row['payload']:
+                    # Batch events carry the ids they affected
+                    touched.update(json.loads(row['payload']).get('ids', []))
+        if touched:
+            self.reload(touched)
+
+    def next_due(self):
+        """Reminder time of the earliest live heap entry, or ``None``."""
+        while self._heap:
+            remind_at, appointment_id = self._heap[0]
+            if self._scheduled.get(appointment_id) == remind_at:
+                return remind_at
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now):
+        """Remove and return up to ``batch_size`` appointment ids that are due."""
+        due = []
+        while len(due) < self.batch_size:
+            remind_at = self.next_due()
+            if remind_at is None or remind_at > now:
+                break
+            _, appointment_id = heapq.heappop(self._heap)
+            del self._scheduled[appointment_id]
+            due.append(appointment_id)
+        return due
+
+    # Sending
+
+    def _claim(self, appointment_ids, now):
+        """
+        Mark reminders as sent before sending them. Returns the email data of
+        the appointments this process claimed.
+        """
+        rows = db.session.execute(select(
+            Appointment.id,
+            Appointment.scheduled_date,
+            Appointment.scheduled_time,
+            Appointment.event_location,
+            Customer.first_name,
+            Customer.last_name,
+            Customer.email,
+            Customer.address,
+            Customer.city,
+            Service.name.label('service_name')
+        ).join(
+            Customer, Customer.id == Appointment.customer_id
+        ).join(
+            Service, Service.id == Appointment.service_id
+        ).where(
+            Appointment.id.in_(appointment_ids),
+            Appointment.reminder_sent_at.is_(None),
+            Appointment.status.in_(ACTIVE_STATUSES)
+        )).all()
+
+        claimed = []
+        for row in rows:
+            if self.remind_at(row.scheduled_date, row.scheduled_time) > now:
+                # Rescheduled since it was queued; the change event requeues it
+                continue
+            if self._utc(row.scheduled_date, row.scheduled_time) - now < self.min_lead:
+                # Booked too late or already started: the confirmation is enough
+                continue
+            if not row.email:
+                continue
+
+            # The schedule in the WHERE clause guards against a concurrent reschedule;
+            # updated_at is kept so the marker does not invalidate synced copies
+            result = db.session.execute(update(Appointment).where(
+                Appointment.id == row.id,
+                Appointment.reminder_sent_at.is_(None),
+                Appointment.status.in_(ACTIVE_STATUSES),
+                Appointment.scheduled_date == row.scheduled_date,
+                Appointment.scheduled_time == row.scheduled_time
+            ).values(
+                reminder_sent_at=now,
+                updated_at=Appointment.updated_at
+            ).execution_options(synchronize_session=False))
+            if result.rowcount == 1:
+                claimed.append(row)
+        db.session.commit()
+        return claimed
+
+    def _release(self, rows, now):
+        """Undo the claim of reminders that could not be sent and retry them later."""
+        db.session.execute(update(Appointment).where(
+            Appointment.id.in_([row.id for row in rows]),
+            Appointment.reminder_sent_at == now
+        ).values(
+            reminder_sent_at=None,
+            updated_at=Appointment.updated_at
+        ).execution_options(synchronize_session=False))
+        db.session.commit()
+        for row in rows:
+            self._push(row.id, now + RETRY_DELAY)
+
+    @staticmethod
+    def _reminder_data(row):
+        return {
+            'name': f'{row.first_name} {row.last_name}'.strip(),
+            'email': row.email,
+            'date': row.scheduled_date.isoformat(),
+            'time': row.scheduled_time.strftime('%H:%M'),
+            'service': row.service_name,
+            'address': row.event_location or ', '.join(part for part in (row.address, row.city) if part)
+        }
+
+    def send_due(self, now=None):
+        """Send every reminder due at ``now``. Returns the number sent."""
+        from config.email import send_appointment_reminders
+
+        now = now or datetime.utcnow()
+        sent = 0
+        while True:
+            due = self.pop_due(now)
+            if not due:
+                return sent
+            claimed = self._claim(due, now)
+            if not claimed:
+                continue
+            results = send_appointment_reminders([self._reminder_data(row) for row in claimed])
+            failed = [row for row, ok in zip(claimed, results) if not ok]
+            if failed:
+                self._release(failed, now)
+            sent += len(claimed) - len(failed)
+
+    def run(self, once=False, max_seconds=None):
+        """
+        Send reminders until stopped. With ``once``, send what is due and return.
+
+        Returns the number of reminders sent.
+        """
+        self.load()
+        sent = self.send_due()
+        if once:
+            return sent
+
+        ensure_listener()
+        deadline = time.monotonic() + max_seconds if max_seconds else None
+        generation = hub.generation
+        while deadline is None or time.monotonic() < deadline:
+            timeout = self.poll_seconds
+            next_due = self.next_due()
+            if next_due is not None:
+                timeout = min(timeout, max((next_due - datetime.utcnow()).total_seconds(), 0))
+            if deadline is not None:
+                timeout = min(timeout, max(deadline - time.monotonic(), 0))
+            if timeout > 0:
+                # Woken early by LISTEN/NOTIFY on PostgreSQL; polls otherwise
+                generation = hub.wait(generation, timeout)
+
+            try:
+                self.catch_up()
+                sent += self.send_due()
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.error(f'Reminder scheduler error: {e}')
+            finally:
+                db.session.remove()
+        return sent
@@ -0,0 +1,135 @@
+"""
+Read-replica routing for admin reporting queries.
+
+When ``SQLALCHEMY_REPLICA_URI`` is configured it is registered as the
+``replica`` bind. Views decorated with ``@read_replica`` run their SELECTs
+on that engine; everything else, and every flush, stays on the primary.
+
+The replica is skipped (and the primary used instead) when:
+
+* the admin made a change within ``REPLICA_STICKY_SECONDS`` (read-your-writes),
+* the replica lags more than ``REPLICA_MAX_LAG_SECONDS`` behind the primary,
+* the replica could not be reached; it is retried after ``REPLICA_RETRY_SECONDS``.
+
+Replica health is checked at most every ``REPLICA_HEALTH_TTL_SECONDS`` per
+process.
+"""
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import text
+
+REPLICA_BIND = 'replica'
+
+_health_lock = threading.Lock()
+_health = {'checked_at': 0.0, 'usable': False, 'down_until': 0.0}
+
+_sticky_lock = threading.Lock()
+_sticky_until = {}  # admin id -> monotonic deadline
+
+
+class RoutingSession(Session):
+    """Session that sends reads to the replica while ``info['use_replica']`` is set."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+        if bind is None and self.info.get('use_replica') and not self._flushing:
+            engines = self._db.engines
+            if engine is engines.get(None) and REPLICA_BIND in engines:
+                return engines[REPLICA_BIND]
+        return engine
+
+
+def replica_configured():
+    """Whether a replica bind is configured for this app."""
+    return REPLICA_BIND in current_app.extensions['sqlalchemy'].engines
+
+
+def _replica_lag_seconds(engine):
+    """Replication delay in seconds; 0 for databases that are not standbys."""
+    with engine.connect() as connection:
+        if engine.dialect.name != 'postgresql':
+            connection.execute(text('SELECT 1'))
+            return 0.0
+        lag = connection.execute(text(
+            'SELECT CASE WHEN pg_is_in_recovery() '
+            'THEN EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) ELSE 0 END'
+        )).scalar()
+        return float(lag or 0)
+
+
+def replica_usable():
+    """Whether the replica is reachable and fresh enough, cached per process."""
+    if not replica_configured():
+        return False
+
+    config = current_app.config
+    now = time.monotonic()
+    with _health_lock:
+        if now < _health['down_until']:
+            return False
+        if now - _health['checked_at'] < config.get('REPLICA_HEALTH_TTL_SECONDS', 5):
+            return _health['usable']
+
+        engine = current_app.extensions['sqlalchemy'].engines[REPLICA_BIND]
+        try:
+            lag = _replica_lag_seconds(engine)
+            usable = lag <= config.get('REPLICA_MAX_LAG_SECONDS', 10)
+            if not usable:
+                current_app.logger.warning(f"Read replica lags {lag:.1f}s; using primary")
+        except Exception as e:
+            current_app.logger.warning(f"Read replica unavailable, using primary: {e}")
+            _health['down_until'] = now + config.get('REPLICA_RETRY_SECONDS', 30)
+            usable = False
+
+        _health['checked_at'] = now
+        _health['usable'] = usable
+        return usable
+
+
+def mark_primary(admin_id=None):
+    """Pin the current admin to the primary after a write (read-your-writes)."""
+    seconds = current_app.config.get('REPLICA_STICKY_SECONDS', 15)
+    session['primary_until'] = time.time() + seconds
+    if admin_id is not None:
+        with _sticky_lock:
+            _sticky_until[admin_id] = time.monotonic() + seconds
+
+
+def _pinned_to_primary():
+    """Whether the current admin wrote recently enough to need the primary."""
+    if session.get('primary_until', 0) > time.time():
+        return True
+
+    admin = getattr(request, 'current_admin', None)
+    if admin is None:
+        return False
+    with _sticky_lock:
+        deadline = _sticky_until.get(admin.id)
+        if deadline is not None and deadline <= time.monotonic():
+            del _sticky_until[admin.id]
+            deadline = None
+    return deadline is not None
+
+
+def read_replica(f):
+    """Run the view's queries on the read replica when it is safe to do so."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        from app import db
+
+        if _pinned_to_primary() or not replica_usable():
+            return f(*args, **kwargs)
+
+        db.session.info['use_replica'] = True
+        try:
+            return f(*args, **kwargs)
+        finally:
+            db.session.info.pop('use_replica', None)
+            # Release the replica connection; the view only read
+            db.session.rollback()
+    return decorated_function
@@ -0,0 +1,187 @@
+"""
+Booking slot allocation with duration-aware overlap checks.
+
+Every write that places an appointment on the calendar first calls
+``lock_day``, which serialises bookings for the same day (a transaction-scoped
+advisory lock on PostgreSQL, the database write lock on SQLite), and then
+``check_slot``, which compares the requested interval with the active
+appointments of that day using each appointment's ``Service.duration_minutes``.
+``reserve_slot`` does both when the duration is already known.
+
+The public availability view reads ``cached_booked_intervals`` instead,
+which is shared by all workers and dropped whenever an appointment or a
+service changes. The booking path itself never reads from the cache.
+"""
+from datetime import datetime, time, timedelta
+
+from flask import current_app
+from sqlalchemy import text
+
+from app import db
+from app.models.appointment import Appointment
+from app.models.service import Service
+from app.utils.cache import cache
+
+# Appointments in these statuses occupy their time slot
+ACTIVE_STATUSES = ('pending', 'confirmed')
+
+# First key of the two-int advisory lock, so booking locks never collide with
+# advisory locks taken elsewhere ("SB" in ASCII)
+BOOKING_LOCK_NAMESPACE = 0x5342
+
+DEFAULT_DURATION_MINUTES = 60
+
+
+class SlotUnavailable(Exception):
+    """Raised when the requested interval overlaps an existing appointment."""
+
+    def __init__(self, scheduled_date, scheduled_time, alternatives):
+        super().__init__(f'Slot {scheduled_date} {scheduled_time} is already booked')
+        self.scheduled_date = scheduled_date
+        self.scheduled_time = scheduled_time
+        self.alternatives = alternatives
+
+    def to_dict(self):
+        """Payload for the 409 response."""
+        return {
+            'success': False,
+            'error': 'Wybrany termin jest już zajęty. Wybierz inną godzinę.',
+            'conflict': {
+                'date': self.scheduled_date.isoformat(),
+                'time': self.scheduled_time.strftime('%H:%M')
+            },
+            'alternative_slots': self.alternatives
+        }
+
+
+def _minutes(value):
+    """Minutes since midnight for a ``time``."""
+    return value.hour * 60 + value.minute
+
+
+def _working_hours():
+    """Return (day_start, day_end, step) in minutes from configuration."""
+    day_start = datetime.strptime(current_app.config.get('BOOKING_DAY_START', '07:00'), '%H:%M').time()
+    day_end = datetime.strptime(current_app.config.get('BOOKING_DAY_END', '18:00'), '%H:%M').time()
+    step = current_app.config.get('BOOKING_SLOT_MINUTES', 30)
+    return _minutes(day_start), _minutes(day_end), step
+
+
+def lock_day(scheduled_date):
+    """
+    Serialise bookings for one calendar day until the current transaction ends.
+
+    Must run before any other statement of the booking transaction, so that on
+    SQLite the overlap check reads a snapshot taken after the lock was granted.
+    """
+    dialect = db.engine.dialect.name
+
+    if dialect == 'postgresql':
+        db.session.execute(
+            text('SELECT pg_advisory_xact_lock(:namespace, :day)'),
+            {'namespace': BOOKING_LOCK_NAMESPACE, 'day': scheduled_date.toordinal()}
+        )
+    elif dialect == 'sqlite':
+        # A no-op write takes SQLite's RESERVED lock, which blocks other
+        # writers (and so other bookings) until this transaction commits.
+        db.session.execute(text('UPDATE appointments SET id = id WHERE 1 = 0'))
+
+
+def booked_intervals(scheduled_date, exclude_id=None):
+    """
+    Return ``[(start_minute, end_minute, appointment_id), ...]`` for active
+    appointments on the given day, loaded with a single query.
+    """
+    query = db.session.query(
+        Appointment.id,
+        Appointment.scheduled_time,
+        Service.duration_minutes
+    ).outerjoin(
+        Service, Service.id == Appointment.service_id
+    ).filter(
+        Appointment.scheduled_date == scheduled_date,
+        Appointment.status.in_(ACTIVE_STATUSES)
+    )
+    if exclude_id is not None:
+        query = query.filter(Appointment.id != exclude_id)
+
+    intervals = []
+    for appointment_id, scheduled_time, duration in query.all():
+        start = _minutes(scheduled_time)
+        intervals.append((start, start + (duration or DEFAULT_DURATION_MINUTES), appointment_id))
+    return sorted(intervals)
+
+
+def cached_booked_intervals(scheduled_date):
+    """``booked_intervals`` for display, cached for ``AVAILABILITY_CACHE_SECONDS``."""
+    return cache.get_or_set(
+        f'availability:{scheduled_date.isoformat()}',
+        lambda: booked_intervals(scheduled_date),
+        ttl=current_app.config.get('AVAILABILITY_CACHE_SECONDS', 300),
+        tags=('appointments', 'services')
+    )
+
+
+def _overlaps(start, end, intervals):
+    """Whether [start, end) overlaps any of the given intervals."""
+    return any(start < other_end and other_start < end for other_start, other_end, _ in intervals)
+
+
+def free_slots(intervals, duration_minutes):
+    """All slot start times (``HH:MM``) on the working-day grid that fit ``duration_minutes``."""
+    day_start, day_end, step = _working_hours()
+    slots = []
+    for start in range(day_start, day_end + 1, step):
+        if not _overlaps(start, start + duration_minutes, intervals):
+            slots.append(f'{start // 60:02d}:{start % 60:02d}')
+    return slots
+
+
+def alternative_slots(scheduled_time, intervals, duration_minutes, limit=5):
+    """Free slots on the same day, closest to the requested time first."""
+    requested = _minutes(scheduled_time)
+    slots = free_slots(intervals, duration_minutes)
+    slots.sort(key=lambda slot: abs(int(slot[:2]) * 60 + int(slot[3:]) - requested))
+    return slots[:limit]
+
+
+def check_slot(scheduled_date, scheduled_time, duration_minutes=None, exclude_id=None):
+    """
+    Verify that the interval is free. Call ``lock_day`` first in the same transaction.
+
+    Raises ``SlotUnavailable`` with nearby free slots on conflict.
+    """
+    duration_minutes = duration_minutes or DEFAULT_DURATION_MINUTES
+    intervals = booked_intervals(scheduled_date, exclude_id=exclude_id)
+    start = _minutes(scheduled_time)
+    if _overlaps(start, start + duration_minutes, intervals):
+        raise SlotUnavailable(
+            scheduled_date,
+            scheduled_time,
+            alternative_slots(scheduled_time, intervals, duration_minutes)
+        )
+
+
+def reserve_slot(scheduled_date, scheduled_time, duration_minutes=None, exclude_id=None):
+    """
+    Lock the day and verify that the interval is free.
+
+    The lock is held until the caller commits or rolls back, so the
+    appointment must be inserted in the same transaction.
+    """
+    lock_day(scheduled_date)
+    check_slot(scheduled_date, scheduled_time, duration_minutes, exclude_id=exclude_id)
+
+
+def service_duration(service_id):
+    """Duration of a service in minutes, or the default when unknown."""
+    if not service_id:
+        return DEFAULT_DURATION_MINUTES
+    duration = db.session.query(Service.duration_minutes).filter(Service.id == service_id).scalar()
+    return duration or DEFAULT_DURATION_MINUTES
+
+
+def end_time(scheduled_time, duration_minutes):
+    """End ``time`` of an appointment (clamped to the same day)."""
+    end = datetime.combine(datetime.min, scheduled_time) + timedelta(minutes=duration_minutes)
+    return end.time() if end.date() == datetime.min.date() else time(23, 59)
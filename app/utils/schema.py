@@ -0,0 +1,109 @@
+"""
+Additive schema synchronisation for existing databases.
+
+``db.create_all()`` only creates missing tables. This module also adds
+missing nullable columns and indexes declared on the models, so new fields
+reach databases that were created before them without hand-written ALTERs.
+On PostgreSQL it also adds missing foreign keys and brings their ``ON
+DELETE`` actions in line with the models.
+"""
+from flask import current_app
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import AddConstraint, CreateColumn, CreateIndex
+
+from app import db
+
+
+def _add_missing_columns(inspector):
+    """Add model columns that are absent from existing tables. Returns added names."""
+    added = []
+    existing_tables = set(inspector.get_table_names())
+
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {col['name'] for col in inspector.get_columns(table.name)}
+
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            if not column.nullable and column.server_default is None:
+                current_app.logger.warning(
+                    f"Skipping NOT NULL column {table.name}.{column.name} without server default"
+                )
+                continue
+            column_ddl = CreateColumn(column).compile(dialect=db.engine.dialect)
+            db.session.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column_ddl}'))
+            added.append(f'{table.name}.{column.name}')
+
+    db.session.commit()
+    return added
+
+
+def _create_missing_indexes():
+    """Create indexes declared on the models that do not exist yet."""
+    # IF NOT EXISTS rather than checkfirst: SQLite does not reflect expression indexes
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+
+
+def _sync_foreign_keys(inspector):
+    """
+    Add missing foreign keys and recreate those whose ``ON DELETE`` action
+    differs from the model (PostgreSQL only). Returns the changed columns.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return []
+
+    changed = []
+    existing_tables = set(inspector.get_table_names())
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = inspector.get_foreign_keys(table.name)
+
+        for constraint in table.foreign_key_constraints:
+            columns = [column.name for column in constraint.columns]
+            match = next((fk for fk in existing if fk['constrained_columns'] == columns
+                          and fk['referred_table'] == constraint.referred_table.name), None)
+            wanted = (constraint.ondelete or 'NO ACTION').upper()
+            if match and (match['options'].get('ondelete') or 'NO ACTION').upper() == wanted:
+                continue
+
+            try:
+                with db.session.begin_nested():
+                    if match:
+                        db.session.execute(text(f'ALTER TABLE {table.name} DROP CONSTRAINT "{match["name"]}"'))
+                    db.session.execute(AddConstraint(constraint))
+                changed.append(f"{table.name}.{','.join(columns)}")
+            except DBAPIError as e:
+                # e.g. rows pointing at deleted parents; fix the data and rerun
+                current_app.logger.warning(f"Could not update foreign key on {table.name}.{columns}: {e}")
+
+    db.session.commit()
+    return changed
+
+
+def ensure_schema():
+    """
+    Bring the connected database up to date with the models.
+
+    Changes are idempotent and, apart from foreign key actions on PostgreSQL,
+    only additive: no table or column is dropped or altered.
+    Returns the list of columns that were added.
+    """
+    import app.models  # noqa: F401 - register every model on the metadata
+
+    db.create_all()
+    added = _add_missing_columns(inspect(db.engine))
+    _create_missing_indexes()
+    foreign_keys = _sync_foreign_keys(inspect(db.engine))
+
+    if added:
+        current_app.logger.info(f"Added columns: {', '.join(added)}")
+    if foreign_keys:
+        current_app.logger.info(f"Updated foreign keys: {', '.join(foreign_keys)}")
+    return added
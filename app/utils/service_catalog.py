@@ -0,0 +1,118 @@
+"""
+In-memory service catalog for resolving public service names.
+
+Public booking forms send a service *name*. Instead of querying (and, for
+unknown names, inserting) a ``Service`` row on every booking, names are
+resolved against a folded name -> service map built from ``services`` and
+``service_aliases``. The map is kept in the shared cache under the
+``services`` tag: it is loaded once for all workers, dropped in every worker
+when a commit touches the catalog, and reloaded at the latest after
+``SERVICE_CATALOG_TTL_SECONDS``.
+"""
+from collections import namedtuple
+
+from flask import current_app
+
+from app import db
+from app.models.service import Service
+from app.models.service_alias import ServiceAlias
+from app.utils.cache import cache
+from app.utils.text import fold
+
+ServiceRef = namedtuple('ServiceRef', ['id', 'name', 'duration_minutes', 'is_active'])
+
+CATALOG_KEY = 'services:catalog'
+
+
+def _load_catalog():
+    """Build the folded name -> ServiceRef map with two queries."""
+    catalog = {}
+    services = {}
+
+    rows = db.session.query(
+        Service.id, Service.name, Service.name_key, Service.duration_minutes, Service.is_active
+    ).all()
+    for service_id, name, name_key, duration_minutes, is_active in rows:
+        ref = ServiceRef(service_id, name, duration_minutes, bool(is_active))
+        services[service_id] = ref
+        catalog.setdefault(name_key or fold(name), ref)
+
+    for alias_key, service_id in db.session.query(ServiceAlias.alias_key, ServiceAlias.service_id).all():
+        if service_id in services:
+            catalog.setdefault(alias_key, services[service_id])
+
+    return catalog
+
+
+def get_catalog():
+    """Return the cached catalog, loading it if missing, expired or invalidated."""
+    ttl = current_app.config.get('SERVICE_CATALOG_TTL_SECONDS', 300)
+    return cache.get_or_set(CATALOG_KEY, _load_catalog, ttl=ttl, tags=('services',))
+
+
+def invalidate():
+    """Drop the cached catalog in every worker; the next lookup reloads it."""
+    cache.invalidate('services')
+
+
+def resolve_service(name):
+    """Return the ``ServiceRef`` for a service name or alias, or ``None``."""
+    if not name:
+        return None
+    return get_catalog().get(fold(name))
+
+
+def resolve_booking_service(name):
+    """
+    Resolve the service for a public booking.
+
+    Unknown names map to the configured ``BOOKING_FALLBACK_SERVICE`` instead
+    of creating a new catalog entry; the fallback is created (inactive) the
+    first time it is needed. Returns ``(ServiceRef, matched)``.
+    """
+    service = resolve_service(name)
+    if service:
+        return service, True
+
+    fallback_name = current_app.config.get('BOOKING_FALLBACK_SERVICE', 'Inna usługa')
+    service = resolve_service(fallback_name)
+    if service:
+        return service, False
+
+    fallback = Service(
+        name=fallback_name,
+        description='Usługa zastępcza dla zgłoszeń spoza katalogu',
+        category='repair',
+        duration_minutes=60,
+        price=0,
+        is_active=False
+    )
+    db.session.add(fallback)
+    db.session.flush()
+    current_app.logger.info(f"Created fallback booking service '{fallback_name}'")
+    return ServiceRef(fallback.id, fallback.name, fallback.duration_minutes, False), False
+
+
+def backfill_name_keys():
+    """
+    Fill ``name_key`` for services created before the column existed.
+
+    Services whose folded name collides with another service are left
+    without a key and reported, so an admin can merge them or add an alias.
+    Returns the list of service ids that could not be keyed.
+    """
+    taken = {key for (key,) in db.session.query(Service.name_key).filter(Service.name_key.isnot(None))}
+    conflicts = []
+
+    for service in Service.query.filter(Service.name_key.is_(None)).order_by(Service.id):
+        key = fold(service.name)
+        if key in taken:
+            conflicts.append(service.id)
+            continue
+        service.name_key = key
+        taken.add(key)
+
+    db.session.commit()
+    if conflicts:
+        current_app.logger.warning(f"Services with duplicate normalized names: {conflicts}")
+    return conflicts
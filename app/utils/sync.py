@@ -0,0 +1,346 @@
+"""
+Incremental sync of admin data.
+
+Clients keep an opaque cursor holding, per entity, the ``(updated_at, id)``
+of the last row they received, plus the id of the last tombstone. A sync
+request returns only rows past those positions, read in ``(updated_at, id)``
+order from the matching composite indexes. When nothing has changed, each
+entity costs a single index probe and the response is just the unchanged
+cursor.
+
+``updated_at`` is set at flush, not at commit, so a slow transaction can
+commit rows behind a position the client has already passed. Such a row
+was updated at most ``overlap_seconds`` before the previous sync read, so
+the cursor also records when that was and which rows of that window the
+client already holds; the next sync sends the other rows of the window
+under ``resent``. Once the window has moved past the positions, nothing
+is re-read.
+
+A customer's ``appointment_count`` is part of its payload, so adding,
+removing or moving an appointment bumps the customer's ``updated_at``.
+
+Hard deletes leave a ``Tombstone`` row, written in the deleting flush, so
+clients can drop rows they hold locally.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, event, func, inspect, tuple_, update
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.appointment import Appointment
+from app.models.customer import Customer
+from app.models.message import Message
+from app.models.service import Service
+from app.models.tombstone import Tombstone
+
+# Synced entities, keyed by the name used in responses and cursors
+SYNC_MODELS = {
+    'appointments': Appointment,
+    'customers': Customer,
+    'messages': Message,
+}
+
+# Entity names recorded in tombstones
+TOMBSTONE_ENTITIES = {
+    Appointment: 'appointment',
+    Customer: 'customer',
+    Message: 'message',
+}
+
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+
+# Re-read rows updated this long before the previous sync (late commits)
+DEFAULT_OVERLAP_SECONDS = 60
+
+# Rows of the window remembered per entity; rows past this are sent again
+MAX_SEEN_ROWS = 500
+
+
+class InvalidCursor(ValueError):
+    """Raised when a sync cursor cannot be decoded."""
+
+
+def encode_cursor(state):
+    """Serialise cursor state into an opaque URL-safe token."""
+    raw = json.dumps(state, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Parse a token produced by ``encode_cursor`` into ``(positions,
+    tombstone_id, recent)``; ``recent`` is the window of the previous sync.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        positions = {}
+        for entity in SYNC_MODELS:
+            position = state.get(entity)
+            if position is not None:
+                positions[entity] = [datetime.fromisoformat(position[0]), int(position[1])]
+        tombstone = state.get('tombstones')
+        synced_at = state.get('synced_at')
+        recent = {
+            'synced_at': datetime.fromisoformat(synced_at) if synced_at else None,
+            'seen': {
+                entity: {(int(row_id), datetime.fromisoformat(updated_at)) for row_id, updated_at in rows}
+                for entity, rows in state.get('seen', {}).items() if entity in SYNC_MODELS
+            }
+        }
+        return positions, int(tombstone) if tombstone is not None else None, recent
+    except (ValueError, TypeError, KeyError, IndexError, AttributeError, binascii.Error) as e:
+        raise InvalidCursor('Invalid sync cursor') from e
+
+
+def cursor_from_timestamp(updated_since):
+    """Cursor positions equivalent to an ``updated_since`` watermark."""
+    positions = {entity: [updated_since, 0] for entity in SYNC_MODELS}
+    tombstone_id = db.session.query(func.max(Tombstone.id)).filter(
+        Tombstone.deleted_at < updated_since
+    ).scalar()
+    return positions, tombstone_id or 0
+
+
+def _changed_since(query, model, position, limit, window):
+    """
+    ``(rows, resent_rows)`` of ``query``: rows past ``position`` in
+    (updated_at, id) order, and the rows behind it updated since
+    ``window`` (``(since, seen)``) that the client has not seen, which
+    committed after it was read.
+    """
+    order = (model.updated_at, model.id)
+    if position is None:
+        return query.order_by(*order).limit(limit).all(), []
+
+    key = tuple_(model.updated_at, model.id)
+    rows = query.filter(key > tuple_(*position)).order_by(*order).limit(limit).all()
+    resent_rows = []
+    if window is not None and position[0] >= window[0]:
+        since, seen = window
+        conditions = [model.updated_at >= since, key < tuple_(*position)]
+        if seen:
+            conditions.append(tuple_(model.id, model.updated_at).notin_(list(seen)))
+        resent_rows = query.filter(and_(*conditions)).order_by(*order).limit(limit).all()
+    return rows, resent_rows
+
+
+def _serialize_appointments(position, limit, window):
+    """Changed appointments with the customer and service summary used by the admin list."""
+    query = db.session.query(Appointment, Customer, Service).outerjoin(
+        Customer, Customer.id == Appointment.customer_id
+    ).outerjoin(
+        Service, Service.id == Appointment.service_id
+    )
+    rows, resent_rows = _changed_since(query, Appointment, position, limit, window)
+
+    def serialize(appointment, customer, service):
+        data = appointment.to_dict()
+        if customer:
+            data['customer'] = {
+                'id': customer.id,
+                'first_name': customer.first_name,
+                'last_name': customer.last_name,
+                'email': customer.email,
+                'phone': customer.phone
+            }
+        if service:
+            data['service'] = {
+                'id': service.id,
+                'name': service.name,
+                'duration': service.duration_minutes,
+                'price': float(service.price) if service.price else 0
+            }
+        return data
+
+    return (
+        [appointment for appointment, _, _ in rows],
+        [appointment for appointment, _, _ in resent_rows],
+        [serialize(*row) for row in rows],
+        [serialize(*row) for row in resent_rows],
+    )
+
+
+def _serialize_customers(position, limit, window):
+    """Changed customers with their appointment counts (one grouped query)."""
+    customers, resent_customers = _changed_since(db.session.query(Customer), Customer, position, limit, window)
+    counts = {}
+    if customers or resent_customers:
+        counts = dict(db.session.query(
+            Appointment.customer_id, func.count(Appointment.id)
+        ).filter(
+            Appointment.customer_id.in_([customer.id for customer in customers + resent_customers])
+        ).group_by(Appointment.customer_id).all())
+
+    def serialize(customer):
+        data = customer.to_dict()
+        data['appointment_count'] = counts.get(customer.id, 0)
+        return data
+
+    return (
+        customers, resent_customers,
+        [serialize(customer) for customer in customers],
+        [serialize(customer) for customer in resent_customers],
+    )
+
+
+def _serialize_messages(position, limit, window):
+    messages, resent_messages = _changed_since(db.session.query(Message), Message, position, limit, window)
+    return (
+        messages, resent_messages,
+        [message.to_dict() for message in messages],
+        [message.to_dict() for message in resent_messages],
+    )
+
+
+_SERIALIZERS = {
+    'appointments': _serialize_appointments,
+    'customers': _serialize_customers,
+    'messages': _serialize_messages,
+}
+
+
+def sync_changes(positions, tombstone_id, recent=None, limit=DEFAULT_PAGE_SIZE,
+                 overlap_seconds=DEFAULT_OVERLAP_SECONDS):
+    """
+    Collect changes after the given cursor positions.
+
+    ``positions`` maps entity name to ``[updated_at, id]`` (missing means
+    "from the beginning"); ``tombstone_id`` is the last tombstone seen, or
+    ``None`` for a first sync, which needs no deletes. ``recent`` is the
+    window of the previous sync from ``decode_cursor``; rows of it the
+    client has not seen are listed under ``resent``. Returns the response
+    payload including the next cursor.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    overlap = timedelta(seconds=overlap_seconds)
+    # Rows updated from here on may still be committing behind the new positions
+    synced_at = datetime.utcnow()
+    since = synced_at - overlap
+    previous_since = None
+    if recent and recent['synced_at'] is not None:
+        previous_since = recent['synced_at'] - overlap
+
+    # Read the tombstone high-water mark before the rows, so a delete that
+    # commits in between is reported on the next sync rather than lost
+    tombstone_bounds = db.session.query(func.min(Tombstone.id), func.max(Tombstone.id)).one()
+    oldest_tombstone, latest_tombstone = tombstone_bounds
+    latest_tombstone = latest_tombstone or 0
+
+    payload = {}
+    resent = {}
+    next_positions = {}
+    next_seen = {}
+    has_more = False
+
+    for entity in SYNC_MODELS:
+        position = positions.get(entity)
+        seen = recent['seen'].get(entity, set()) if recent else set()
+        window = (previous_since, seen) if previous_since is not None else None
+        rows, resent_rows, payload[entity], resent[entity] = _SERIALIZERS[entity](position, limit, window)
+        if rows:
+            position = [rows[-1].updated_at, rows[-1].id]
+        if len(rows) == limit:
+            has_more = True
+        if position is not None:
+            next_positions[entity] = [position[0].isoformat(), position[1]]
+
+        # Remember the rows the client now holds that the next window covers
+        held = {pair for pair in seen if pair[1] >= since}
+        held.update((row.id, row.updated_at) for row in rows + resent_rows if row.updated_at >= since)
+        if held:
+            held = sorted(held, key=lambda pair: pair[1])[-MAX_SEEN_ROWS:]
+            next_seen[entity] = [[row_id, updated_at.isoformat()] for row_id, updated_at in held]
+
+    deleted = {entity: [] for entity in SYNC_MODELS}
+    full_resync = False
+    if tombstone_id is not None:
+        # Tombstones older than the client's cursor were pruned; deletes may be missing
+        full_resync = oldest_tombstone is not None and tombstone_id < oldest_tombstone - 1
+        names = {TOMBSTONE_ENTITIES[model]: entity for entity, model in SYNC_MODELS.items()}
+        for entity, entity_id in db.session.query(Tombstone.entity, Tombstone.entity_id).filter(
+            Tombstone.id > tombstone_id,
+            Tombstone.id <= latest_tombstone
+        ).order_by(Tombstone.id):
+            if entity in names:
+                deleted[names[entity]].append(entity_id)
+
+    next_positions['tombstones'] = latest_tombstone
+    next_positions['synced_at'] = synced_at.isoformat()
+    if next_seen:
+        next_positions['seen'] = next_seen
+
+    payload.update({
+        'resent': resent,
+        'deleted': deleted,
+        'cursor': encode_cursor(next_positions),
+        'has_more': has_more,
+        'full_resync': full_resync,
+        'server_time': datetime.utcnow().isoformat()
+    })
+    return payload
+
+
+def backfill_updated_at():
+    """Set ``updated_at`` on rows created before the column existed. Returns the row count."""
+    updated = 0
+    for model in SYNC_MODELS.values():
+        updated += db.session.query(model).filter(model.updated_at.is_(None)).update(
+            {model.updated_at: func.coalesce(model.created_at, datetime.utcnow())},
+            synchronize_session=False
+        )
+    db.session.commit()
+    return updated
+
+
+def record_tombstones(entity, ids):
+    """Tombstones for rows deleted outside the ORM flush (set-based deletes)."""
+    now = datetime.utcnow()
+    if ids:
+        db.session.execute(Tombstone.__table__.insert(), [
+            {'entity': entity, 'entity_id': entity_id, 'deleted_at': now} for entity_id in ids
+        ])
+
+
+def touch_customers(customer_ids):
+    """Bump ``updated_at`` of customers whose appointment count changed."""
+    customer_ids = {customer_id for customer_id in customer_ids if customer_id is not None}
+    if customer_ids:
+        db.session.execute(update(Customer).where(Customer.id.in_(customer_ids)).values(
+            updated_at=datetime.utcnow()
+        ).execution_options(synchronize_session=False))
+
+
+@event.listens_for(Session, 'after_flush')
+def _touch_appointment_customers(session, flush_context):
+    """Re-sync customers that gained, lost or swapped an appointment in this flush."""
+    customer_ids = {obj.customer_id for obj in session.new if isinstance(obj, Appointment)}
+    customer_ids.update(obj.customer_id for obj in session.deleted if isinstance(obj, Appointment))
+    for obj in session.dirty:
+        if isinstance(obj, Appointment):
+            history = inspect(obj).attrs.customer_id.history
+            customer_ids.update(history.added or ())
+            customer_ids.update(history.deleted or ())
+    customer_ids.discard(None)
+    if customer_ids:
+        session.connection().execute(update(Customer.__table__).where(
+            Customer.__table__.c.id.in_(customer_ids)
+        ).values(updated_at=datetime.utcnow()))
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_tombstones(session, flush_context):
+    """Leave a tombstone for every tracked row deleted in this flush."""
+    now = datetime.utcnow()
+    rows = [
+        {'entity': TOMBSTONE_ENTITIES[type(obj)], 'entity_id': obj.id, 'deleted_at': now}
+        for obj in session.deleted
+        if type(obj) in TOMBSTONE_ENTITIES
+    ]
+    if rows:
+        session.connection().execute(Tombstone.__table__.insert(), rows)
@@ -0,0 +1,34 @@
+"""Text normalisation helpers."""
+import re
+import unicodedata
+
+# Letters that Unicode does not decompose into a base letter plus a diacritic
+_UNDECOMPOSABLE = str.maketrans({'ł': 'l', 'Ł': 'L', 'ø': 'o', 'Ø': 'O', 'đ': 'd', 'Đ': 'D', 'ß': 'ss'})
+_WHITESPACE = re.compile(r'\s+')
+_NON_DIGITS = re.compile(r'\D+')
+
+# National numbers are nine digits; a country prefix (+48, 0048) is ignored
+PHONE_KEY_DIGITS = 9
+
+
+def fold(value):
+    """
+    Case- and diacritic-insensitive form of a string, used as a lookup key.
+
+    ``fold('  Naprawa  KRANÓW ')`` and ``fold('naprawa kranow')`` are equal.
+    """
+    if value is None:
+        return None
+    value = unicodedata.normalize('NFKD', value.translate(_UNDECOMPOSABLE))
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return _WHITESPACE.sub(' ', value).strip().casefold()
+
+
+def phone_key(value):
+    """
+    Digits-only form of a phone number, used to match customers.
+
+    ``phone_key('+48 600-100-200')`` and ``phone_key('600 100 200')`` are equal.
+    """
+    digits = _NON_DIGITS.sub('', value or '')
+    return digits[-PHONE_KEY_DIGITS:] or None
@@ -0,0 +1,132 @@
+"""
+Customer timeline: appointments and messages of one customer, newest first.
+
+Each source is read from its own ``(customer_id, timestamp, id)`` index past
+the page cursor, at most ``limit + 1`` rows, and the sorted streams are
+merged with ``heapq.merge``. A page therefore costs one short index range
+scan per source, however long the customer's history is:
+
+* appointments     ``ix_appointments_customer``, by scheduled start
+* archived ones    ``ix_appointments_archive_customer``, by scheduled start
+* messages         ``ix_messages_customer``, by arrival
+
+Entries are ordered by ``(timestamp, type, id)`` descending; the cursor is
+the key of the last entry returned, so pages never repeat or skip entries
+that share a timestamp.
+"""
+import base64
+import binascii
+import heapq
+import json
+from datetime import datetime
+
+from sqlalchemy import literal, select, tuple_
+
+from app import db
+from app.models.appointment import Appointment
+from app.models.appointment_archive import AppointmentArchive
+from app.models.message import Message
+from app.models.service import Service
+from app.utils.projection import APPOINTMENT_PROJECTION, MESSAGE_PROJECTION
+from app.utils.sync import InvalidCursor, encode_cursor
+
+TIMELINE_PAGE_SIZE = 20
+MAX_TIMELINE_PAGE_SIZE = 100
+
+APPOINTMENT_FIELDS = ('id', 'service_id', 'scheduled_date', 'scheduled_time', 'status', 'notes_preview', 'created_at')
+MESSAGE_FIELDS = MESSAGE_PROJECTION.presets['list']
+
+
+def encode_position(position):
+    """Opaque cursor for the entry key ``(timestamp, type, id)``."""
+    timestamp, kind, entry_id = position
+    return encode_cursor([timestamp.isoformat(), kind, entry_id])
+
+
+def decode_position(token):
+    """Parse a cursor produced by ``encode_position``."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        timestamp, kind, entry_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if kind not in ('appointment', 'message'):
+            raise ValueError(kind)
+        return datetime.fromisoformat(timestamp), kind, int(entry_id)
+    except (ValueError, TypeError, binascii.Error) as e:
+        raise InvalidCursor('Invalid timeline cursor') from e
+
+
+def _before(kind, key, position):
+    """
+    Filter for rows of ``kind`` whose ``key`` columns sort before ``position``.
+
+    ``key`` is the timestamp column(s) followed by the id column.
+    """
+    timestamp, position_kind, position_id = position
+    *timestamp_columns, id_column = key
+    bound = [timestamp.date(), timestamp.time()] if len(timestamp_columns) == 2 else [timestamp]
+    if kind == position_kind:
+        return tuple_(*timestamp_columns, id_column) < tuple_(*bound, position_id)
+    # The same timestamp orders by type name: 'message' > 'appointment'
+    if kind < position_kind:
+        return tuple_(*timestamp_columns) <= tuple_(*bound)
+    return tuple_(*timestamp_columns) < tuple_(*bound)
+
+
+def _appointments(model, customer_id, position, limit):
+    key = (model.scheduled_date, model.scheduled_time, model.id)
+    query = select(
+        *APPOINTMENT_PROJECTION.columns(model, APPOINTMENT_FIELDS),
+        Service.name.label('service_name'),
+        literal(model is AppointmentArchive).label('archived')
+    ).outerjoin(
+        Service, Service.id == model.service_id
+    ).where(model.customer_id == customer_id)
+    if position is not None:
+        query = query.where(_before('appointment', key, position))
+    rows = db.session.execute(query.order_by(*(column.desc() for column in key)).limit(limit))
+
+    for row in rows:
+        data = APPOINTMENT_PROJECTION.dump(row, APPOINTMENT_FIELDS)
+        data['service_name'] = row.service_name
+        data['archived'] = bool(row.archived)
+        timestamp = datetime.combine(row.scheduled_date, row.scheduled_time)
+        yield (timestamp, 'appointment', row.id), data
+
+
+def _messages(customer_id, position, limit):
+    key = (Message.created_at, Message.id)
+    query = select(*MESSAGE_PROJECTION.columns(Message, MESSAGE_FIELDS)).where(Message.customer_id == customer_id)
+    if position is not None:
+        query = query.where(_before('message', key, position))
+    rows = db.session.execute(query.order_by(*(column.desc() for column in key)).limit(limit))
+
+    for row in rows:
+        yield (row.created_at, 'message', row.id), MESSAGE_PROJECTION.dump(row, MESSAGE_FIELDS)
+
+
+def customer_timeline(customer_id, cursor=None, limit=TIMELINE_PAGE_SIZE):
+    """
+    One page of the customer's timeline.
+
+    Returns ``(entries, next_cursor)``; ``next_cursor`` is ``None`` on the
+    last page. Raises ``InvalidCursor`` for a malformed cursor.
+    """
+    limit = max(1, min(limit, MAX_TIMELINE_PAGE_SIZE))
+    position = decode_position(cursor) if cursor else None
+
+    streams = [
+        _appointments(Appointment, customer_id, position, limit + 1),
+        _appointments(AppointmentArchive, customer_id, position, limit + 1),
+        _messages(customer_id, position, limit + 1),
+    ]
+    merged = heapq.merge(*streams, key=lambda entry: entry[0], reverse=True)
+
+    entries = []
+    last_key = None
+    for key, data in merged:
+        if len(entries) == limit:
+            return entries, encode_position(last_key)
+        timestamp, kind, _ = key
+        entries.append({'type': kind, 'timestamp': timestamp.isoformat(), kind: data})
+        last_key = key
+    return entries, None
@@ -0,0 +1,366 @@
+"""
+Declarative validation of JSON request bodies.
+
+Each endpoint declares a ``Schema`` at import time: a mapping of field names
+to field types that check and coerce one value each (``Date`` returns a
+``date``, ``Phone`` a normalized string, ...). Regular expressions and field
+lists are compiled once, so validating a request is a single pass over the
+declared fields.
+
+    BOOKING_SCHEMA = Schema({
+        'email': Email(required=True),
+        'date': Date(required=True),
+    }, missing_message='Brakujące wymagane pola: {fields}')
+
+    @bp.route('/book', methods=['POST'])
+    @validate_json(BOOKING_SCHEMA)
+    def book():
+        data = request.validated
+
+Invalid requests are answered with ``400`` and a payload of the same shape
+everywhere::
+
+    {"success": false, "error": "<message>", "fields": {"<name>": "<code>"}}
+"""
+import re
+from datetime import date, datetime, time, timezone
+from decimal import Decimal, InvalidOperation
+from functools import wraps
+
+from flask import jsonify, request
+
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+PHONE_PATTERN = re.compile(r'^\+?[0-9()./\- ]{3,20}$')
+TIME_PATTERN = re.compile(r'^([01]?[0-9]|2[0-3]):([0-5][0-9])(?::([0-5][0-9]))?$')
+_WHITESPACE = re.compile(r'\s+')
+
+_MISSING = object()
+
+
+class ValidationError(ValueError):
+    """A request body that does not match its schema."""
+
+    def __init__(self, message, fields=None):
+        super().__init__(message)
+        self.message = message
+        self.fields = fields or {}
+
+    def to_dict(self):
+        return {'success': False, 'error': self.message, 'fields': self.fields}
+
+
+class FieldError(ValueError):
+    """Rejection of a single value, with a short code (``'too_long'``, ...)."""
+
+    def __init__(self, code='invalid'):
+        super().__init__(code)
+        self.code = code
+
+
+class Field:
+    """
+    Base field. ``coerce`` returns the parsed value or raises ``FieldError``;
+    ``TypeError``/``ValueError`` from parsing count as ``'invalid'``.
+    """
+
+    def __init__(self, required=False, default=_MISSING, nullable=True, error=None):
+        self.required = required
+        self.default = default
+        self.nullable = nullable
+        self.error = error
+
+    def blank(self, value):
+        """Value stored for ``None`` or an empty string in an optional field."""
+        return None
+
+    def coerce(self, value):
+        return value
+
+
+class String(Field):
+    def __init__(self, max_length=None, strip=True, **kwargs):
+        super().__init__(**kwargs)
+        self.max_length = max_length
+        self.strip = strip
+
+    def blank(self, value):
+        return None if value is None else ''
+
+    def coerce(self, value):
+        if not isinstance(value, str):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise FieldError('invalid')
+            value = str(value)
+        if self.strip:
+            value = value.strip()
+        if self.max_length and len(value) > self.max_length:
+            raise FieldError('too_long')
+        return value
+
+
+class Email(String):
+    blank = Field.blank
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('max_length', 120)
+        super().__init__(**kwargs)
+
+    def coerce(self, value):
+        value = super().coerce(value)
+        if not EMAIL_PATTERN.match(value):
+            raise FieldError('invalid')
+        return value
+
+
+class Phone(String):
+    """Digits with the usual separators; whitespace is collapsed."""
+
+    blank = Field.blank
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('max_length', 20)
+        super().__init__(**kwargs)
+
+    def coerce(self, value):
+        value = _WHITESPACE.sub(' ', super().coerce(value))
+        if not PHONE_PATTERN.match(value):
+            raise FieldError('invalid')
+        return value
+
+
+class Date(Field):
+    """``YYYY-MM-DD``; with ``iso`` a full ISO datetime is accepted too."""
+
+    def __init__(self, iso=False, **kwargs):
+        super().__init__(**kwargs)
+        self.iso = iso
+
+    def coerce(self, value):
+        if not isinstance(value, str):
+            raise FieldError('invalid')
+        if self.iso and len(value) > 10:
+            return datetime.fromisoformat(value).date()
+        if len(value) != 10:
+            raise FieldError('invalid')
+        return date.fromisoformat(value)
+
+
+class Time(Field):
+    """``H:MM`` or ``HH:MM[:SS]``; with ``iso`` a full ISO datetime is accepted too."""
+
+    def __init__(self, iso=False, **kwargs):
+        super().__init__(**kwargs)
+        self.iso = iso
+
+    def coerce(self, value):
+        if not isinstance(value, str):
+            raise FieldError('invalid')
+        match = TIME_PATTERN.match(value)
+        if match:
+            hour, minute, second = match.groups()
+            if second and not self.iso:
+                raise FieldError('invalid')
+            return time(int(hour), int(minute), int(second or 0))
+        if self.iso:
+            return datetime.fromisoformat(value).time()
+        raise FieldError('invalid')
+
+
+class DateTime(Field):
+    """ISO ``YYYY-MM-DD[ HH:MM[:SS]]``; aware values are converted to naive UTC."""
+
+    def coerce(self, value):
+        if not isinstance(value, str):
+            raise FieldError('invalid')
+        value = datetime.fromisoformat(value.strip())
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+
+class Integer(Field):
+    def __init__(self, min_value=None, max_value=None, **kwargs):
+        super().__init__(**kwargs)
+        self.min_value = min_value
+        self.max_value = max_value
+
+    def coerce(self, value):
+        if isinstance(value, bool):
+            raise FieldError('invalid')
+        if isinstance(value, float) and not value.is_integer():
+            raise FieldError('invalid')
+        value = int(value)
+        if self.min_value is not None and value < self.min_value:
+            raise FieldError('too_small')
+        if self.max_value is not None and value > self.max_value:
+            raise FieldError('too_large')
+        return value
+
+
+class Number(Field):
+    """Decimal number, e.g. a price."""
+
+    def __init__(self, min_value=None, **kwargs):
+        super().__init__(**kwargs)
+        self.min_value = min_value
+
+    def coerce(self, value):
+        if isinstance(value, bool):
+            raise FieldError('invalid')
+        try:
+            value = Decimal(str(value))
+        except InvalidOperation:
+            raise FieldError('invalid')
+        if not value.is_finite():
+            raise FieldError('invalid')
+        if self.min_value is not None and value < self.min_value:
+            raise FieldError('too_small')
+        return value
+
+
+class Boolean(Field):
+    TRUE = frozenset(('true', '1', 'yes'))
+    FALSE = frozenset(('false', '0', 'no'))
+
+    def coerce(self, value):
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, int) and value in (0, 1):
+            return bool(value)
+        if isinstance(value, str):
+            lowered = value.strip().lower()
+            if lowered in self.TRUE:
+                return True
+            if lowered in self.FALSE:
+                return False
+        raise FieldError('invalid')
+
+
+class Choice(String):
+    blank = Field.blank
+
+    def __init__(self, choices, **kwargs):
+        super().__init__(**kwargs)
+        self.choices = frozenset(choices)
+
+    def coerce(self, value):
+        value = super().coerce(value)
+        if value not in self.choices:
+            raise FieldError('invalid_choice')
+        return value
+
+
+class List(Field):
+    """A JSON array whose items are checked by ``item``."""
+
+    def __init__(self, item, min_items=0, max_items=None, **kwargs):
+        super().__init__(**kwargs)
+        self.item = item
+        self.min_items = min_items
+        self.max_items = max_items
+
+    def coerce(self, value):
+        if not isinstance(value, list):
+            raise FieldError('invalid')
+        if len(value) < self.min_items:
+            raise FieldError('too_short')
+        if self.max_items is not None and len(value) > self.max_items:
+            raise FieldError('too_long')
+        return [self.item.coerce(item) for item in value]
+
+
+class Nested(Field):
+    """A JSON object checked by another ``Schema``."""
+
+    def __init__(self, schema, **kwargs):
+        super().__init__(**kwargs)
+        self.schema = schema
+
+    def coerce(self, value):
+        if not isinstance(value, dict):
+            raise FieldError('invalid')
+        try:
+            return self.schema.load(value)
+        except ValidationError:
+            raise FieldError('invalid')
+
+
+class Schema:
+    """
+    A compiled set of fields.
+
+    ``load`` returns a dict with the coerced values of the fields present in
+    the body (plus declared defaults); undeclared keys are dropped. Blank
+    optional values become ``None`` (``''`` for plain strings) unless the
+    field is declared ``nullable=False``.
+    """
+
+    def __init__(self, fields, missing_message='Missing required fields: {fields}',
+                 invalid_message='Invalid value for {field}', body_message='Invalid JSON body'):
+        self.fields = dict(fields)
+        self._fields = tuple(self.fields.items())
+        self._required = tuple(name for name, field in self._fields if field.required)
+        self.missing_message = missing_message
+        self.invalid_message = invalid_message
+        self.body_message = body_message
+
+    def load(self, data):
+        if not isinstance(data, dict):
+            raise ValidationError(self.body_message, {'_body': 'invalid'})
+
+        missing = [name for name in self._required if _is_blank(data.get(name))]
+        if missing:
+            raise ValidationError(
+                self.missing_message.format(fields=', '.join(missing)),
+                {name: 'required' for name in missing}
+            )
+
+        result = {}
+        errors = {}
+        message = None
+        for name, field in self._fields:
+            value = data.get(name, _MISSING)
+            if value is _MISSING:
+                if field.default is not _MISSING:
+                    result[name] = field.default
+                continue
+            if _is_blank(value):
+                value = field.blank(value)
+                if value is None and not field.nullable:
+                    errors[name] = 'null'
+                    message = message or field.error or self.invalid_message.format(field=name)
+                    continue
+                result[name] = value
+                continue
+            try:
+                result[name] = field.coerce(value)
+            except (TypeError, ValueError) as e:
+                errors[name] = e.code if isinstance(e, FieldError) else 'invalid'
+                if message is None:
+                    message = field.error or self.invalid_message.format(field=name)
+
+        if errors:
+            raise ValidationError(message, errors)
+        return result
+
+
+def _is_blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def validate_json(schema):
+    """
+    Decorator validating the JSON body against ``schema``.
+
+    The coerced values are available as ``request.validated``.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            try:
+                request.validated = schema.load(request.get_json(silent=True))
+            except ValidationError as e:
+                return jsonify(e.to_dict()), 400
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
@@ -379,9 +379,10 @@ export default function BookingCalendar({ onBookingComplete }: BookingCalendarPr
                 </div>
 
                 <div>
-                  <label className="block text-sm font-bold text-gray-700 dark:text-gray-300 mb-2">E-mail</label>
+                  <label className="block text-sm font-bold text-gray-700 dark:text-gray-300 mb-2">E-mail *</label>
                   <input
                     type="email"
+                    required
                     value={formData.email}
                     onChange={(e) => setFormData({ ...formData, email: e.target.value })}
                     className="w-full px-4 py-3 border border-gray-300 dark:border-gray-600 rounded-lg focus:ring-2 focus:ring-green-500 focus:border-transparent bg-white dark:bg-gray-700 text-gray-900 dark:text-white"
@@ -1,21 +1,19 @@
 """
 Email Configuration Module - Updated for reliable delivery
-Handles email sending with multiple fallback methods
+Sends contact, booking and reminder emails through Flask-Mail
 """
 
 import os
 import logging
 import json
 from datetime import datetime
-from typing import Dict, Any, Optional
-from dotenv import load_dotenv
+from typing import Dict
 from flask import Flask, current_app
-from flask_mail import Mail, Message
 
-# Load environment variables from .env file
-load_dotenv()
+# The .env file is loaded by config.settings
 
-mail = Mail()
+# Flask-Mail is imported on the first send, not at startup (see _mail)
+mail = None
 
 # Setup logging for email notifications
 logging.basicConfig(level=logging.INFO)
@@ -69,305 +67,6 @@ def log_email_to_file(email_type: str, recipient: str, subject: str, content: st
         logger.error(f"Failed to log email: {str(e)}")
         return False
 
-def init_email(app: Flask):
-    """Initialize email configuration with Flask-Mail"""
-    app.config['MAIL_SERVER'] = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
-    app.config['MAIL_PORT'] = int(os.environ.get('SMTP_PORT', 587))
-    app.config['MAIL_USE_TLS'] = True
-    app.config['MAIL_USE_SSL'] = False
-    app.config['MAIL_USERNAME'] = os.environ.get('SMTP_USER', 'apikey')
-    app.config['MAIL_PASSWORD'] = os.environ.get('SMTP_PASS')
-    app.config['MAIL_DEFAULT_SENDER'] = (
-        os.environ.get('SMTP_FROM_NAME', 'SanBud'),
-        os.environ.get('SMTP_FROM_EMAIL', 'noreply@sanbud.pl')
-    )
-    
-    mail.init_app(app)
-    logger.info(f"✅ Email initialized: {app.config['MAIL_SERVER']}:{app.config['MAIL_PORT']}")
-
-def send_formsubmit_email(name: str, email: str, phone: str, message: str) -> bool:
-    """Send real email using FormSubmit.co service"""
-    import requests
-    
-    url = "https://formsubmit.co/hubertkozuchowski@gmail.com"
-    
-    form_data = {
-        '_subject': f'🔧 SanBud - Nowa wiadomość od {name}',
-        '_captcha': 'false',
-        '_template': 'box',
-        'name': name,
-        'email': email,
-        'phone': phone,
-        'message': f'''
-        Nowa wiadomość z formularza kontaktowego SanBud:
-        
-        👤 Imię i nazwisko: {name}
-        📧 Email: {email}
-        📱 Telefon: {phone}
-        
-        💬 Wiadomość:
-        {message}
-        
-        ⏰ Data wysłania: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-        
-        --
-        Wysłane z formularza kontaktowego SanBud
-        '''
-    }
-    
-    try:
-        response = requests.post(url, data=form_data, timeout=10)
-        if response.status_code == 200:
-            logger.info(f"✅ Email sent successfully via FormSubmit to {email}")
-            return True
-        else:
-            logger.error(f"❌ FormSubmit failed: {response.status_code}")
-            return False
-    except Exception as e:
-        logger.error(f"❌ FormSubmit error: {str(e)}")
-        return False
-
-def send_contact_email(name: str, email: str, phone: str, message: str) -> bool:
-    """Send contact form email with real delivery + logging fallback"""
-    
-    subject = f"Nowa wiadomość z formularza kontaktowego - SanBud"
-    contact_email = os.environ.get('CONTACT_EMAIL', 'kontakt@sanbud.pl')
-    
-    # Try real email delivery first
-    email_sent = send_formsubmit_email(name, email, phone, message)
-    
-    if email_sent:
-        print(f"🎉 Real email sent successfully to {contact_email}")
-        # Still log for backup
-        log_email_to_file("contact_form", contact_email, subject, f"Real email sent via FormSubmit", {
-            "name": name, "email": email, "phone": phone, "message": message
-        })
-        return True
-    
-    # Fallback to logging if real email fails
-    print(f"⚠️ Real email failed, using logging fallback")
-    
-    # Format message for HTML (replace newlines with <br>)
-    formatted_message = message.replace('\n', '<br>')
-    
-    # Get current time
-    current_time = datetime.now().strftime('%d.%m.%Y %H:%M')
-    
-    # Create email content
-    html_content = f"""
-    <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-        <div style="background: linear-gradient(135deg, #16a34a 0%, #f97316 100%); padding: 20px; text-align: center; border-radius: 10px 10px 0 0;">
-            <h1 style="color: white; margin: 0;">🔧 SanBud</h1>
-            <p style="color: white; margin: 5px 0 0 0;">Nowa wiadomość z formularza</p>
-        </div>
-        
-        <div style="background: #f8f9fa; padding: 30px; border-radius: 0 0 10px 10px;">
-            <h2 style="color: #16a34a; margin-top: 0;">📞 Szczegóły kontaktu:</h2>
-            
-            <p><strong>👤 Imię:</strong> {name}</p>
-            <p><strong>📧 Email:</strong> {email}</p>
-            <p><strong>📱 Telefon:</strong> {phone}</p>
-            
-            <h3 style="color: #f97316; margin-top: 25px;">💬 Wiadomość:</h3>
-            <div style="background: white; padding: 15px; border-radius: 8px; border-left: 4px solid #16a34a;">
-                {formatted_message}
-            </div>
-            
-            <p style="margin-top: 25px; color: #666; font-size: 14px;">
-                <strong>🕐 Data:</strong> {current_time}<br>
-                <strong>🌐 Źródło:</strong> sanbud.pl
-            </p>
-        </div>
-    </div>
-    """
-    
-    # Data for logging
-    contact_data = {
-        'name': name,
-        'email': email,
-        'phone': phone,
-        'message': message
-    }
-    
-    # Always log to file first (reliable method)
-    log_success = log_email_to_file(
-        email_type='contact_form',
-        recipient=contact_email,
-        subject=subject,
-        content=html_content,
-        data=contact_data
-    )
-    
-    # Try to send email if configured
-    smtp_success = False
-    if mail and os.environ.get('SMTP_PASS'):
-        try:
-            msg = Message(
-                subject=subject,
-                recipients=[contact_email],
-                html=html_content,
-                sender=current_app.config['MAIL_DEFAULT_SENDER']
-            )
-            mail.send(msg)
-            logger.info(f"✅ Contact email sent successfully to {contact_email}")
-            smtp_success = True
-        except Exception as e:
-            logger.error(f"❌ Failed to send contact email: {str(e)}")
-    
-    if not smtp_success:
-        logger.info("📧 Email SMTP failed or not configured, notification logged to file")
-    
-    # Return success if either SMTP worked OR logging worked
-    return smtp_success or log_success
-
-def send_booking_confirmation(booking_data: Dict[str, Any]) -> bool:
-    """Send booking confirmation with logging fallback"""
-    
-    customer_email = booking_data.get('email')
-    booking_email = os.environ.get('BOOKING_EMAIL', 'rezerwacje@sanbud.pl')
-    
-    # Customer confirmation
-    customer_subject = f"Potwierdzenie rezerwacji - SanBud ({booking_data.get('date', 'N/A')})"
-    customer_html = f"""
-    <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-        <div style="background: linear-gradient(135deg, #16a34a 0%, #f97316 100%); padding: 30px; text-align: center; border-radius: 10px 10px 0 0;">
-            <h1 style="color: white; margin: 0; font-size: 28px;">🔧 SanBud</h1>
-            <p style="color: white; margin: 10px 0 0 0; font-size: 16px;">Profesjonalne usługi hydrauliczne</p>
-        </div>
-        
-        <div style="background: #f8f9fa; padding: 40px; border-radius: 0 0 10px 10px;">
-            <h2 style="color: #16a34a; margin-top: 0;">✅ Potwierdzenie rezerwacji</h2>
-            
-            <p style="font-size: 16px;">Dzień dobry <strong>{booking_data.get('name', 'N/A')}</strong>!</p>
-            <p>Dziękujemy za wybranie naszych usług. Potwierdzamy Państwa rezerwację:</p>
-            
-            <div style="background: white; padding: 25px; border-radius: 8px; border-left: 4px solid #f97316; margin: 20px 0;">
-                <h3 style="color: #f97316; margin-top: 0;">📅 Szczegóły wizyty:</h3>
-                <p><strong>🗓️ Data:</strong> {booking_data.get('date', 'N/A')}</p>
-                <p><strong>🕐 Godzina:</strong> {booking_data.get('time', 'N/A')}</p>
-                <p><strong>🏠 Adres:</strong> {booking_data.get('address', 'N/A')}</p>
-                <p><strong>🔧 Usługa:</strong> {booking_data.get('service', 'N/A')}</p>
-            </div>
-            
-            <div style="background: #e6f7ed; padding: 20px; border-radius: 8px; border-left: 4px solid #16a34a; margin: 20px 0;">
-                <h4 style="color: #16a34a; margin-top: 0;">💡 Ważne informacje:</h4>
-                <ul style="margin: 0; padding-left: 20px; color: #333;">
-                    <li>Skontaktujemy się z Państwem 24h przed wizytą</li>
-                    <li>W przypadku pytań: <strong>+48 123 456 789</strong></li>
-                    <li>Email: <strong>kontakt@sanbud.pl</strong></li>
-                </ul>
-            </div>
-            
-            <p style="margin-top: 30px; color: #666; font-size: 14px; text-align: center;">
-                Numer rezerwacji: <strong>SB-{datetime.now().strftime('%Y%m%d')}-{booking_data.get('id', '001')}</strong><br>
-                Data złożenia: {datetime.now().strftime('%d.%m.%Y %H:%M')}
-            </p>
-        </div>
-    </div>
-    """
-    
-    # Admin notification
-    admin_subject = f"Nowa rezerwacja - {booking_data.get('date', 'N/A')} {booking_data.get('time', 'N/A')}"
-    admin_html = f"""
-    <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-        <div style="background: linear-gradient(135deg, #dc2626 0%, #f97316 100%); padding: 20px; text-align: center; border-radius: 10px 10px 0 0;">
-            <h1 style="color: white; margin: 0;">⚡ NOWA REZERWACJA</h1>
-            <p style="color: white; margin: 5px 0 0 0;">Wymagana szybka reakcja!</p>
-        </div>
-        
-        <div style="background: #f8f9fa; padding: 30px; border-radius: 0 0 10px 10px;">
-            <h2 style="color: #dc2626; margin-top: 0;">📅 Szczegóły rezerwacji:</h2>
-            
-            <div style="display: grid; gap: 15px;">
-                <div style="background: white; padding: 15px; border-radius: 8px; border-left: 4px solid #16a34a;">
-                    <h4 style="margin-top: 0; color: #16a34a;">👤 Dane klienta:</h4>
-                    <p><strong>Imię:</strong> {booking_data.get('name', 'N/A')}</p>
-                    <p><strong>Email:</strong> {booking_data.get('email', 'N/A')}</p>
-                    <p><strong>Telefon:</strong> {booking_data.get('phone', 'N/A')}</p>
-                </div>
-                
-                <div style="background: white; padding: 15px; border-radius: 8px; border-left: 4px solid #f97316;">
-                    <h4 style="margin-top: 0; color: #f97316;">📅 Termin i lokalizacja:</h4>
-                    <p><strong>Data:</strong> {booking_data.get('date', 'N/A')}</p>
-                    <p><strong>Godzina:</strong> {booking_data.get('time', 'N/A')}</p>
-                    <p><strong>Adres:</strong> {booking_data.get('address', 'N/A')}</p>
-                </div>
-                
-                <div style="background: white; padding: 15px; border-radius: 8px; border-left: 4px solid #dc2626;">
-                    <h4 style="margin-top: 0; color: #dc2626;">🔧 Opis zlecenia:</h4>
-                    <p><strong>Usługa:</strong> {booking_data.get('service', 'N/A')}</p>
-                    <p><strong>Opis:</strong> {booking_data.get('description', 'Brak opisu')}</p>
-                </div>
-            </div>
-            
-            <div style="background: #fef3c7; padding: 20px; border-radius: 8px; margin-top: 20px; border-left: 4px solid #f59e0b;">
-                <h4 style="margin-top: 0; color: #92400e;">⚡ Akcje do wykonania:</h4>
-                <ol style="margin: 0; color: #92400e;">
-                    <li>Skontaktuj się z klientem w ciągu 2h</li>
-                    <li>Potwierdź dostępność terminu</li>
-                    <li>Wyślij SMS przypomnienie 24h przed</li>
-                </ol>
-            </div>
-            
-            <p style="margin-top: 25px; color: #666; font-size: 14px; text-align: center;">
-                ID rezerwacji: <strong>SB-{datetime.now().strftime('%Y%m%d')}-{booking_data.get('id', '001')}</strong><br>
-                Złożono: {datetime.now().strftime('%d.%m.%Y %H:%M')} | Źródło: sanbud.pl
-            </p>
-        </div>
-    </div>
-    """
-    
-    # Log both emails
-    customer_logged = log_email_to_file(
-        email_type='booking_customer_confirmation',
-        recipient=customer_email,
-        subject=customer_subject,
-        content=customer_html,
-        data=booking_data
-    )
-    
-    admin_logged = log_email_to_file(
-        email_type='booking_admin_notification',
-        recipient=booking_email,
-        subject=admin_subject,
-        content=admin_html,
-        data=booking_data
-    )
-    
-    # Try to send emails if configured
-    email_sent = False
-    if mail and os.environ.get('SMTP_PASS'):
-        try:
-            # Send customer confirmation
-            customer_msg = Message(
-                subject=customer_subject,
-                recipients=[customer_email],
-                html=customer_html,
-                sender=current_app.config['MAIL_DEFAULT_SENDER']
-            )
-            
-            # Send admin notification
-            admin_msg = Message(
-                subject=admin_subject,
-                recipients=[booking_email],
-                html=admin_html,
-                sender=current_app.config['MAIL_DEFAULT_SENDER']
-            )
-            
-            mail.send(customer_msg)
-            mail.send(admin_msg)
-            
-            logger.info(f"✅ Booking emails sent successfully")
-            email_sent = True
-            
-        except Exception as e:
-            logger.error(f"❌ Failed to send booking emails: {str(e)}")
-    
-    if not email_sent:
-        logger.info("📧 Email not configured, booking notifications logged to file")
-    
-    return customer_logged and admin_logged
-
 def init_email(app: Flask):
     """Initialize email configuration with Flask-Mail"""
     app.config['MAIL_SERVER'] = os.environ.get('SMTP_HOST', 'smtp.sendgrid.net')
@@ -383,8 +82,18 @@ def init_email(app: Flask):
     app.config['MAIL_MAX_EMAILS'] = None
     app.config['MAIL_ASCII_ATTACHMENTS'] = False
     
-    mail.init_app(app)
     print(f"✅ Email initialized: {app.config['MAIL_SERVER']}:{app.config['MAIL_PORT']}")
+
+
+def _mail():
+    """Flask-Mail for the current app, set up on first use (before any Message is built)"""
+    global mail
+    from flask_mail import Mail
+    
+    if mail is None:
+        mail = Mail()
+    if 'mail' not in current_app.extensions:
+        mail.init_app(current_app._get_current_object())
     return mail
 
 
@@ -401,6 +110,9 @@ def send_contact_email(name, email, phone, message):
     Returns:
         bool: True if email sent successfully, False otherwise
     """
+    mail = _mail()
+    from flask_mail import Message
+    
     contact_email = os.environ.get('CONTACT_EMAIL', 'kontakt@sanbud.pl')
     
     msg = Message(
@@ -540,6 +252,9 @@ def send_booking_confirmation(booking_data):
         bool: True if emails sent successfully, False otherwise
     """
     
+    mail = _mail()
+    from flask_mail import Message
+    
     # Format date for display
     from datetime import datetime
     try:
@@ -837,3 +552,137 @@ def send_booking_confirmation(booking_data):
     except Exception as e:
         print(f"❌ Error sending booking confirmation: {e}")
         return False
+
+
+def _build_reminder_message(reminder_data):
+    """Build the customer reminder email for one appointment (after _mail())."""
+    from datetime import datetime
+    from flask_mail import Message
+    try:
+        date_obj = datetime.strptime(reminder_data['date'], '%Y-%m-%d')
+        formatted_date = date_obj.strftime('%d.%m.%Y')
+    except (KeyError, ValueError):
+        formatted_date = reminder_data.get('date', '')
+    
+    msg = Message(
+        subject=f'⏰ Przypomnienie o wizycie - {formatted_date} o {reminder_data["time"]}',
+        recipients=[reminder_data['email']]
+    )
+    
+    msg.html = f"""
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+</head>
+<body style="margin: 0; padding: 0; font-family: 'Segoe UI', Arial, sans-serif; background-color: #f3f4f6;">
+    <div style="max-width: 600px; margin: 0 auto; background-color: #ffffff;">
+        <!-- Header -->
+        <div style="background: linear-gradient(135deg, #16a34a 0%, #f97316 100%); padding: 30px 20px; text-align: center;">
+            <div style="font-size: 40px; margin-bottom: 10px;">⏰</div>
+            <h1 style="color: #ffffff; margin: 0; font-size: 24px; font-weight: bold;">
+                Przypomnienie o wizycie
+            </h1>
+        </div>
+        
+        <!-- Content -->
+        <div style="padding: 30px 20px;">
+            <p style="color: #1f2937; font-size: 16px; margin: 0 0 20px 0;">
+                Dzień dobry <strong>{reminder_data['name']}</strong>,
+            </p>
+            
+            <p style="color: #4b5563; font-size: 15px; line-height: 1.6; margin: 0 0 25px 0;">
+                Przypominamy o jutrzejszej wizycie naszego specjalisty.
+            </p>
+            
+            <div style="background: linear-gradient(135deg, #ecfdf5 0%, #fef3c7 100%); padding: 25px; border-radius: 12px; margin: 25px 0; border: 2px solid #16a34a;">
+                <table style="width: 100%; border-collapse: collapse;">
+                    <tr>
+                        <td style="padding: 10px 0; font-size: 15px;"><strong style="color: #1f2937;">📅 Data:</strong></td>
+                        <td style="padding: 10px 0; text-align: right; font-size: 16px; color: #16a34a; font-weight: bold;">{formatted_date}</td>
+                    </tr>
+                    <tr style="border-top: 1px solid #d1fae5;">
+                        <td style="padding: 10px 0; font-size: 15px;"><strong style="color: #1f2937;">🕐 Godzina:</strong></td>
+                        <td style="padding: 10px 0; text-align: right; font-size: 16px; color: #f97316; font-weight: bold;">{reminder_data['time']}</td>
+                    </tr>
+                    <tr style="border-top: 1px solid #d1fae5;">
+                        <td style="padding: 10px 0; font-size: 15px;"><strong style="color: #1f2937;">🔧 Usługa:</strong></td>
+                        <td style="padding: 10px 0; text-align: right; font-size: 15px; color: #1f2937;">{reminder_data['service']}</td>
+                    </tr>
+                    {f'''
+                    <tr style="border-top: 1px solid #d1fae5;">
+                        <td style="padding: 10px 0; font-size: 15px;"><strong style="color: #1f2937;">📍 Adres:</strong></td>
+                        <td style="padding: 10px 0; text-align: right; font-size: 15px; color: #1f2937;">{reminder_data['address']}</td>
+                    </tr>
+                    ''' if reminder_data.get('address') else ''}
+                </table>
+            </div>
+            
+            <p style="color: #92400e; background: #fef3c7; border: 2px solid #fbbf24; padding: 15px; border-radius: 8px; font-size: 14px; line-height: 1.6;">
+                Jeśli termin nie jest już aktualny, prosimy o pilny kontakt telefoniczny.
+            </p>
+        </div>
+        
+        <!-- Footer -->
+        <div style="padding: 25px 20px; background-color: #1f2937; text-align: center;">
+            <h3 style="color: #ffffff; margin: 0 0 10px 0; font-size: 18px;">
+                SanBud - Profesjonalne Usługi Hydrauliczne
+            </h3>
+            <p style="margin: 5px 0; color: #9ca3af; font-size: 14px;">
+                📞 Telefon: <a href="tel:+48123456789" style="color: #16a34a; text-decoration: none;">+48 123 456 789</a>
+            </p>
+        </div>
+    </div>
+</body>
+</html>
+    """
+    return msg
+
+
+def send_appointment_reminder(reminder_data):
+    """
+    Send a 24h reminder email to the customer
+    
+    Args:
+        reminder_data (dict): Dictionary containing reminder information
+            - name: Customer name
+            - email: Customer email
+            - date: Appointment date (YYYY-MM-DD)
+            - time: Appointment time (HH:MM)
+            - service: Service name
+            - address: Visit address (optional)
+            
+    Returns:
+        bool: True if email sent successfully, False otherwise
+    """
+    return send_appointment_reminders([reminder_data])[0]
+
+
+def send_appointment_reminders(reminders):
+    """
+    Send a batch of reminder emails over a single SMTP connection
+    
+    Args:
+        reminders (list): List of reminder_data dictionaries (see send_appointment_reminder)
+        
+    Returns:
+        list: One bool per reminder, True if that email was sent
+    """
+    results = []
+    try:
+        mail = _mail()
+        with mail.connect() as connection:
+            for reminder_data in reminders:
+                try:
+                    connection.send(_build_reminder_message(reminder_data))
+                    print(f"✅ Appointment reminder sent to: {reminder_data['email']}")
+                    results.append(True)
+                except Exception as e:
+                    print(f"❌ Error sending appointment reminder to {reminder_data.get('email')}: {e}")
+                    results.append(False)
+    except Exception as e:
+        print(f"❌ Error connecting to mail server for reminders: {e}")
+    
+    # Reminders not attempted because the connection failed count as failed
+    return results + [False] * (len(reminders) - len(results))
@@ -14,6 +14,74 @@ class Config:
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', os.environ.get('SECRET_KEY', 'jwt-secret-key-change-in-production'))
     JWT_ACCESS_TOKEN_EXPIRES = int(os.environ.get('JWT_ACCESS_TOKEN_EXPIRES', 86400))  # 24 hours in seconds
     
+    # How long responses stored for an Idempotency-Key are replayed
+    IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 86400))  # 24 hours in seconds
+    IDEMPOTENCY_INFLIGHT_TIMEOUT_SECONDS = int(os.environ.get('IDEMPOTENCY_INFLIGHT_TIMEOUT_SECONDS', 300))  # Unfinished keys older than this were abandoned
+    
+    # Booking grid: first and last bookable start time, slot step in minutes
+    BOOKING_DAY_START = os.environ.get('BOOKING_DAY_START', '07:00')
+    BOOKING_DAY_END = os.environ.get('BOOKING_DAY_END', '18:00')
+    BOOKING_SLOT_MINUTES = int(os.environ.get('BOOKING_SLOT_MINUTES', 30))
+    
+    # Public bookings for names that match no service or alias are filed under this service
+    BOOKING_FALLBACK_SERVICE = os.environ.get('BOOKING_FALLBACK_SERVICE', 'Inna usługa')
+    SERVICE_CATALOG_TTL_SECONDS = int(os.environ.get('SERVICE_CATALOG_TTL_SECONDS', 300))
+    
+    # Admin live updates (server-sent events)
+    EVENTS_POLL_SECONDS = float(os.environ.get('EVENTS_POLL_SECONDS', 1))  # Used when LISTEN/NOTIFY is unavailable
+    EVENTS_HEARTBEAT_SECONDS = int(os.environ.get('EVENTS_HEARTBEAT_SECONDS', 15))
+    EVENTS_STREAM_MAX_SECONDS = int(os.environ.get('EVENTS_STREAM_MAX_SECONDS', 300))
+    EVENTS_RETRY_MS = int(os.environ.get('EVENTS_RETRY_MS', 3000))
+    EVENTS_RETENTION_DAYS = int(os.environ.get('EVENTS_RETENTION_DAYS', 7))
+    EVENTS_GAP_SECONDS = int(os.environ.get('EVENTS_GAP_SECONDS', 60))  # Wait this long for late commits of skipped ids
+    SYNC_OVERLAP_SECONDS = int(os.environ.get('SYNC_OVERLAP_SECONDS', 60))  # /admin/api/sync re-reads this window behind the cursor
+    
+    # ICS calendar feed window, relative to today
+    CALENDAR_FEED_PAST_DAYS = int(os.environ.get('CALENDAR_FEED_PAST_DAYS', 7))
+    CALENDAR_FEED_DAYS = int(os.environ.get('CALENDAR_FEED_DAYS', 90))
+    
+    # Admin analytics results are cached per date range
+    ANALYTICS_CACHE_SECONDS = int(os.environ.get('ANALYTICS_CACHE_SECONDS', 600))
+    
+    # Cache shared by the workers of one host (in-process LRU over a SQLite file)
+    CACHE_ENABLED = os.environ.get('CACHE_ENABLED', 'true').lower() == 'true'
+    CACHE_STORAGE_PATH = os.environ.get('CACHE_STORAGE_PATH')  # SQLite file, defaults to the temp directory
+    CACHE_LOCAL_MAX_ENTRIES = int(os.environ.get('CACHE_LOCAL_MAX_ENTRIES', 512))  # Per worker
+    CACHE_LOCK_SECONDS = int(os.environ.get('CACHE_LOCK_SECONDS', 10))  # Longest wait for another worker's value
+    CACHE_VERSION_CHECK_MS = int(os.environ.get('CACHE_VERSION_CHECK_MS', 100))  # How stale another worker's invalidation may be
+    STATS_CACHE_SECONDS = int(os.environ.get('STATS_CACHE_SECONDS', 60))
+    AVAILABILITY_CACHE_SECONDS = int(os.environ.get('AVAILABILITY_CACHE_SECONDS', 300))
+    
+    # Full-page cache of the public HTML pages
+    PAGE_CACHE_SECONDS = int(os.environ.get('PAGE_CACHE_SECONDS', 3600))  # Catalog edits drop pages sooner
+    PAGE_CACHE_MAX_AGE = int(os.environ.get('PAGE_CACHE_MAX_AGE', 300))  # Cache-Control max-age for browsers
+    PAGE_CACHE_PRERENDER = os.environ.get('PAGE_CACHE_PRERENDER', 'false').lower() == 'true'  # Render at startup
+    
+    # Appointment reminder emails (flask reminders run)
+    REMINDER_HOURS_BEFORE = int(os.environ.get('REMINDER_HOURS_BEFORE', 24))
+    REMINDER_MIN_LEAD_HOURS = int(os.environ.get('REMINDER_MIN_LEAD_HOURS', 2))  # Skip bookings starting sooner than this
+    REMINDER_BATCH_SIZE = int(os.environ.get('REMINDER_BATCH_SIZE', 50))  # Emails per SMTP connection
+    REMINDER_POLL_SECONDS = float(os.environ.get('REMINDER_POLL_SECONDS', 30))  # Used when LISTEN/NOTIFY is unavailable
+    REMINDER_TIMEZONE = os.environ.get('REMINDER_TIMEZONE', 'Europe/Warsaw')  # Zone of scheduled_date/scheduled_time
+    
+    # Duplicate message suppression (contact form, client registration)
+    MESSAGE_DEDUPE_WINDOW_HOURS = int(os.environ.get('MESSAGE_DEDUPE_WINDOW_HOURS', 24))
+    MESSAGE_SIMHASH_MAX_DISTANCE = int(os.environ.get('MESSAGE_SIMHASH_MAX_DISTANCE', 6))  # Bits of 64 for the near-duplicate flag
+    
+    # Rate limiting of public write endpoints (token buckets shared by the workers of one host)
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'true').lower() == 'true'
+    RATELIMIT_STORAGE_PATH = os.environ.get('RATELIMIT_STORAGE_PATH')  # SQLite file, defaults to the temp directory
+    RATELIMIT_TRUSTED_PROXIES = int(os.environ.get('RATELIMIT_TRUSTED_PROXIES', 1))  # Proxies appending to X-Forwarded-For
+    RATELIMIT_MAX_EXPENSIVE_INFLIGHT = int(os.environ.get('RATELIMIT_MAX_EXPENSIVE_INFLIGHT') or 0) or None  # Per worker; default: threads - 1
+    
+    # Customer erasure (GDPR) jobs: rows deleted per transaction
+    ERASURE_BATCH_SIZE = int(os.environ.get('ERASURE_BATCH_SIZE', 500))
+    ERASURE_STALE_SECONDS = int(os.environ.get('ERASURE_STALE_SECONDS', 300))  # Running jobs without progress are resumed
+    
+    # Bulk CSV imports: rows per transaction, rejected rows listed in the response
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+    IMPORT_MAX_ERRORS = int(os.environ.get('IMPORT_MAX_ERRORS', 100))
+    
     # Database configuration - supports both SQLite (local) and PostgreSQL (production)
     DATABASE_URL = os.environ.get('DATABASE_URL')
     
@@ -30,6 +98,14 @@ class Config:
         SQLALCHEMY_DATABASE_URI = (
             f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
         )
+    
+    # Optional read replica for admin reporting endpoints
+    SQLALCHEMY_REPLICA_URI = os.environ.get('DATABASE_REPLICA_URL')
+    SQLALCHEMY_BINDS = {'replica': SQLALCHEMY_REPLICA_URI} if SQLALCHEMY_REPLICA_URI else {}
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 10))
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 15))  # Read-your-writes window after an admin change
+    REPLICA_HEALTH_TTL_SECONDS = int(os.environ.get('REPLICA_HEALTH_TTL_SECONDS', 5))
+    REPLICA_RETRY_SECONDS = int(os.environ.get('REPLICA_RETRY_SECONDS', 30))
 
 
 class DevelopmentConfig(Config):
@@ -47,7 +123,10 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     """Testing configuration."""
     TESTING = True
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    RATELIMIT_ENABLED = os.environ.get('TEST_RATELIMIT_ENABLED', 'false').lower() == 'true'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL', 'sqlite:///:memory:')
+    SQLALCHEMY_REPLICA_URI = os.environ.get('TEST_REPLICA_DATABASE_URL')
+    SQLALCHEMY_BINDS = {'replica': SQLALCHEMY_REPLICA_URI} if SQLALCHEMY_REPLICA_URI else {}
 
 
 def get_config(config_name='production'):
@@ -0,0 +1,123 @@
+"""
+Startup profile: per-module import times and ``create_app`` phases.
+
+With ``STARTUP_PROFILE=true`` the entry point (``run.py``) calls
+``install()`` before importing the app, which times the execution of every
+module imported from then on. ``create_app`` wraps its steps in ``phase()``
+and ends with ``report()``, which logs the phase timings, the import time
+per top-level package and the slowest modules. Without the variable
+all three do nothing.
+
+Only the standard library is imported here, so the profile sees every
+dependency the app pulls in.
+"""
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_started = time.perf_counter()
+_phases = []
+_modules = []   # (name, self_seconds, cumulative_seconds)
+_stack = []     # [name, started, seconds in nested imports]
+
+
+def enabled():
+    return os.environ.get('STARTUP_PROFILE', 'false').lower() == 'true'
+
+
+class _TimedLoader:
+    """Delegates to the real loader, timing ``exec_module``."""
+
+    def __init__(self, loader):
+        self._loader = loader
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        frame = [module.__name__, time.perf_counter(), 0.0]
+        _stack.append(frame)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            _stack.pop()
+            seconds = time.perf_counter() - frame[1]
+            _modules.append((frame[0], seconds - frame[2], seconds))
+            if _stack:
+                _stack[-1][2] += seconds
+
+
+class _TimingFinder:
+    """First entry of ``sys.meta_path``; wraps the loader the other finders return."""
+
+    def find_spec(self, name, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimedLoader(spec.loader)
+                return spec
+        return None
+
+
+def install():
+    """Start timing imports (call before importing the app)."""
+    global _started
+    if not enabled() or any(isinstance(finder, _TimingFinder) for finder in sys.meta_path):
+        return
+    _started = time.perf_counter()
+    sys.meta_path.insert(0, _TimingFinder())
+
+
+def uninstall():
+    sys.meta_path[:] = [finder for finder in sys.meta_path if not isinstance(finder, _TimingFinder)]
+
+
+@contextmanager
+def phase(name):
+    """Time one step of ``create_app``."""
+    if not enabled():
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases.append((name, time.perf_counter() - started))
+
+
+def report(top=15):
+    """Log the profile once and stop timing imports."""
+    if not enabled():
+        return
+    uninstall()
+
+    lines = [f'Startup profile: {time.perf_counter() - _started:.3f} s since start']
+    lines.append('  create_app phases:')
+    lines.extend(f'    {name:<20} {seconds * 1000:8.1f} ms' for name, seconds in _phases)
+
+    packages = Counter()
+    for name, self_seconds, _ in _modules:
+        packages[name.partition('.')[0]] += self_seconds
+    lines.append(f'  imports: {sum(packages.values()):.3f} s in {len(_modules)} modules, by package:')
+    lines.extend(f'    {name:<20} {seconds * 1000:8.1f} ms' for name, seconds in packages.most_common(top))
+
+    lines.append('  slowest modules (self / cumulative):')
+    lines.extend(
+        f'    {name:<40} {self_seconds * 1000:8.1f} ms {seconds * 1000:8.1f} ms'
+        for name, self_seconds, seconds in sorted(_modules, key=lambda module: -module[1])[:top]
+    )
+    logger.info('\n'.join(lines))
+
+    _phases.clear()
+    _modules.clear()
@@ -0,0 +1,155 @@
+"""
+Gunicorn configuration for production (``gunicorn -c gunicorn.conf.py run:app``).
+
+Workers and threads are sized from the limits of the container, not of the
+host it runs on: the CPU quota (cgroup v2 ``cpu.max`` or v1 CFS quota,
+else the CPUs this process may run on) and the memory limit. Every value
+can be overridden with its ``GUNICORN_*`` environment variable.
+
+* ``gthread`` workers: requests mostly wait on PostgreSQL, SMTP and the
+  Google Places API, and the change-event streams hold a connection open,
+  so each worker serves ``GUNICORN_THREADS`` requests at a time.
+* ``preload_app``: the app is imported once in the master and shared
+  copy-on-write. ``post_fork`` drops the database connections inherited
+  from the master, so no two processes share a socket.
+* ``max_requests`` with jitter: workers are replaced after a few thousand
+  requests, not all at the same time, so slow leaks never add up.
+* Queue wait: with an ``X-Request-Start`` header from the proxy, requests
+  that waited longer than ``GUNICORN_QUEUE_WAIT_LOG_MS`` before a worker
+  picked them up are logged.
+"""
+import multiprocessing
+import os
+import time
+
+MB = 1024 * 1024
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def _read(path):
+    try:
+        with open(path, encoding='ascii') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cpu_limit():
+    """CPUs available to the container (at least 1)."""
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    quota, _, period = (_read('/sys/fs/cgroup/cpu.max') or 'max').partition(' ')
+    if quota == 'max':
+        # cgroup v1: a quota of -1 means unlimited
+        quota, period = _read('/sys/fs/cgroup/cpu/cpu.cfs_quota_us'), _read('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+    try:
+        if int(quota) > 0 and int(period) > 0:
+            return max(1, round(int(quota) / int(period)))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return multiprocessing.cpu_count()
+
+
+def memory_limit():
+    """Bytes of memory available to the container, or ``None`` if unknown."""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        value = _read(path)
+        # v1 reports "no limit" as a number close to 2**63
+        if value and value.isdigit() and int(value) < 2 ** 60:
+            return int(value)
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def default_workers(cpus, memory, worker_memory_mb):
+    """``2 * CPUs + 1``, as many as fit into the memory limit, at least 1."""
+    workers = 2 * cpus + 1
+    if memory:
+        workers = min(workers, memory // (worker_memory_mb * MB))
+    return max(1, workers)
+
+
+_cpus = cpu_limit()
+_memory = memory_limit()
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+workers = _env_int('GUNICORN_WORKERS', default_workers(_cpus, _memory, _env_int('GUNICORN_WORKER_MEMORY_MB', 256)))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = _env_int('GUNICORN_THREADS', 4)
+
+preload_app = True
+
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 2000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10)
+
+timeout = _env_int('GUNICORN_TIMEOUT', 120)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+QUEUE_WAIT_LOG_MS = _env_int('GUNICORN_QUEUE_WAIT_LOG_MS', 100)
+
+
+def when_ready(server):
+    memory = f'{_memory // MB} MB' if _memory else 'unknown memory'
+    server.log.info(
+        f'{workers} {worker_class} workers x {threads} threads '
+        f'({_cpus} CPUs, {memory}), recycled after {max_requests}+{max_requests_jitter} requests'
+    )
+
+
+def post_fork(server, worker):
+    """
+    Drop the pooled database connections inherited from the master and
+    resume erasure jobs that died with the worker this one replaces.
+    """
+    from app.utils.erasure import schedule_resume
+
+    app = server.app.wsgi()
+    # Sizes the per-worker limit of expensive requests (app/utils/ratelimit.py)
+    app.config['WORKER_THREADS'] = worker.cfg.threads
+    with app.app_context():
+        for engine in app.extensions['sqlalchemy'].engines.values():
+            # close=False leaves the master's sockets alone; they are not ours to close
+            engine.dispose(close=False)
+    schedule_resume(app)
+
+
+def queue_wait_ms(header, now=None):
+    """
+    Milliseconds since the proxy received the request, from an
+    ``X-Request-Start`` value such as ``t=1700000000123456`` (microseconds),
+    ``t=1700000000123`` (milliseconds) or ``t=1700000000.123`` (seconds).
+    Returns ``None`` for values that cannot be parsed.
+    """
+    try:
+        started = float(header.strip().removeprefix('t='))
+    except (AttributeError, ValueError):
+        return None
+    # Tell the units apart by magnitude
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    now = time.time() if now is None else now
+    return max(0.0, (now - started) * 1000)
+
+
+def pre_request(worker, req):
+    for name, value in req.headers:
+        if name == 'X-REQUEST-START':
+            wait = queue_wait_ms(value)
+            if wait is not None and wait >= QUEUE_WAIT_LOG_MS:
+                worker.log.warning(f'Queue wait {wait:.0f} ms for {req.method} {req.path}')
+            return
@@ -1,11 +1,24 @@
 """Application entry point."""
 import os
+from config import startup
+
+# Time every import from here on when STARTUP_PROFILE is set
+startup.install()
+
 from app import create_app
 
 # Get environment from environment variable, default to production
 config_name = os.environ.get('FLASK_ENV', 'production')
 app = create_app(config_name)
 
+# Fill the page cache before the first visitor arrives
+if app.config.get('PAGE_CACHE_PRERENDER'):
+    from app.utils.page_cache import prerender_pages
+    try:
+        prerender_pages(app)
+    except Exception as e:
+        app.logger.warning(f'Page pre-rendering failed: {e}')
+
 if __name__ == '__main__':
     # For local development
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+CSV Import Benchmark
+Generates a spreadsheet-style file of historical appointments and imports it
+with the bulk importer (app/utils/importer.py), then imports it a second time
+to measure the cost of recognising rows that are already in.
+
+Uses a throwaway SQLite database by default. Set TEST_DATABASE_URL to run
+against PostgreSQL instead (the tables are created if missing):
+    python scripts/python/testing/benchmark_csv_import.py [rows]
+"""
+
+import io
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+# Add the project root directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+# The testing config reads its database URL at import time
+os.environ.setdefault('TEST_DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'import.db')}")
+
+from app import create_app, db
+from app.models.service import Service
+from app.utils.importer import import_csv
+
+DEFAULT_ROWS = 100000
+CUSTOMERS = 20000
+SERVICES = ('Naprawa kranów', 'Montaż WC', 'Udrażnianie rur')
+
+
+def _make_app():
+    """Create an app bound to the benchmark database, with the services to import against."""
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        for name in SERVICES:
+            if not Service.query.filter_by(name=name).first():
+                db.session.add(Service(name=name, category='repair', price=150, duration_minutes=60))
+        db.session.commit()
+    return app
+
+
+def _csv(rows):
+    """One appointment per row, spread over CUSTOMERS customers and the last ten years."""
+    first_day = date.today() - timedelta(days=3650)
+    out = io.StringIO()
+    out.write('Name;Email;Phone;Service;Scheduled date;Scheduled time;Status\n')
+    for i in range(rows):
+        customer = i % CUSTOMERS
+        day = first_day + timedelta(days=i // 40)
+        hour = 7 + i % 10
+        status = 'cancelled' if i % 7 == 0 else 'completed'
+        out.write(f'Klient {customer};klient{customer}@example.com;+48 5{customer:08d};'
+                  f'{SERVICES[i % len(SERVICES)]};{day.isoformat()};{hour:02d}:{(i % 4) * 15:02d};{status}\n')
+    return out.getvalue().encode('utf-8')
+
+
+def _run(app, label, data):
+    with app.app_context():
+        started = time.perf_counter()
+        result = import_csv(io.BytesIO(data), 'appointments')
+        seconds = time.perf_counter() - started
+    counts = ', '.join(f'{name} {value}' for name, value in sorted(result.counts.items()))
+    print(f"   {label:<8} {result.rows} rows in {seconds:6.2f} s ({result.rows / seconds:8.0f} rows/s)")
+    print(f"            {counts}, failed {result.failed}")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    app = _make_app()
+    data = _csv(rows)
+
+    print("⏱️  CSV Import Benchmark")
+    print("=" * 60)
+    print(f"   {rows} appointments, {len(data) / 1e6:.1f} MB\n")
+
+    _run(app, 'import', data)
+    _run(app, 're-run', data)
+
+    print("\n✅ Done")
+
+
+if __name__ == '__main__':
+    main()
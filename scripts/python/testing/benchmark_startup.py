@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Times cold starts of the app: each run is a fresh interpreter that imports
+the app package and calls create_app(), as a gunicorn worker does.
+
+    python scripts/python/testing/benchmark_startup.py [--runs 10] [--record]
+
+With --record the result is appended to startup_history.jsonl next to this
+script (or --history PATH) together with the commit, and compared with the
+previous entry, so startup time can be tracked over time. Set
+STARTUP_PROFILE=true to also print the per-module profile of one run.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..'))
+DEFAULT_HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_history.jsonl')
+
+# Runs in the child interpreter; prints the timings as JSON on the last line
+CHILD = '''
+import json, time
+started = time.perf_counter()
+from config import startup
+startup.install()
+from app import create_app
+imported = time.perf_counter()
+create_app('testing')
+finished = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': finished - imported}))
+'''
+
+
+def _run_once(env):
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    if env.get('STARTUP_PROFILE') == 'true':
+        print(output.stderr)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def _commit():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f'{commit}+dirty' if dirty else commit
+
+
+def _last_entry(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        lines = [line for line in f if line.strip()]
+    return json.loads(lines[-1]) if lines else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--record', action='store_true', help='Append the result to the history file')
+    parser.add_argument('--history', default=DEFAULT_HISTORY)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('TEST_DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'startup.db')}")
+    profile = env.pop('STARTUP_PROFILE', None) == 'true'
+
+    print("⏱️  Startup Benchmark")
+    print("=" * 60)
+
+    # The first run also writes any missing bytecode; it is not counted
+    _run_once(env)
+    runs = [_run_once(env) for _ in range(args.runs)]
+    if profile:
+        _run_once(dict(env, STARTUP_PROFILE='true'))
+
+    result = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'runs': args.runs,
+    }
+    for phase in ('import', 'create_app'):
+        result[f'{phase}_ms'] = round(statistics.median(run[phase] for run in runs) * 1000, 1)
+    result['total_ms'] = round(statistics.median(run['import'] + run['create_app'] for run in runs) * 1000, 1)
+    best = min(run['import'] + run['create_app'] for run in runs) * 1000
+
+    print(f"   import      {result['import_ms']:8.1f} ms (median of {args.runs})")
+    print(f"   create_app  {result['create_app_ms']:8.1f} ms")
+    print(f"   total       {result['total_ms']:8.1f} ms (best {best:.1f} ms)")
+
+    if args.record:
+        previous = _last_entry(args.history)
+        with open(args.history, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(result) + '\n')
+        if previous:
+            change = result['total_ms'] - previous['total_ms']
+            print(f"\n   {change:+.1f} ms since {previous['commit']} ({previous['date']})")
+        print(f"   Recorded in {args.history}")
+
+    print("\n✅ Done")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Request Validation Benchmark
+Measures the cost of validating one booking request with the shared schema
+layer (app/utils/validation.py), next to the hand-written checks it replaced.
+
+No database or network is needed:
+    python scripts/python/testing/benchmark_validation.py
+"""
+
+import os
+import re
+import sys
+import timeit
+from datetime import datetime
+
+# Add the project root directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+from app.routes.api import BOOKING_SCHEMA, CONTACT_SCHEMA
+from app.utils.validation import ValidationError
+
+ITERATIONS = 20000
+
+VALID_BOOKING = {
+    'name': 'Jan Kowalski',
+    'email': 'jan.kowalski@example.com',
+    'phone': '+48 503 691 808',
+    'service': 'Naprawa kranów',
+    'date': '2030-05-14',
+    'time': '09:30',
+    'address': 'ul. Długa 5, Kraków',
+    'description': 'Cieknie kran w kuchni'
+}
+INVALID_BOOKING = dict(VALID_BOOKING, email='jan.kowalski', date='14.05.2030')
+VALID_CONTACT = {
+    'name': 'Jan Kowalski',
+    'email': 'jan.kowalski@example.com',
+    'message': 'Proszę o kontakt w sprawie wymiany bojlera.'
+}
+
+
+def legacy_booking(data):
+    """The checks book_appointment used to run inline."""
+    required_fields = ['name', 'email', 'phone', 'service', 'date', 'time']
+    missing_fields = [field for field in required_fields if not data.get(field)]
+    if missing_fields:
+        return False
+    email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+    if not re.match(email_pattern, data['email']):
+        return False
+    try:
+        datetime.strptime(data['date'], '%Y-%m-%d').date()
+        datetime.strptime(data['time'], '%H:%M').time()
+    except ValueError:
+        return False
+    return True
+
+
+def schema_load(schema, data):
+    try:
+        schema.load(data)
+        return True
+    except ValidationError:
+        return False
+
+
+def measure(label, func):
+    seconds = min(timeit.repeat(func, number=ITERATIONS, repeat=5))
+    print(f"   {label:<38} {seconds / ITERATIONS * 1e6:8.2f} µs/request")
+
+
+def main():
+    print("⏱️  Request Validation Benchmark")
+    print("=" * 60)
+    print(f"   {ITERATIONS} iterations, best of 5\n")
+
+    measure('schema: valid booking', lambda: schema_load(BOOKING_SCHEMA, VALID_BOOKING))
+    measure('schema: invalid booking', lambda: schema_load(BOOKING_SCHEMA, INVALID_BOOKING))
+    measure('schema: valid contact', lambda: schema_load(CONTACT_SCHEMA, VALID_CONTACT))
+    measure('legacy inline checks: valid booking', lambda: legacy_booking(VALID_BOOKING))
+    measure('legacy inline checks: invalid booking', lambda: legacy_booking(INVALID_BOOKING))
+
+    print("\n✅ Done")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Concurrent Booking Stress Test
+Fires parallel bookings for the same day at /api/book-appointment and verifies
+that no two active appointments overlap.
+
+Uses a throwaway SQLite database by default. Set TEST_DATABASE_URL to run
+against PostgreSQL instead (the tables are created if missing).
+"""
+
+import os
+import sys
+import random
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+# Add the project root directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../..'))
+
+# The testing config reads its database URL at import time
+os.environ.setdefault('TEST_DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'stress.db')}")
+
+from app import create_app, db
+from app.models.appointment import Appointment
+from app.models.service import Service
+
+PARALLEL_BOOKINGS = 100
+SERVICE_NAME = 'Naprawa kranów'
+SERVICE_DURATION = 60
+
+
+def _make_app():
+    """Create an app bound to the stress-test database."""
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        if not Service.query.filter_by(name=SERVICE_NAME).first():
+            db.session.add(Service(
+                name=SERVICE_NAME,
+                description='Stress test service',
+                category='repair',
+                price=150,
+                duration_minutes=SERVICE_DURATION,
+                is_active=True
+            ))
+            db.session.commit()
+    return app
+
+
+def _book(app, booking_date, index):
+    """Submit one booking and return the HTTP status code."""
+    slot = random.choice(['09:00', '09:30', '10:00', '10:30', '11:00'])
+    with app.test_client() as client:
+        response = client.post('/api/book-appointment', json={
+            'name': f'Stress Tester {index}',
+            'email': f'stress{index}@example.com',
+            'phone': '+48 500 000 000',
+            'service': SERVICE_NAME,
+            'date': booking_date.isoformat(),
+            'time': slot,
+            'address': 'ul. Testowa 1'
+        })
+        return response.status_code
+
+
+def _find_overlaps(app, booking_date):
+    """Return pairs of active appointments whose intervals overlap."""
+    with app.app_context():
+        rows = db.session.query(
+            Appointment.id, Appointment.scheduled_time, Service.duration_minutes
+        ).join(Service).filter(
+            Appointment.scheduled_date == booking_date,
+            Appointment.status.in_(['pending', 'confirmed'])
+        ).all()
+
+    intervals = sorted(
+        (t.hour * 60 + t.minute, t.hour * 60 + t.minute + duration, appointment_id)
+        for appointment_id, t, duration in rows
+    )
+    overlaps = []
+    for previous, current in zip(intervals, intervals[1:]):
+        if current[0] < previous[1]:
+            overlaps.append((previous[2], current[2]))
+    return intervals, overlaps
+
+
+def test_concurrent_booking():
+    """Book the same morning from many threads at once and check for overlaps."""
+
+    print("🧪 Concurrent Booking Stress Test")
+    print("=" * 60)
+
+    app = _make_app()
+    booking_date = date.today() + timedelta(days=random.randint(30, 300))
+
+    with ThreadPoolExecutor(max_workers=PARALLEL_BOOKINGS) as executor:
+        statuses = list(executor.map(
+            lambda index: _book(app, booking_date, index),
+            range(PARALLEL_BOOKINGS)
+        ))
+
+    created = statuses.count(201)
+    conflicts = statuses.count(409)
+    errors = [status for status in statuses if status not in (201, 409)]
+    intervals, overlaps = _find_overlaps(app, booking_date)
+
+    print(f"📅 Date:        {booking_date.isoformat()}")
+    print(f"✅ Created:     {created}")
+    print(f"⛔ Conflicts:   {conflicts}")
+    print(f"❌ Errors:      {len(errors)} {sorted(set(errors)) if errors else ''}")
+    print(f"📋 Stored:      {len(intervals)} active appointments")
+    print(f"🔍 Overlaps:    {len(overlaps)}")
+
+    assert not overlaps, f"Overlapping appointments: {overlaps}"
+    assert not errors, f"Unexpected status codes: {errors}"
+    assert created == len(intervals), "Every 201 must correspond to a stored appointment"
+
+    print("\n🎉 No overlapping bookings")
+
+
+if __name__ == '__main__':
+    test_concurrent_booking()